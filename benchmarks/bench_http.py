@@ -0,0 +1,189 @@
+"""Outbound HTTP of a link: a session per request vs. the app's pooled session.
+
+Every link goes through what the bot does with TikTok: the short link is resolved,
+the web page is parsed and the video is downloaded, against the stub server
+(in another process). Modes:
+
+- `per_request` opens a `ClientSession` for every request, as the bot did before
+  `create_http_session`, so every request costs a handshake,
+- `pooled` shares one `create_http_session` for all of them, like the bot does now.
+
+The stub is plain HTTP on localhost, where a handshake is nearly free, so
+`--handshake-latency` adds the time of the TCP and TLS handshakes with a remote host
+to every opened connection. Reported for each mode: opened connections (handshakes)
+per link and the handling time of a link.
+
+Usage: BOT_TOKEN=1:a python -m benchmarks.bench_http --handshake-latency 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from collections.abc import AsyncGenerator, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+from aiohttp import ClientSession, TraceConfig
+
+from benchmarks.load import ConnectionCounter, free_port, git_commit, percentiles, wait_for_stub
+from benchmarks.stub_server import StubConfig, redirect_to, run
+
+Sessions = Callable[[], AbstractAsyncContextManager[ClientSession]]
+
+
+def slow_handshakes(latency: float) -> TraceConfig:
+    """Make every new connection take `latency` seconds longer, like a remote host would.
+
+    Returns
+    -------
+    The trace config to pass to the session.
+
+    """
+
+    async def on_connection_create_end(*_: object) -> None:
+        await asyncio.sleep(latency)
+
+    trace_config = TraceConfig()
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
+
+
+async def handle_link(sessions: Sessions, aweme_id: int) -> None:
+    """Resolve the short link, parse the post and download its video, like the bot does."""
+    from bot.services.links import extract_aweme_id  # noqa: PLC0415
+    from bot.services.media import open_media  # noqa: PLC0415
+    from bot.services.resolver import ShortLinkResolver  # noqa: PLC0415
+    from bot.services.tiktok_web import TikTokWebParser  # noqa: PLC0415
+
+    async with sessions() as session:
+        url = await ShortLinkResolver(session).resolve(f"https://vm.tiktok.com/ZM{aweme_id}/")
+    assert url is not None
+    assert extract_aweme_id(url) == aweme_id
+
+    async with sessions() as session:
+        response = await TikTokWebParser(session).parse(aweme_id)
+    assert response.data is not None
+    assert response.data.video_url is not None
+
+    async with (
+        sessions() as session,
+        open_media(
+            session,
+            response.data.video_url,
+            response.data.headers,
+        ) as file,
+    ):
+        async for _ in file.iter_chunks():
+            pass
+
+
+async def measure(url: str, args: argparse.Namespace, *, pooled: bool) -> dict[str, Any]:
+    from bot.services.http_client import create_http_session  # noqa: PLC0415
+
+    connections = ConnectionCounter()
+    middlewares = (redirect_to(url),)
+    trace_configs = (connections.trace_config, slow_handshakes(args.handshake_latency))
+
+    shared = create_http_session(middlewares, trace_configs) if pooled else None
+
+    @asynccontextmanager
+    async def sessions() -> AsyncGenerator[ClientSession, None]:
+        if shared is not None:
+            yield shared
+            return
+        # what the bot did before: a new session (and connection) for every request
+        async with ClientSession(
+            middlewares=middlewares,
+            trace_configs=list(trace_configs),
+        ) as session:
+            yield session
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+
+    async def link(aweme_id: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await handle_link(sessions, aweme_id)
+            latencies.append(time.perf_counter() - start)
+
+    aweme_ids = [7_300_000_000_000_000_000 + index for index in range(1, args.links + 1)]
+    try:
+        # warm up, so the imports and the first parse aren't counted
+        await handle_link(sessions, 7_300_000_000_000_000_000)
+        opened = connections.opened
+        started = time.perf_counter()
+        await asyncio.gather(*(link(aweme_id) for aweme_id in aweme_ids))
+        elapsed = time.perf_counter() - started
+        opened = connections.opened - opened
+    finally:
+        if shared is not None:
+            await shared.close()
+
+    return {
+        "connections_opened": opened,
+        "handshakes_per_link": round(opened / args.links, 2),
+        "link_latency_ms": percentiles(latencies),
+        "links_per_second": round(args.links / elapsed, 1),
+    }
+
+
+async def run_benchmark(url: str, args: argparse.Namespace) -> dict[str, Any]:
+    return {
+        "per_request": await measure(url, args, pooled=False),
+        "pooled": await measure(url, args, pooled=True),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10, help="links handled at once")
+    parser.add_argument(
+        "--handshake-latency",
+        type=float,
+        default=0.1,
+        help="seconds added to every new connection, 0 for localhost",
+    )
+    parser.add_argument("--tiktok-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--output", help="file for the results, stdout by default")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    config = StubConfig(
+        tiktok_latency=args.tiktok_latency,
+        redirect_latency=args.tiktok_latency / 2,
+        cdn_latency=args.tiktok_latency / 2,
+        unavailable_rate=0,
+        photo_rate=0,
+    )
+    stub = multiprocessing.get_context("spawn").Process(
+        target=run,
+        args=(config, port),
+        daemon=True,
+    )
+    stub.start()
+    try:
+        asyncio.run(wait_for_stub(url))
+        results = asyncio.run(run_benchmark(url, args))
+    finally:
+        stub.terminate()
+        stub.join()
+
+    report = {"commit": git_commit(), "args": vars(args), "results": results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
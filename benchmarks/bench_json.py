@@ -0,0 +1,155 @@
+"""CPU time and allocations of decoding the TikTok payloads: lean vs. pydantic.
+
+Payloads are built from `fixtures/` the same way the stub server builds them:
+
+- `web`: the rehydration JSON of a page (`--page-size` bytes of other scopes
+  before `webapp.video-detail`), decoded by `lean.decode_video_detail` (`JSON_MODE=fast`)
+  and by validating the whole payload with pydantic (`JSON_MODE=strict`),
+- `api`: a batch of `--batch` aweme details, validated with pydantic in one pass
+  (what the bot does) and decoded to dicts with `json.loads`, the lower bound
+  of any dict-based lean path.
+
+Reported for each: CPU time of one decode (the best of the runs), the peak of the memory
+allocated during it and the memory kept by its result.
+
+The API has no lean path: every aweme detail of the batch is needed, and pydantic's
+JSON validator skips the fields that aren't, without building Python objects for them.
+So it decodes a batch in about the time of `json.loads` (368 vs. 427 µs for 20 videos,
+577 vs. 560 µs for 20 photo posts) with a lower peak (160 vs. 252 KB, 289 vs. 375 KB),
+and any dict-based decoder would start from `json.loads`.
+
+Usage: BOT_TOKEN=1:a python -m benchmarks.bench_json
+"""
+
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from benchmarks.load import git_commit
+from benchmarks.stub_server import FIXTURES, fill_item, render_filler
+
+REPEAT = 5
+
+
+def web_payload(kind: str, page_size: int, images: int) -> bytes:
+    item = fill_item((FIXTURES / f"web_{kind}.json").read_text(), 7_300_000_000_000_000_000, images)
+    detail = {"itemInfo": {"itemStruct": item}, "statusCode": 0, "statusMsg": ""}
+    filler = render_filler(page_size)
+    return (
+        f'{{"__DEFAULT_SCOPE__":{{{filler},"webapp.video-detail":{json.dumps(detail)}}}}}'.encode()
+    )
+
+
+def api_payload(kind: str, batch: int, images: int) -> bytes:
+    template = (FIXTURES / f"api_{kind}.json").read_text()
+    details = [
+        fill_item(template, 7_300_000_000_000_000_000 + index, images) for index in range(batch)
+    ]
+    return json.dumps({"status_code": 0, "status_msg": "", "aweme_details": details}).encode()
+
+
+def cpu_time(decode: Callable[[bytes], object], payload: bytes, number: int) -> float:
+    """Measure the CPU time of one decode, by the best of the runs.
+
+    Returns
+    -------
+    Microseconds.
+
+    """
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.process_time()
+        for _ in range(number):
+            decode(payload)
+        best = min(best, time.process_time() - start)
+    return best / number * 1_000_000
+
+
+def allocations(decode: Callable[[bytes], object], payload: bytes) -> tuple[float, float]:
+    """Measure the memory allocated by one decode.
+
+    Returns
+    -------
+    The peak of the allocated memory and the memory kept by the result, in bytes.
+
+    """
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = decode(payload)
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak - before, kept - before
+
+
+def measure(decode: Callable[[bytes], object], payload: bytes, number: int) -> dict[str, float]:
+    decode(payload)  # warm up
+    peak, kept = allocations(decode, payload)
+    return {
+        "cpu_us": round(cpu_time(decode, payload, number), 1),
+        "peak_kb": round(peak / 1024, 1),
+        "kept_kb": round(kept / 1024, 1),
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> dict[str, Any]:
+    from bot.services.tiktok_api import decode as decode_api  # noqa: PLC0415
+    from bot.services.tiktok_web import lean  # noqa: PLC0415
+    from bot.services.tiktok_web.models import Root as WebRoot  # noqa: PLC0415
+
+    web: dict[str, Callable[[bytes], object]] = {
+        "lean": lean.decode_video_detail,
+        "pydantic": WebRoot.model_validate_json,
+    }
+    api: dict[str, Callable[[bytes], object]] = {
+        "pydantic": decode_api,
+        "json_loads": json.loads,
+    }
+
+    results: dict[str, Any] = {}
+    for kind in ("video", "photo"):
+        payload = web_payload(kind, args.page_size, args.images)
+        results[f"web_{kind}"] = {
+            "payload_kb": round(len(payload) / 1024, 1),
+            **{name: measure(decode, payload, args.number) for name, decode in web.items()},
+        }
+        payload = api_payload(kind, args.batch, args.images)
+        results[f"api_{kind}"] = {
+            "payload_kb": round(len(payload) / 1024, 1),
+            **{name: measure(decode, payload, args.number) for name, decode in api.items()},
+        }
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=300 * 1024, help="bytes of other scopes")
+    parser.add_argument("--batch", type=int, default=20, help="aweme details in the API response")
+    parser.add_argument("--images", type=int, default=4, help="images of the photo posts")
+    parser.add_argument("--number", type=int, default=200, help="decodes per run")
+    parser.add_argument("--output", help="file for the results, stdout by default")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    # `bot.services.tiktok_api` requires them on import
+    os.environ.setdefault("INSTALL_ID", "7379691220123456789")
+    os.environ.setdefault("DEVICE_ID", "7379690540123456789")
+    report = {"commit": git_commit(), "args": vars(args), "results": run_benchmark(args)}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
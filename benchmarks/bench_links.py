@@ -0,0 +1,85 @@
+"""Throughput of finding TikTok links in chat messages.
+
+The bot is in groups where almost no message has a TikTok link, and every text message
+goes through this check. The corpus is a mix of typical group chat messages, so most of
+them are rejected by the substring prefilter, before any regex runs.
+
+Usage: BOT_TOKEN=1:a python -m benchmarks.bench_links
+"""
+
+import json
+import time
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+from aiogram.types import Chat, Message
+
+from bot.config import TIKTOK_URL_PATTERN
+from bot.services.links import extract_tiktok_urls
+
+CORPUS = Path(__file__).parent / "fixtures" / "chat_messages.json"
+ITERATIONS = 200
+
+
+def load_messages() -> list[Message]:
+    texts: list[str] = json.loads(CORPUS.read_text(encoding="utf-8"))
+    chat = Chat(id=-1, type="supergroup")
+    return [
+        Message(message_id=index, date=int(time.time()), chat=chat, text=text)
+        for index, text in enumerate(texts)
+    ]
+
+
+def regex_only(messages: list[Message]) -> int:
+    """Run the URL regex on every message, without the prefilter.
+
+    Returns
+    -------
+    How many messages have a link.
+
+    """
+    return sum(bool(TIKTOK_URL_PATTERN.search(message.text or "")) for message in messages)
+
+
+def extract(messages: list[Message]) -> int:
+    """Run `extract_tiktok_urls`, which `TikTokLinkFilter` runs for every message.
+
+    Returns
+    -------
+    How many messages have a link.
+
+    """
+    return sum(bool(extract_tiktok_urls(message)) for message in messages)
+
+
+def measure(func: Callable[[list[Message]], int], messages: list[Message]) -> float:
+    """Time `func` on the messages.
+
+    Returns
+    -------
+    Messages per second, by the best of the runs.
+
+    """
+    best = min(timeit.repeat(lambda: func(messages), number=ITERATIONS, repeat=5))
+    return len(messages) * ITERATIONS / best
+
+
+def main() -> None:
+    messages = load_messages()
+    results = {func.__name__: round(measure(func, messages)) for func in (regex_only, extract)}
+    print(  # noqa: T201
+        json.dumps(
+            {
+                "unit": "messages per second",
+                "messages": len(messages),
+                "with_links": extract(messages),
+                **results,
+            },
+            indent=2,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Simulation of `SendScheduler` against a stub Bot API with flood control.
+
+The stub answers "Too Many Requests" (with `retry_after`) when a chat or the whole bot
+goes over the limits that `SendScheduler` assumes, so this shows what the scheduler
+costs and saves compared to a bot that sends right away and waits only after a 429,
+not whether the assumed limits are Telegram's real ones. Scenarios:
+
+- `slideshows`: private chats get a 35-image slideshow (media groups of 10) each,
+- `busy_group`: a group gets many videos while private chats get one reply each,
+- `broadcast`: many private chats get one message each, so the global limit is hit.
+
+Reported for each scenario and mode: time until all the messages are delivered,
+the delivery time of a chat (p50 and max) and the number of 429 answers.
+
+Usage: BOT_TOKEN=1:a python -m benchmarks.bench_scheduler
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import BufferedInputFile, InputMediaPhoto
+from aiohttp import web
+from typing_extensions import override
+
+from benchmarks.load import BOT_TOKEN, free_port, git_commit
+from benchmarks.stub_server import StubConfig, StubServer
+from bot.middlewares.scheduler import (
+    GLOBAL_RATE,
+    GROUP_CHAT_BURST,
+    GROUP_CHAT_RATE,
+    PRIVATE_CHAT_BURST,
+    PRIVATE_CHAT_RATE,
+    SendScheduler,
+    TokenBucket,
+    is_group,
+)
+
+MEDIA_GROUP_SIZE = 10
+GROUP_CHAT_ID = -100
+
+
+class FloodControlStub(StubServer):
+    """Bot API stub that answers 429 to requests over the limits."""
+
+    def __init__(self, config: StubConfig) -> None:
+        super().__init__(config)
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self.too_many_requests = 0
+
+    @override
+    async def telegram(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if "chat_id" not in form:
+            return await super().telegram(request)
+
+        chat_id = int(str(form["chat_id"]))
+        messages = len(json.loads(str(form["media"]))) if "media" in form else 1
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = (
+                TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+                if is_group(chat_id)
+                else TokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+            )
+            self.chat_buckets[chat_id] = bucket
+
+        now = time.monotonic()
+        cost = messages if is_group(chat_id) else 1
+        wait = max(bucket.wait_time(now, cost), self.global_bucket.wait_time(now, messages))
+        if wait > 0:
+            self.too_many_requests += 1
+            retry_after = math.ceil(wait)
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                },
+            )
+
+        bucket.take(now, cost)
+        self.global_bucket.take(now, messages)
+        return await super().telegram(request)
+
+
+async def send(call: Callable[[], Awaitable[object]]) -> None:
+    """Make the request, waiting as long as Telegram says after a 429."""
+    while True:
+        try:
+            await call()
+        except TelegramRetryAfter as exception:  # noqa: PERF203
+            await asyncio.sleep(exception.retry_after)
+        else:
+            return
+
+
+async def deliver(calls: list[Callable[[], Awaitable[object]]]) -> float:
+    """Send the messages of one chat in order.
+
+    Returns
+    -------
+    When the last one has been delivered, by `time.perf_counter`.
+
+    """
+    for call in calls:
+        await send(call)
+    return time.perf_counter()
+
+
+def slideshows(bot: Bot, args: argparse.Namespace) -> list[list[Callable[[], Awaitable[object]]]]:
+    image = BufferedInputFile(b"\xff" * 1024, "image.jpg")
+    groups = [
+        min(MEDIA_GROUP_SIZE, args.slideshow - start)
+        for start in range(0, args.slideshow, MEDIA_GROUP_SIZE)
+    ]
+    return [
+        [
+            lambda chat_id=chat_id, size=size: bot.send_media_group(
+                chat_id,
+                [InputMediaPhoto(media=image) for _ in range(size)],
+            )
+            for size in groups
+        ]
+        for chat_id in range(1, args.dm_chats + 1)
+    ]
+
+
+def busy_group(bot: Bot, args: argparse.Namespace) -> list[list[Callable[[], Awaitable[object]]]]:
+    video = BufferedInputFile(b"\x00" * 1024, "video.mp4")
+    group = [lambda: bot.send_video(GROUP_CHAT_ID, video) for _ in range(args.group_videos)]
+    private = [
+        [lambda chat_id=chat_id: bot.send_message(chat_id, "ok")]
+        for chat_id in range(1, args.dm_chats + 1)
+    ]
+    return [group, *private]
+
+
+def broadcast(bot: Bot, args: argparse.Namespace) -> list[list[Callable[[], Awaitable[object]]]]:
+    return [
+        [lambda chat_id=chat_id: bot.send_message(chat_id, "ok")]
+        for chat_id in range(1, args.broadcast + 1)
+    ]
+
+
+async def run_scenario(
+    scenario: Callable[[Bot, argparse.Namespace], list[list[Callable[[], Awaitable[object]]]]],
+    args: argparse.Namespace,
+    *,
+    scheduled: bool,
+) -> dict[str, Any]:
+    stub = FloodControlStub(StubConfig(telegram_latency=args.telegram_latency))
+    runner = web.AppRunner(stub.create_app())
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    api = TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+    bot = Bot(BOT_TOKEN, session=AiohttpSession(api=api))
+    scheduler = SendScheduler()
+    if scheduled:
+        bot.session.middleware(scheduler)
+
+    try:
+        started = time.perf_counter()
+        delivered = await asyncio.gather(*(deliver(calls) for calls in scenario(bot, args)))
+        chat_times = [finished - started for finished in delivered]
+    finally:
+        await scheduler.close()
+        await bot.session.close()
+        await runner.cleanup()
+
+    return {
+        "total_seconds": round(max(chat_times), 2),
+        "chat_p50_seconds": round(statistics.median(chat_times), 2),
+        "chat_max_seconds": round(max(chat_times), 2),
+        "too_many_requests": stub.too_many_requests,
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for scenario in (slideshows, busy_group, broadcast):
+        results[scenario.__name__] = {
+            "scheduler": await run_scenario(scenario, args, scheduled=True),
+            "none": await run_scenario(scenario, args, scheduled=False),
+        }
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dm-chats", type=int, default=5)
+    parser.add_argument("--slideshow", type=int, default=35, help="images per slideshow")
+    parser.add_argument("--group-videos", type=int, default=24)
+    parser.add_argument("--broadcast", type=int, default=150, help="private chats")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--output", help="file for the results, stdout by default")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    report = {
+        "commit": git_commit(),
+        "args": vars(args),
+        "results": asyncio.run(run_benchmark(args)),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
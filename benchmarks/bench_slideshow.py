@@ -0,0 +1,173 @@
+"""Sending slideshows: Telegram downloading the images vs. `handle_image_post` prefetching them.
+
+Photo posts of `--sizes` images (`StubConfig.images_per_post`) are parsed from the stub
+and sent as media groups of 10 to the stub Bot API, the images are on the stub CDN
+(`--cdn-latency` before the first byte of each). Modes:
+
+- `urls`, as the bot did before: every media group has the image URLs, and the stub
+  Bot API downloads them one by one before answering, like Telegram does,
+- `prefetch` is `handle_image_post`: the bot downloads the images of a media group
+  concurrently, while the previous one is being sent, and uploads them.
+
+Reported for each size and mode: the time until the whole slideshow is sent.
+
+Usage: BOT_TOKEN=1:a python -m benchmarks.bench_slideshow --sizes 10 35 100
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Chat, InputMediaPhoto, Message
+from aiohttp import ClientSession, web
+from typing_extensions import override
+
+from benchmarks.load import BOT_TOKEN, free_port, git_commit
+from benchmarks.stub_server import StubConfig, StubServer, redirect_to
+from bot.cache.media import MediaCache
+from bot.cache.memory import MemoryCache
+from bot.services.http_client import create_http_session
+from bot.utils import HeaderMap, split_list_into_chunks
+
+MEDIA_GROUP_SIZE = 10
+
+
+class FetchingStub(StubServer):
+    """Bot API stub that downloads the media given by URL one by one, like Telegram."""
+
+    def __init__(self, config: StubConfig) -> None:
+        super().__init__(config)
+        self.session: ClientSession | None = None
+
+    @override
+    async def telegram(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if self.session is not None and "media" in form:
+            for item in json.loads(str(form["media"])):
+                if item["media"].startswith("http"):
+                    self.requests["telegram_fetches"] += 1
+                    async with self.session.get(item["media"]) as response:
+                        await response.read()
+        return await super().telegram(request)
+
+
+async def send_urls(message: Message, images: list[str]) -> None:
+    """Send the image URLs, so Telegram downloads them, as the bot did before."""
+    for chunk in split_list_into_chunks(images, MEDIA_GROUP_SIZE):
+        await message.reply_media_group([InputMediaPhoto(media=url) for url in chunk])
+
+
+async def parse_images(http_session: ClientSession, aweme_id: int) -> tuple[list[str], HeaderMap]:
+    """Parse the photo post from the stub.
+
+    Returns
+    -------
+    The images of the post and the headers to download them.
+
+    """
+    from bot.services.tiktok_web import TikTokWebParser  # noqa: PLC0415
+
+    response = await TikTokWebParser(http_session).parse(aweme_id)
+    assert response.data is not None
+    assert response.data.images is not None
+    assert response.data.headers is not None
+    return response.data.images, response.data.headers
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict[str, Any]:
+    from bot.routers.message import handle_image_post  # noqa: PLC0415
+
+    stub = FetchingStub(
+        StubConfig(
+            tiktok_latency=0,
+            cdn_latency=args.cdn_latency,
+            telegram_latency=args.telegram_latency,
+            unavailable_rate=0,
+            photo_rate=1,
+        ),
+    )
+    runner = web.AppRunner(stub.create_app())
+    await runner.setup()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    stub.session = create_http_session(middlewares=(redirect_to(url),))
+    http_session = create_http_session(middlewares=(redirect_to(url),))
+    bot = Bot(BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    message = Message(
+        message_id=1,
+        date=int(time.time()),
+        chat=Chat(id=1, type="private"),
+        text="https://www.tiktok.com/@someone/photo/7300000000000000000",
+    ).as_(bot)
+
+    results: dict[str, Any] = {}
+    try:
+        for size in args.sizes:
+            stub.config.images_per_post = size
+            aweme_id = 7_300_000_000_000_000_000 + size
+            images, headers = await parse_images(http_session, aweme_id)
+            assert len(images) == size
+
+            start = time.perf_counter()
+            await send_urls(message, images)
+            urls = time.perf_counter() - start
+
+            start = time.perf_counter()
+            media_cache = MediaCache(MemoryCache(1000))
+            await handle_image_post(
+                bot,
+                message,
+                media_cache,
+                http_session,
+                images,
+                headers,
+                aweme_id,
+            )
+            prefetch = time.perf_counter() - start
+
+            results[str(size)] = {
+                "urls_seconds": round(urls, 2),
+                "prefetch_seconds": round(prefetch, 2),
+            }
+    finally:
+        await bot.session.close()
+        await http_session.close()
+        await stub.session.close()
+        await runner.cleanup()
+
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 35, 100])
+    parser.add_argument("--cdn-latency", type=float, default=0.2, help="seconds, per image")
+    parser.add_argument("--telegram-latency", type=float, default=0.1, help="seconds")
+    parser.add_argument("--output", help="file for the results, stdout by default")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    report = {
+        "commit": git_commit(),
+        "args": vars(args),
+        "results": asyncio.run(run_benchmark(args)),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Reading TikTok web pages: the whole body vs. streaming up to the end of the rehydration JSON.
+
+Pages built from `fixtures/web_*.json` (the same way the stub server does) are served
+by a local keep-alive server in another process, and read with the app's pooled session:
+
+- `read_all` reads the whole page into memory and cuts the script out of it,
+- `stream` is what `TikTokWebParser` does: it reads up to the end of the script
+  and drains the rest of the page, so the connection goes back to the pool,
+- `stream_no_drain` stops at the end of the script, so every page costs a new connection.
+
+The JSON is decoded the same way by all of them. Reported for each: parse time, bytes
+read from the socket, opened connections and peak memory allocated during one parse.
+
+Usage: BOT_TOKEN=1:a python -m benchmarks.bench_web --page-size 300000 --tail-size 60000
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from pathlib import Path
+from typing import Any
+
+from aiohttp import ClientResponse, ClientSession, web
+
+from benchmarks.load import (
+    ConnectionCounter,
+    free_port,
+    git_commit,
+    percentiles,
+    wait_for_stub,
+)
+from benchmarks.stub_server import FIXTURES, fill_item, redirect_to, render_filler, render_page
+
+Strategy = Callable[[ClientResponse], Awaitable[bytes | bytearray | None]]
+
+
+def build_pages(page_size: int, tail_size: int, images: int) -> list[bytes]:
+    filler = render_filler(page_size)
+    pages: list[bytes] = []
+    for kind in ("video", "photo"):
+        template = (FIXTURES / f"web_{kind}.json").read_text()
+        item = fill_item(template, 7_300_000_000_000_000_000, images)
+        detail = {"itemInfo": {"itemStruct": item}, "statusCode": 0, "statusMsg": ""}
+        pages.append(render_page(detail, filler, tail_size).encode())
+    return pages
+
+
+def serve(port: int, args: argparse.Namespace) -> None:
+    pages = build_pages(args.page_size, args.tail_size, args.images)
+    # like a real network, the page arrives in parts
+    delay = args.chunk_size / (args.bandwidth * 1024 * 1024)
+
+    async def stats(_: web.Request) -> web.Response:  # noqa: RUF029
+        return web.json_response({})
+
+    async def page(request: web.Request) -> web.StreamResponse:
+        body = pages[int(request.match_info["aweme_id"]) % len(pages)]
+        response = web.StreamResponse(headers={"Content-Type": "text/html"})
+        response.content_length = len(body)
+        await response.prepare(request)
+        # `stream_no_drain` closes the connection before the end
+        with suppress(ConnectionResetError):
+            for start in range(0, len(body), args.chunk_size):
+                await response.write(body[start : start + args.chunk_size])
+                await asyncio.sleep(delay)
+            await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/__stats", stats)
+    app.router.add_get("/@i/video/{aweme_id}", page)
+    web.run_app(app, host="127.0.0.1", port=port, print=None)
+
+
+async def read_all(response: ClientResponse) -> bytes | bytearray | None:
+    from bot.services.tiktok_web import SCRIPT_END, SCRIPT_START  # noqa: PLC0415
+
+    body = await response.read()
+    start = body.find(SCRIPT_START)
+    if start == -1:
+        return None
+    start += len(SCRIPT_START)
+    return body[start : body.find(SCRIPT_END, start)]
+
+
+async def stream(response: ClientResponse) -> bytes | bytearray | None:
+    from bot.services.tiktok_web import drain, extract_rehydration_json  # noqa: PLC0415
+
+    json_bytes = await extract_rehydration_json(response.content)
+    await drain(response.content)
+    return json_bytes
+
+
+async def stream_no_drain(response: ClientResponse) -> bytes | bytearray | None:
+    from bot.services.tiktok_web import extract_rehydration_json  # noqa: PLC0415
+
+    return await extract_rehydration_json(response.content)
+
+
+async def parse(session: ClientSession, strategy: Strategy, aweme_id: int) -> int:
+    """Parse the page the way `TikTokWebParser` does.
+
+    Returns
+    -------
+    The bytes read from the socket.
+
+    """
+    from bot.services.tiktok_web import HEADERS, URL, decode_video_detail  # noqa: PLC0415
+
+    async with session.get(URL + str(aweme_id), headers=HEADERS) as response:
+        json_bytes = await strategy(response)
+        assert json_bytes is not None
+        decode_video_detail(json_bytes)
+        return response.content.total_bytes
+
+
+async def measure(strategy: Strategy, url: str, args: argparse.Namespace) -> dict[str, Any]:
+    from bot.services.http_client import create_http_session  # noqa: PLC0415
+
+    connections = ConnectionCounter()
+    session = create_http_session(
+        middlewares=(redirect_to(url),),
+        trace_configs=(connections.trace_config,),
+    )
+    try:
+        # warm up, so the first connection isn't counted in the latencies
+        await parse(session, strategy, 0)
+
+        latencies: list[float] = []
+        bytes_read = 0
+        opened = connections.opened
+        for aweme_id in range(args.parses):
+            start = time.perf_counter()
+            bytes_read += await parse(session, strategy, aweme_id)
+            latencies.append(time.perf_counter() - start)
+        opened = connections.opened - opened
+
+        # tracing allocations slows everything down, so it's a separate pass
+        tracemalloc.start()
+        peak = 0
+        for aweme_id in range(args.memory_parses):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            await parse(session, strategy, aweme_id)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+    finally:
+        await session.close()
+
+    return {
+        "latency_ms": percentiles(latencies),
+        "kb_read_per_parse": round(bytes_read / args.parses / 1024, 1),
+        "connections_opened": opened,
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+async def run_benchmark(args: argparse.Namespace, url: str) -> dict[str, Any]:
+    return {
+        strategy.__name__: await measure(strategy, url, args)
+        for strategy in (read_all, stream, stream_no_drain)
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=300 * 1024, help="bytes before the JSON")
+    parser.add_argument("--tail-size", type=int, default=60 * 1024, help="bytes after the JSON")
+    parser.add_argument("--images", type=int, default=4, help="images of the photo post")
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024, help="bytes")
+    parser.add_argument("--bandwidth", type=float, default=50, help="MB/s of the server")
+    parser.add_argument("--parses", type=int, default=200)
+    parser.add_argument("--memory-parses", type=int, default=20)
+    parser.add_argument("--output", help="file for the results, stdout by default")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = multiprocessing.get_context("spawn").Process(
+        target=serve,
+        args=(port, args),
+        daemon=True,
+    )
+    server.start()
+    try:
+        asyncio.run(wait_for_stub(url))
+        results = asyncio.run(run_benchmark(args, url))
+    finally:
+        server.terminate()
+        server.join()
+
+    report = {"commit": git_commit(), "args": vars(args), "results": results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""Load test of the whole bot, offline: TikTok and Bot API are served by `stub_server`.
+
+Synthetic updates with TikTok links are sent to the real dispatcher at a fixed rate
+(open loop, so a slow bot doesn't slow the load down), and the results are printed as
+JSON: throughput, latency percentiles of the updates, peak memory and open sockets.
+`--mode` is how the updates get to the dispatcher:
+
+- `feed`: directly, with `Dispatcher.feed_raw_update`,
+- `polling`: the stub answers `getUpdates` of `Dispatcher.start_polling` with them,
+- `webhook`: they're POSTed to the aiohttp server of `run_webhook`.
+
+Usage: python -m benchmarks.load --mode webhook --rate 20 --duration 30 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import signal
+import socket
+import statistics
+import subprocess  # noqa: S404
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from dataclasses import asdict, fields
+from pathlib import Path
+from typing import Any, Final
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+from aiohttp import ClientError, ClientResponse, ClientSession, TraceConfig
+from typing_extensions import override
+
+from benchmarks.stub_server import StubConfig, redirect_to, run
+
+BOT_TOKEN: Final[str] = "123456:benchmark"  # noqa: S105
+WEBHOOK_SECRET: Final[str] = "benchmark"  # noqa: S105
+FIRST_AWEME_ID: Final[int] = 7_300_000_000_000_000_000
+SAMPLE_INTERVAL: Final[float] = 0.1  # seconds
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def open_sockets() -> int:
+    count = 0
+    for fd in Path("/proc/self/fd").iterdir():
+        with suppress(OSError):
+            count += str(fd.readlink()).startswith("socket:")
+    return count
+
+
+class ConnectionCounter:
+    """Counts the connections opened by a session, each one is a TCP (and TLS) handshake."""
+
+    def __init__(self) -> None:
+        self.opened = 0
+        self.trace_config = TraceConfig()
+        self.trace_config.on_connection_create_end.append(self._on_connection_create_end)
+
+    async def _on_connection_create_end(self, *_: object) -> None:
+        self.opened += 1
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    if len(latencies) < 2:  # noqa: PLR2004
+        return {}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 1),
+        "p95": round(cuts[94] * 1000, 1),
+        "p99": round(cuts[98] * 1000, 1),
+        "max": round(max(latencies) * 1000, 1),
+        "mean": round(statistics.fmean(latencies) * 1000, 1),
+    }
+
+
+class LoadGenerator:
+    """Makes updates like real users do: popular posts are sent again and again."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.chats = args.chats
+        self.posts = args.posts
+        self.hot_share = args.hot_share
+        self.short_link_share = args.short_link_share
+        self.links_per_message = args.links_per_message
+        self.random = random.Random(args.seed)  # noqa: S311
+        self.update_id = 0
+
+    def link(self) -> str:
+        # a tenth of the posts get `hot_share` of the links
+        hot_posts = max(1, self.posts // 10)
+        if self.random.random() < self.hot_share:
+            aweme_id = FIRST_AWEME_ID + self.random.randrange(hot_posts)
+        else:
+            aweme_id = FIRST_AWEME_ID + self.random.randrange(self.posts)
+
+        if self.random.random() < self.short_link_share:
+            return f"https://vm.tiktok.com/ZM{aweme_id}/"
+        return f"https://www.tiktok.com/@someone/video/{aweme_id}?is_from_webapp=1"
+
+    def update(self) -> dict[str, Any]:
+        self.update_id += 1
+        chat_id = self.random.randrange(1, self.chats + 1)
+        return {
+            "update_id": self.update_id,
+            "message": {
+                "message_id": self.update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+                "text": "look " + "\n".join(self.link() for _ in range(self.links_per_message)),
+            },
+        }
+
+
+class Results(BaseMiddleware):
+    """Outer update middleware that records when every update is handled.
+
+    Updates are timed from when they're sent, so the time they take to reach
+    the dispatcher (through the stub's `getUpdates` or the webhook) is counted too.
+    """
+
+    def __init__(self) -> None:
+        # update_id -> when it was sent, until it's handled
+        self.sent_at: dict[int, float] = {}
+        self.latencies: list[float] = []
+        self.failed = 0
+        self.last_handled_at = 0.0
+        self.max_open_sockets = 0
+        self.max_pending = 0
+
+        self.all_sent = False
+        self.all_handled = asyncio.Event()
+
+    @override
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        assert isinstance(event, Update)
+        try:
+            result = await handler(event, data)
+        except Exception:
+            self.finish(event.update_id, failed=True)
+            raise
+        self.finish(event.update_id)
+        return result
+
+    def finish(self, update_id: int, *, failed: bool = False) -> None:
+        sent_at = self.sent_at.pop(update_id, None)
+        if sent_at is None:
+            return
+
+        if failed:
+            self.failed += 1
+        else:
+            self.last_handled_at = time.perf_counter()
+            self.latencies.append(self.last_handled_at - sent_at)
+        if self.all_sent and not self.sent_at:
+            self.all_handled.set()
+
+    def finish_sending(self) -> None:
+        self.all_sent = True
+        if not self.sent_at:
+            self.all_handled.set()
+
+
+async def send(
+    results: Results,
+    deliver: Callable[[dict[str, Any]], Awaitable[object]],
+    update: dict[str, Any],
+) -> None:
+    results.sent_at[update["update_id"]] = time.perf_counter()
+    try:
+        response = await deliver(update)
+    except Exception:  # noqa: BLE001
+        # unless it has failed in a handler (then it's already counted), it wasn't delivered
+        results.finish(update["update_id"], failed=True)
+    else:
+        if isinstance(response, ClientResponse):
+            response.release()
+
+
+async def start_receiving(mode: str, bot: Bot, dp: Dispatcher) -> asyncio.Task[None] | None:
+    """Start getting updates the way the bot does in `mode`.
+
+    Returns
+    -------
+    The task receiving them, `None` in `feed` mode, which needs nothing.
+
+    """
+    if mode == "polling":
+        return asyncio.create_task(
+            dp.start_polling(bot, handle_signals=False, close_bot_session=False),  # pyright: ignore [reportUnknownMemberType]
+        )
+    if mode == "webhook":
+        from bot.config import WEBHOOK_HOST, WEBHOOK_PORT  # noqa: PLC0415
+        from bot.webhook import run_webhook  # noqa: PLC0415
+
+        task = asyncio.create_task(run_webhook(dp, bot))
+        await wait_for_port(WEBHOOK_HOST, WEBHOOK_PORT)
+        return task
+    return None
+
+
+async def stop_receiving(mode: str, dp: Dispatcher, receiver: asyncio.Task[None] | None) -> None:
+    if receiver is None:
+        return
+    if mode == "polling":
+        await dp.stop_polling()
+    else:
+        # `run_webhook` stops (and drains the running updates) on SIGINT
+        signal.raise_signal(signal.SIGINT)
+    await receiver
+
+
+async def wait_for_port(host: str, port: int, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:  # noqa: PERF203
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+        else:
+            writer.close()
+            await writer.wait_closed()
+            return
+
+
+def create_sender(
+    mode: str,
+    bot: Bot,
+    dp: Dispatcher,
+    session: ClientSession,
+    stub_url: str,
+) -> Callable[[dict[str, Any]], Awaitable[object]]:
+    """Make the function that delivers an update to the bot in `mode`.
+
+    Returns
+    -------
+    A function taking the update.
+
+    """
+    if mode == "polling":
+        # the stub answers `getUpdates` with it
+        return lambda update: session.post(f"{stub_url}/__updates", json=[update])
+    if mode == "webhook":
+        from bot.config import WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT  # noqa: PLC0415
+
+        url = f"http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}
+        return lambda update: session.post(url, json=update, headers=headers)
+    return lambda update: dp.feed_raw_update(bot, update)
+
+
+async def run_load(args: argparse.Namespace, stub_url: str) -> dict[str, Any]:
+    # the bot reads its settings on import
+    from bot.app import create_app  # noqa: PLC0415
+    from bot.services.http_client import create_http_session  # noqa: PLC0415
+
+    generator = LoadGenerator(args)
+    results = Results()
+    sending: set[asyncio.Task[None]] = set()
+
+    connections = ConnectionCounter()
+    http_session = create_http_session(
+        middlewares=(redirect_to(stub_url),),
+        trace_configs=(connections.trace_config,),
+    )
+    async with (
+        create_app(http_session) as (bot, dp),
+        ClientSession(raise_for_status=True) as session,
+    ):
+        dp.update.outer_middleware(results)
+        receiver = await start_receiving(args.mode, bot, dp)
+        deliver = create_sender(args.mode, bot, dp, session, stub_url)
+
+        async def sample() -> None:
+            while True:
+                results.max_open_sockets = max(results.max_open_sockets, open_sockets())
+                results.max_pending = max(results.max_pending, len(results.sent_at))
+                await asyncio.sleep(SAMPLE_INTERVAL)
+
+        sampler = asyncio.create_task(sample())
+        total = int(args.rate * args.duration)
+        started = time.perf_counter()
+        for index in range(total):
+            # open loop: every update is sent on its schedule, whatever the bot does
+            delay = started + index / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(send(results, deliver, generator.update()))
+            sending.add(task)
+            task.add_done_callback(sending.discard)
+
+        results.finish_sending()
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(results.all_handled.wait(), args.drain_timeout)
+        unfinished = len(results.sent_at)
+        elapsed = (results.last_handled_at or time.perf_counter()) - started
+        for task in sending:
+            task.cancel()
+        sampler.cancel()
+        await stop_receiving(args.mode, dp, receiver)
+
+        async with http_session.get(f"{stub_url}/__stats") as response:
+            stub_stats = await response.json()
+    await http_session.close()
+
+    completed = len(results.latencies)
+    return {
+        "mode": args.mode,
+        "sent": total,
+        "completed": completed,
+        "failed": results.failed,
+        "unfinished": unfinished,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_per_second": round(completed / elapsed, 2),
+        "latency_ms": percentiles(results.latencies),
+        "max_pending": results.max_pending,
+        # kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "max_open_sockets": results.max_open_sockets,
+        "connections_opened": connections.opened,
+        "stub": stub_stats,
+    }
+
+
+async def wait_for_stub(url: str, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    async with ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{url}/__stats") as response:
+                    if response.ok:
+                        return
+            except ClientError:
+                if time.monotonic() > deadline:
+                    raise
+            await asyncio.sleep(0.1)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--mode",
+        choices=("feed", "polling", "webhook"),
+        default="feed",
+        help="how updates get to the dispatcher: fed directly, `getUpdates` or the webhook",
+    )
+    parser.add_argument("--rate", type=float, default=10, help="updates per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="seconds")
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=500, help="distinct posts")
+    parser.add_argument("--hot-share", type=float, default=0.5, help="links to popular posts")
+    parser.add_argument("--short-link-share", type=float, default=0.3)
+    parser.add_argument("--links-per-message", type=int, default=1)
+    parser.add_argument("--parsers", default="web")
+    parser.add_argument("--json-mode", default="fast")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="file for the results, stdout by default")
+
+    defaults = StubConfig()
+    stub = parser.add_argument_group("stub server")
+    for field in fields(StubConfig):
+        stub.add_argument(
+            f"--{field.name.replace('_', '-')}",
+            type=type(getattr(defaults, field.name)),
+            default=getattr(defaults, field.name),
+        )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    stub_config = StubConfig(
+        **{field.name: getattr(args, field.name) for field in fields(StubConfig)},
+    )
+
+    port = free_port()
+    stub_url = f"http://127.0.0.1:{port}"
+    # the stub runs in its own process, so it doesn't compete with the bot for the event loop
+    stub = multiprocessing.get_context("spawn").Process(
+        target=run,
+        args=(stub_config, port),
+        daemon=True,
+    )
+    stub.start()
+
+    os.environ.update(
+        {
+            "BOT_TOKEN": BOT_TOKEN,
+            "TELEGRAM_API_URL": stub_url,
+            "MODE": "webhook" if args.mode == "webhook" else "polling",
+            "WEBHOOK_URL": "https://example.com",
+            "WEBHOOK_PORT": str(free_port()),
+            "WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "WORKERS": "0",
+            "METRICS_PORT": "0",
+            "CACHE_BACKEND": "memory",
+            "PARSERS": args.parsers,
+            "JSON_MODE": args.json_mode,
+            "INSTALL_ID": "7379691220123456789",
+            "DEVICE_ID": "7379690540123456789",
+            # errors are reported to the owner, that's part of the load too
+            "OWNER_ID": "1",
+        },
+    )
+
+    try:
+        asyncio.run(wait_for_stub(stub_url))
+        results = asyncio.run(run_load(args, stub_url))
+    finally:
+        stub.terminate()
+        stub.join()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": int(time.time()),
+        "python": sys.version.split()[0],
+        "args": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in {field.name for field in fields(StubConfig)}
+        },
+        "stub_config": asdict(stub_config),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Local stub of everything the bot talks to: TikTok (web, API, short links, CDN) and Bot API.
+
+Requests are routed by their `Host` header, so the bot is pointed here with
+`redirect_to` (an aiohttp client middleware) and `TELEGRAM_API_URL`. Responses are
+built from the fixtures in `fixtures/`, which mirror real TikTok responses (the fields
+the bot reads and a fair share of the ones it doesn't), with some latency and errors.
+
+Usage: python -m benchmarks.stub_server --port 8090
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+from collections import Counter
+from contextlib import suppress
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Final
+
+from aiohttp import ClientHandlerType, ClientMiddlewareType, ClientRequest, ClientResponse, web
+from yarl import URL
+
+FIXTURES: Final[Path] = Path(__file__).parent / "fixtures"
+
+SCRIPT_START: Final[str] = (
+    '<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">'
+)
+SHORT_LINK_HOSTS: Final[frozenset[str]] = frozenset({"vm.tiktok.com", "vt.tiktok.com"})
+
+
+@dataclass
+class StubConfig:
+    tiktok_latency: float = 0.3  # seconds, of the web page and the API
+    redirect_latency: float = 0.05  # seconds
+    cdn_latency: float = 0.05  # seconds, before the first byte
+    telegram_latency: float = 0.1  # seconds
+    error_rate: float = 0.0  # share of failed TikTok requests (HTTP 504 or a page without data)
+    unavailable_rate: float = 0.02  # share of deleted posts
+    photo_rate: float = 0.2  # share of photo posts
+    images_per_post: int = 4
+    video_size: int = 2 * 1024 * 1024  # bytes
+    image_size: int = 150 * 1024  # bytes
+    page_size: int = 300 * 1024  # bytes, of the scopes before the data of the post
+    tail_size: int = 60 * 1024  # bytes, of the scripts after the rehydration JSON
+
+
+def post_kind(aweme_id: int, config: StubConfig) -> str:
+    """Tell the kind of the post, the same post is always of the same kind.
+
+    Returns
+    -------
+    `"unavailable"`, `"photo"` or `"video"`.
+
+    """
+    share = random.Random(aweme_id).random()  # noqa: S311
+    if share < config.unavailable_rate:
+        return "unavailable"
+    if share < config.unavailable_rate + config.photo_rate:
+        return "photo"
+    return "video"
+
+
+def fill_item(template: str, aweme_id: int, images: int) -> dict[str, Any]:
+    text = template.replace("__AWEME_ID__", str(aweme_id)).replace(
+        "__EXPIRES__",
+        str(int(time.time()) + 6 * 60 * 60),
+    )
+    item = json.loads(text)
+    image_post = item.get("imagePost") or item.get("image_post_info")
+    if image_post is not None:
+        image = json.dumps(image_post["images"][0])
+        image_post["images"] = [
+            json.loads(image.replace("__INDEX__", str(index))) for index in range(images)
+        ]
+    return item
+
+
+def render_filler(size: int) -> str:
+    """Make scopes the bot doesn't need, to be put before `webapp.video-detail`.
+
+    Returns
+    -------
+    About `size` bytes of JSON object members, without the braces.
+
+    """
+    return json.dumps(
+        {f"webapp.scope-{index}": {"data": "x" * 1000} for index in range(size // 1024)},
+    )[1:-1]
+
+
+def render_page(detail: dict[str, Any], filler: str, tail_size: int = 0) -> str:
+    """Make a TikTok web page with the `webapp.video-detail` scope.
+
+    `tail_size` is about how many bytes of other scripts follow the rehydration script.
+
+    Returns
+    -------
+    The HTML of the page.
+
+    """
+    scope = f'{{"__DEFAULT_SCOPE__":{{{filler},"webapp.video-detail":{json.dumps(detail)}}}}}'
+    tail = "<script>/*" + "x" * tail_size + "*/</script>" if tail_size else ""
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>TikTok</title></head><body>'
+        f"{SCRIPT_START}{scope}</script>{tail}"
+        '<script src="https://sf16-website-login.neutral.ttwstatic.com/main.js"></script>'
+        "</body></html>"
+    )
+
+
+class StubServer:
+    def __init__(self, config: StubConfig) -> None:
+        self.config = config
+        self.templates = {path.stem: path.read_text() for path in FIXTURES.glob("*.json")}
+        self.video = random.randbytes(config.video_size)  # noqa: S311
+        self.image = random.randbytes(config.image_size)  # noqa: S311
+        # pages are mostly other scopes the bot doesn't need
+        self.filler = render_filler(config.page_size)
+
+        self.requests: Counter[str] = Counter()
+        self.uploaded_bytes = 0
+        self.file_ids = 0
+
+        # updates for `getUpdates`, pushed by the load test
+        self.updates: list[dict[str, Any]] = []
+        self.new_updates = asyncio.Event()
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=100 * 1024 * 1024)
+        app.router.add_get("/__stats", self.stats)
+        app.router.add_post("/__updates", self.push_updates)
+        app.router.add_route("*", "/{tail:.*}", self.dispatch)
+        return app
+
+    async def stats(self, _: web.Request) -> web.Response:
+        return web.json_response(
+            {"requests": dict(self.requests), "uploaded_bytes": self.uploaded_bytes},
+        )
+
+    async def push_updates(self, request: web.Request) -> web.Response:
+        self.updates.extend(await request.json())
+        self.new_updates.set()
+        return web.json_response({})
+
+    async def get_updates(self, offset: int, limit: int, timeout: float) -> list[dict[str, Any]]:
+        """Long polling: wait up to `timeout` seconds for updates from `offset` on.
+
+        Returns
+        -------
+        Up to `limit` updates, none if the timeout has passed.
+
+        """
+        # like Telegram, updates before the offset are confirmed and forgotten
+        self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates and timeout > 0:
+            self.new_updates.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+        return self.updates[:limit]
+
+    async def dispatch(self, request: web.Request) -> web.StreamResponse:
+        host = request.host.split(":")[0]
+        if host == "www.tiktok.com":
+            return await self.web_page(request)
+        if host in SHORT_LINK_HOSTS:
+            return await self.short_link(request)
+        if request.path.endswith("/multi/aweme/detail/"):
+            return await self.api(request)
+        if "tiktok" in host:
+            return await self.cdn(request)
+        return await self.telegram(request)
+
+    @staticmethod
+    async def sleep(latency: float) -> None:
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))  # noqa: S311
+
+    def fails(self) -> bool:
+        return random.random() < self.config.error_rate  # noqa: S311
+
+    async def web_page(self, request: web.Request) -> web.Response:
+        self.requests["tiktok_web"] += 1
+        await self.sleep(self.config.tiktok_latency)
+
+        aweme_id = int(request.path.rstrip("/").rsplit("/", 1)[-1])
+        if self.fails():
+            # e.g. a captcha page
+            return web.Response(
+                text="<html><body>Please wait...</body></html>",
+                content_type="text/html",
+            )
+
+        kind = post_kind(aweme_id, self.config)
+        if kind == "unavailable":
+            detail: dict[str, Any] = {"statusCode": 10204, "statusMsg": "item doesn't exist"}
+        else:
+            item = fill_item(self.templates[f"web_{kind}"], aweme_id, self.config.images_per_post)
+            detail = {"itemInfo": {"itemStruct": item}, "statusCode": 0, "statusMsg": ""}
+
+        page = render_page(detail, self.filler, self.config.tail_size)
+        response = web.Response(text=page, content_type="text/html")
+        response.set_cookie("tt_chain_token", "stub-token")
+        return response
+
+    async def api(self, request: web.Request) -> web.Response:
+        self.requests["tiktok_api"] += 1
+        await self.sleep(self.config.tiktok_latency)
+        if self.fails():
+            return web.Response(status=504)
+
+        form = await request.post()
+        aweme_ids: list[int] = json.loads(str(form["aweme_ids"]))
+        details = [
+            fill_item(self.templates[f"api_{kind}"], aweme_id, self.config.images_per_post)
+            for aweme_id in aweme_ids
+            if (kind := post_kind(aweme_id, self.config)) != "unavailable"
+        ]
+        return web.json_response({"status_code": 0, "status_msg": "", "aweme_details": details})
+
+    async def short_link(self, request: web.Request) -> web.Response:
+        self.requests["short_link"] += 1
+        await self.sleep(self.config.redirect_latency)
+
+        # short codes look like "ZM<aweme_id>"
+        aweme_id = request.path.strip("/").removeprefix("ZM")
+        location = f"https://www.tiktok.com/@someone/video/{aweme_id}?_t=8qI&_r=1"
+        return web.Response(status=301, headers={"Location": location})
+
+    async def cdn(self, request: web.Request) -> web.Response:
+        # videos (and music) are on *.tiktok.com and *.tiktokv.*, images on *.tiktokcdn.com
+        is_image = request.host.split(":")[0].endswith(".tiktokcdn.com")
+        self.requests["cdn_image" if is_image else "cdn_video"] += 1
+        await self.sleep(self.config.cdn_latency)
+
+        if is_image:
+            return web.Response(body=self.image, content_type="image/jpeg")
+        return web.Response(body=self.video, content_type="video/mp4")
+
+    async def telegram(self, request: web.Request) -> web.Response:
+        method = request.path.rsplit("/", 1)[-1]
+        self.requests[f"telegram_{method}"] += 1
+
+        # reads the uploaded files as well
+        form = await request.post()
+        for value in form.values():
+            if isinstance(value, web.FileField):
+                self.uploaded_bytes += value.file.seek(0, io.SEEK_END)
+        await self.sleep(self.config.telegram_latency)
+
+        chat_id = int(str(form.get("chat_id", "1")))
+        result: Any = True
+        match method.lower():
+            case "getme":
+                result = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+            case "getupdates":
+                result = await self.get_updates(
+                    int(str(form.get("offset", "0"))),
+                    int(str(form.get("limit", "100"))),
+                    float(str(form.get("timeout", "0"))),
+                )
+            case "sendmessage":
+                result = self.message(chat_id, text=str(form.get("text", "")))
+            case "sendvideo":
+                result = self.message(chat_id, video=self.file("video"))
+            case "sendaudio":
+                result = self.message(chat_id, audio=self.file("audio"))
+            case "sendmediagroup":
+                media = json.loads(str(form["media"]))
+                result = [self.message(chat_id, photo=[self.file("photo")]) for _ in media]
+            case _:
+                pass
+        return web.json_response({"ok": True, "result": result})
+
+    def file(self, kind: str) -> dict[str, Any]:
+        self.file_ids += 1
+        file: dict[str, Any] = {
+            "file_id": f"{kind}-{self.file_ids}",
+            "file_unique_id": f"{kind}-{self.file_ids}",
+            "width": 720,
+            "height": 1280,
+        }
+        if kind in {"video", "audio"}:
+            file["duration"] = 15
+        return file
+
+    @staticmethod
+    def message(chat_id: int, **content: object) -> dict[str, Any]:
+        return {
+            "message_id": random.randint(1, 2**31),  # noqa: S311
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            **content,
+        }
+
+
+def redirect_to(base_url: str) -> ClientMiddlewareType:
+    """Create an aiohttp client middleware that sends every request to the stub server.
+
+    Returns
+    -------
+    The middleware, for `create_http_session`.
+
+    """
+    base = URL(base_url)
+
+    async def middleware(request: ClientRequest, handler: ClientHandlerType) -> ClientResponse:
+        request.headers["Host"] = request.url.host or ""
+        request.url = base.with_path(request.url.raw_path, encoded=True).with_query(
+            request.url.raw_query_string,
+        )
+        return await handler(request)
+
+    return middleware
+
+
+def run(config: StubConfig, port: int, host: str = "127.0.0.1") -> None:
+    web.run_app(StubServer(config).create_app(), host=host, port=port, print=None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    defaults = StubConfig()
+    for field in fields(StubConfig):
+        parser.add_argument(
+            f"--{field.name.replace('_', '-')}",
+            type=type(getattr(defaults, field.name)),
+            default=getattr(defaults, field.name),
+        )
+    args = vars(parser.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+
+    config = StubConfig(**args)
+    print(json.dumps(asdict(config)))  # noqa: T201
+    run(config, port, host)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import logging
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+from aiogram import Bot, Dispatcher, loggers
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiohttp import ClientSession
+from rich.logging import RichHandler
+
+from bot.cache.media import CachedMedia, create_media_cache
+from bot.config import (
+    BOT_TOKEN,
+    PROFILE_DIR,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SLOW_THRESHOLD,
+    STORAGE_CHAT_ID,
+    TELEGRAM_API_URL,
+    TRACE_EXPORT,
+)
+from bot.metrics import (
+    ADMISSION_ADMITTED,
+    ADMISSION_DROPPED,
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_WAIT_SECONDS,
+    COALESCING_RATIO,
+    HOT_POSTS,
+    SEND_QUEUE_SIZE,
+)
+from bot.middlewares import AdmissionControl, SendScheduler, TracingMiddleware
+from bot.middlewares.scheduler import GLOBAL_RATE
+from bot.profiling import SlowRequestProfiler
+from bot.routers import command_router, error_router, inline_router, message_router
+from bot.services.caching import CachingParser
+from bot.services.coalescing import CoalescingParser
+from bot.services.http_client import create_http_session
+from bot.services.orchestrator import ParserOrchestrator, create_backends
+from bot.services.refresher import RefreshingParser
+from bot.services.resolver import ShortLinkResolver
+from bot.services.storage import StorageUploader
+from bot.utils import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def create_app(
+    http_session: ClientSession | None = None,
+    global_send_rate: float = GLOBAL_RATE,
+) -> AsyncGenerator[tuple[Bot, Dispatcher], None]:
+    """Create the bot and the dispatcher with all routers and shared resources.
+
+    `http_session` replaces the one for requests to TikTok, the caller has to close it.
+    `global_send_rate` is this process's share of the bot's limit of messages per second.
+
+    Yields
+    ------
+    The bot and the dispatcher, the resources created here are closed on exit.
+
+    """
+    api = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+    bot = Bot(
+        BOT_TOKEN,
+        session=AiohttpSession(api=api),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+
+    # Keeps outgoing messages within Telegram limits
+    send_scheduler = SendScheduler(global_send_rate)
+    bot.session.middleware(send_scheduler)
+
+    # One pooled session for all requests to TikTok, available in handlers as `http_session`
+    owns_http_session = http_session is None
+    if http_session is None:
+        http_session = create_http_session()
+
+    # Telegram file_ids of already sent posts, available in handlers as `media_cache`
+    media_cache = create_media_cache()
+    # posts sent before the restart are answered inline from memory as well
+    warmed = await media_cache.warm()
+    if warmed:
+        logger.info("Loaded %s recently sent posts into the media index.", warmed)
+
+    # Limits how many links are handled at the same time, so the bot degrades gracefully
+    admission_control = AdmissionControl()
+    message_router.message.middleware(admission_control)
+
+    # responses are cached, concurrent requests for the same post
+    # share one fetch and one upload, parsers are asked in order of priority
+    coalescing_parser = CoalescingParser(ParserOrchestrator(create_backends(http_session)))
+    upload_flight: SingleFlight[int, CachedMedia | None] = SingleFlight()
+    # sounds are shared by many posts, so they are uploaded once per music ID
+    audio_flight: SingleFlight[int, str | None] = SingleFlight()
+    # hot posts are parsed again in background before their media URLs expire,
+    # `main` runs the refresh loop
+    parser = RefreshingParser(CachingParser(coalescing_parser))
+
+    # Uploads posts requested inline that nobody has sent yet
+    storage_uploader = (
+        StorageUploader(
+            bot,
+            STORAGE_CHAT_ID,
+            parser,
+            http_session,
+            media_cache,
+            upload_flight,
+            audio_flight,
+        )
+        if STORAGE_CHAT_ID
+        else None
+    )
+
+    dp = Dispatcher(
+        http_session=http_session,
+        media_cache=media_cache,
+        short_link_resolver=ShortLinkResolver(http_session),
+        parser=parser,
+        upload_flight=upload_flight,
+        audio_flight=audio_flight,
+        storage_uploader=storage_uploader,
+        admission_control=admission_control,
+    )
+    dp.include_routers(command_router, error_router, inline_router)
+
+    if TRACE_EXPORT or PROFILE_SAMPLE_RATE:
+        profiler = None
+        if PROFILE_SAMPLE_RATE:
+            profiler = SlowRequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_SLOW_THRESHOLD, PROFILE_DIR)
+        dp.update.outer_middleware(TracingMiddleware(profiler))
+
+    # this router should be the last one
+    dp.include_router(message_router)
+
+    # metrics that are read from the running objects
+    COALESCING_RATIO.set_function(
+        lambda: coalescing_parser.flight.coalescing_ratio,
+        'flight="parse"',
+    )
+    COALESCING_RATIO.set_function(lambda: upload_flight.coalescing_ratio, 'flight="upload"')
+    COALESCING_RATIO.set_function(lambda: audio_flight.coalescing_ratio, 'flight="audio"')
+    HOT_POSTS.set_function(lambda: parser.tracked)
+    SEND_QUEUE_SIZE.set_function(lambda: send_scheduler.queue_size)
+    ADMISSION_IN_FLIGHT.set_function(lambda: admission_control.in_flight)
+    ADMISSION_QUEUE_DEPTH.set_function(lambda: admission_control.queue_depth)
+    ADMISSION_ADMITTED.set_function(lambda: admission_control.admitted)
+    ADMISSION_DROPPED.set_function(lambda: admission_control.shed, 'reason="queue_full"')
+    ADMISSION_DROPPED.set_function(lambda: admission_control.expired, 'reason="deadline"')
+    ADMISSION_WAIT_SECONDS.set_function(lambda: admission_control.wait_time_total)
+
+    try:
+        yield bot, dp
+    finally:
+        if storage_uploader is not None:
+            await storage_uploader.close()
+        if owns_http_session:
+            await http_session.close()
+        await media_cache.close()
+        await send_scheduler.close()
+        await bot.session.close()
+
+
+def setup_logging() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        datefmt="[%d/%m/%y %H:%M:%S]",
+        handlers=[
+            # This bot is far from the most stable, so I need cool tracebacks
+            RichHandler(rich_tracebacks=True),
+        ],
+    )
+
+    # disable annoying aiogram update info messages
+    loggers.event.setLevel(logging.WARNING)
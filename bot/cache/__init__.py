@@ -0,0 +1,33 @@
+from abc import ABC, abstractmethod
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class BaseCache(ABC, Generic[T]):
+    @abstractmethod
+    async def get(self, key: str) -> T | None:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: T, ttl: float | None = None) -> None:
+        """Store the value. If `ttl` is not given, the cache's default TTL is used."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        pass
+
+    async def recent(self, prefix: str, limit: int) -> list[tuple[str, T]]:  # noqa: ARG002, PLR6301
+        """Find the most recently used entries whose keys start with `prefix`.
+
+        Only persistent backends have something to return after a restart.
+
+        Returns
+        -------
+        Up to `limit` pairs of the key and the value, the most recently used first.
+
+        """
+        return []
+
+    async def close(self) -> None:
+        """Release resources held by the backend (if any)."""
@@ -0,0 +1,105 @@
+import logging
+from typing import Final
+
+from pydantic import BaseModel
+
+from bot.cache import BaseCache
+from bot.cache.memory import MemoryCache
+from bot.cache.sqlite import SQLiteCache
+from bot.config import CACHE_BACKEND, CACHE_MAX_SIZE, CACHE_PATH, CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# How many recently used posts are kept in memory, ready for inline queries
+INDEX_SIZE: Final[int] = 10_000
+
+
+class CachedMedia(BaseModel):
+    """Telegram `file_id`s of the media that was already sent for some post."""
+
+    video: str | None = None
+    photos: list[str] | None = None
+    audio: str | None = None  # soundtrack of a photo post
+
+
+class MediaCache:
+    """Maps aweme_id to `CachedMedia`, so Telegram doesn't have to download the same post again.
+
+    The most recently used posts are also kept in memory, already deserialized (`index`),
+    so they are found without a round trip to the backend, e.g. when answering inline queries.
+    """
+
+    def __init__(self, backend: BaseCache[str], index_size: int = INDEX_SIZE) -> None:
+        self.backend = backend
+        self.index: MemoryCache[CachedMedia] = MemoryCache(index_size, CACHE_TTL)
+
+    async def get(self, aweme_id: int) -> CachedMedia | None:
+        key = f"media:{aweme_id}"
+        media = self.index.get_nowait(key)
+        if media is not None:
+            return media
+
+        value = await self.backend.get(key)
+        if value is None:
+            return None
+        media = CachedMedia.model_validate_json(value)
+        self.index.set_nowait(key, media)
+        return media
+
+    async def set(self, aweme_id: int, media: CachedMedia) -> None:
+        key = f"media:{aweme_id}"
+        self.index.set_nowait(key, media)
+        await self.backend.set(key, media.model_dump_json(exclude_none=True))
+
+    async def delete(self, aweme_id: int) -> None:
+        key = f"media:{aweme_id}"
+        await self.index.delete(key)
+        await self.backend.delete(key)
+
+    async def get_audio(self, music_id: int) -> str | None:
+        """Look up the sound, it's shared by every post that uses it.
+
+        Returns
+        -------
+        Its `file_id`, `None` if it hasn't been sent yet.
+
+        """
+        return await self.backend.get(f"music:{music_id}")
+
+    async def set_audio(self, music_id: int, file_id: str) -> None:
+        await self.backend.set(f"music:{music_id}", file_id)
+
+    async def delete_audio(self, music_id: int) -> None:
+        await self.backend.delete(f"music:{music_id}")
+
+    async def warm(self) -> int:
+        """Fill the index with the posts most recently used before the restart.
+
+        Returns
+        -------
+        How many posts have been loaded.
+
+        """
+        entries = await self.backend.recent("media:", self.index.max_size)
+        # from the least recently used, so the order of the index is the same
+        for key, value in reversed(entries):
+            self.index.set_nowait(key, CachedMedia.model_validate_json(value))
+        return len(entries)
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def create_media_cache() -> MediaCache:
+    backend: BaseCache[str]
+    match CACHE_BACKEND:
+        case "memory":
+            backend = MemoryCache(CACHE_MAX_SIZE, CACHE_TTL)
+        case "sqlite":
+            backend = SQLiteCache(CACHE_PATH, CACHE_MAX_SIZE, CACHE_TTL)
+        case _:
+            msg = f"Unknown CACHE_BACKEND: {CACHE_BACKEND!r}"
+            raise ValueError(msg)
+
+    logger.info("Using %s backend for Telegram file_id cache.", CACHE_BACKEND)
+    return MediaCache(backend)
@@ -0,0 +1,75 @@
+import math
+import time
+from collections import OrderedDict
+
+from typing_extensions import override
+
+from bot.cache import BaseCache, T
+
+
+class MemoryCache(BaseCache[T]):
+    """In-process LRU cache with TTL. Every operation is O(1)."""
+
+    def __init__(self, max_size: int, ttl: float | None = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (expires_at, value), ordered from the least to the most recently used
+        self._data: OrderedDict[str, tuple[float | None, T]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @override
+    async def get(self, key: str) -> T | None:
+        return self.get_nowait(key)
+
+    @override
+    async def set(self, key: str, value: T, ttl: float | None = None) -> None:
+        self.set_nowait(key, value, ttl)
+
+    @override
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def get_nowait(self, key: str) -> T | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def expires_in(self, key: str) -> float | None:
+        """Tell how long the key stays cached.
+
+        Unlike `get_nowait`, it doesn't count as a use of the key.
+
+        Returns
+        -------
+        Seconds until it expires, `inf` if it never does, `None` if it's missing.
+
+        """
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at = item[0]
+        if expires_at is None:
+            return math.inf
+        expires_in = expires_at - time.monotonic()
+        return expires_in if expires_in > 0 else None
+
+    def set_nowait(self, key: str, value: T, ttl: float | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
@@ -0,0 +1,142 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Any, Final
+
+from typing_extensions import override
+
+from bot.cache import BaseCache
+
+# How often (in writes) to drop expired entries, `get` skips them, but they take space
+EVICT_EXPIRED_EVERY: Final[int] = 100
+# `UPDATE ... RETURNING` appeared in SQLite 3.35
+MIN_SQLITE_VERSION: Final[tuple[int, int, int]] = (3, 35, 0)
+
+
+class SQLiteCache(BaseCache[str]):
+    """Persistent LRU cache with TTL, survives bot restarts.
+
+    It never holds more than `max_size` entries: the write that goes over the limit
+    drops the least recently used ones. Requires SQLite 3.35 or newer.
+    Queries are executed in a worker thread, so the event loop is never blocked by disk I/O.
+    """
+
+    def __init__(self, path: str, max_size: int, ttl: float | None = None) -> None:
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            required = ".".join(map(str, MIN_SQLITE_VERSION))
+            msg = f"SQLiteCache requires SQLite {required} or newer, got {sqlite3.sqlite_version}"
+            raise RuntimeError(msg)
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._size = 0  # rows in the table, expired ones included
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, "
+                "expires_at REAL, "
+                "accessed_at REAL NOT NULL"
+                ")",
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)",
+            )
+            self._size = self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            # `max_size` may have been lowered since the last run
+            self._trim()
+
+    @override
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get, key)
+
+    @override
+    async def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    @override
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    @override
+    async def recent(self, prefix: str, limit: int) -> list[tuple[str, str]]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT key, value FROM cache "
+            "WHERE substr(key, 1, ?) = ? AND (expires_at IS NULL OR expires_at > ?) "
+            "ORDER BY accessed_at DESC LIMIT ?",
+            len(prefix),
+            prefix,
+            time.time(),
+            limit,
+        )
+        return [(key, value) for key, value in rows]
+
+    @override
+    async def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _execute(self, sql: str, *params: Any) -> list[Any]:  # noqa: ANN401
+        with self._lock, self._connection:
+            return self._connection.execute(sql, params).fetchall()
+
+    def _get(self, key: str) -> str | None:
+        now = time.time()
+        rows = self._execute(
+            "UPDATE cache SET accessed_at = ? "
+            "WHERE key = ? AND (expires_at IS NULL OR expires_at > ?) "
+            "RETURNING value",
+            now,
+            key,
+            now,
+        )
+        return rows[0][0] if rows else None
+
+    def _set(self, key: str, value: str, ttl: float | None) -> None:
+        now = time.time()
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = now + ttl if ttl is not None else None
+
+        with self._lock, self._connection:
+            exists = self._connection.execute(
+                "SELECT 1 FROM cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            if exists is None:
+                self._size += 1
+
+            self._writes += 1
+            if self._writes % EVICT_EXPIRED_EVERY == 0:
+                self._size -= self._connection.execute(
+                    "DELETE FROM cache WHERE expires_at <= ?",
+                    (now,),
+                ).rowcount
+            self._trim()
+
+    def _delete(self, key: str) -> None:
+        with self._lock, self._connection:
+            self._size -= self._connection.execute(
+                "DELETE FROM cache WHERE key = ?",
+                (key,),
+            ).rowcount
+
+    def _trim(self) -> None:
+        """Drop the least recently used entries over `max_size`, under the lock."""
+        if self._size > self.max_size:
+            self._size -= self._connection.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (self._size - self.max_size,),
+            ).rowcount
@@ -12,15 +12,80 @@ if not BOT_TOKEN:
     msg = "BOT_TOKEN must be set in .env file"
     raise ValueError(msg)
 
+# Base URL of the Bot API server, e.g. a local one "http://localhost:8081" (optional)
+TELEGRAM_API_URL: Final[str] = getenv("TELEGRAM_API_URL", "")
+
+# How to receive updates: "polling" or "webhook" (optional)
+MODE: Final[str] = getenv("MODE", "polling")
+
+# Webhook settings (only if MODE is "webhook")
+WEBHOOK_URL: Final[str] = getenv("WEBHOOK_URL", "")  # public URL, e.g. "https://example.com"
+WEBHOOK_PATH: Final[str] = getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET: Final[str] = getenv("WEBHOOK_SECRET", "")  # random one is generated if empty
+WEBHOOK_HOST: Final[str] = getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT: Final[int] = int(getenv("WEBHOOK_PORT", "8080"))
+if MODE == "webhook" and not WEBHOOK_URL:
+    msg = "WEBHOOK_URL must be set in .env file to use webhook mode"
+    raise ValueError(msg)
+
+# Worker processes that handle updates received by this one, 0 to handle them in-process (optional)
+WORKERS: Final[int] = int(getenv("WORKERS", "0"))
+# Queue between this process and the workers: "memory" or "redis" (optional)
+QUEUE_BACKEND: Final[str] = getenv("QUEUE_BACKEND", "memory")
+REDIS_URL: Final[str] = getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Where to serve Prometheus metrics on `/metrics`, port 0 disables it (optional).
+# Worker processes use the next ports: METRICS_PORT + 1 + worker number
+METRICS_HOST: Final[str] = getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT: Final[int] = int(getenv("METRICS_PORT", "0"))
+
+# Where to write traces (OTLP JSON lines): "stdout" or a file path, empty disables it (optional)
+TRACE_EXPORT: Final[str] = getenv("TRACE_EXPORT", "")
+# Share of updates (0..1) profiled with cProfile, 0 disables it (optional).
+# Profiles of the ones slower than PROFILE_SLOW_THRESHOLD seconds are saved to PROFILE_DIR
+PROFILE_SAMPLE_RATE: Final[float] = float(getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_THRESHOLD: Final[float] = float(getenv("PROFILE_SLOW_THRESHOLD", "5"))
+PROFILE_DIR: Final[str] = getenv("PROFILE_DIR", "profiles")
+
 # TikTok API settings (optional)
 INSTALL_ID: Final[str] = getenv("INSTALL_ID", "")
 DEVICE_ID: Final[str] = getenv("DEVICE_ID", "")
 
+# Parsers in order of priority: "web" and/or "api" (optional)
+PARSERS: Final[tuple[str, ...]] = tuple(getenv("PARSERS", "web").replace(" ", "").split(","))
+# Fixed delay (seconds) before asking the next parser. By default, it's p95 latency of the parser
+HEDGE_DELAY: Final[float | None] = float(getenv("HEDGE_DELAY", "0")) or None
+
+# "fast" decodes only needed parts of TikTok responses, falling back to full pydantic
+# validation if that fails. "strict" always uses pydantic (optional)
+JSON_MODE: Final[str] = getenv("JSON_MODE", "fast")
+
+# Preferred video codec: "h265" (smaller, better quality) or "h264" (plays everywhere),
+# if the preferred one isn't available, the other is sent (optional)
+VIDEO_CODEC: Final[str] = getenv("VIDEO_CODEC", "h265")
+
 # For error handling (optional)
 OWNER_ID: Final[str] = getenv("OWNER_ID", "")
 
+# Private chat where posts are uploaded for inline queries, empty disables uploads, so only
+# already sent posts are found inline (optional). Inline mode is enabled with @BotFather
+STORAGE_CHAT_ID: Final[str] = getenv("STORAGE_CHAT_ID", "")
+
+# Telegram file_id cache settings (optional)
+CACHE_BACKEND: Final[str] = getenv("CACHE_BACKEND", "memory")  # "memory" or "sqlite"
+CACHE_PATH: Final[str] = getenv("CACHE_PATH", "cache.sqlite3")
+CACHE_TTL: Final[int] = int(getenv("CACHE_TTL", str(7 * 24 * 60 * 60)))  # seconds
+CACHE_MAX_SIZE: Final[int] = int(getenv("CACHE_MAX_SIZE", "100000"))
+
 # Constants
 TIKWM_PLAY_URL: Final[str] = "https://www.tikwm.com/video/media/play/{}.mp4"
 TIKWM_HD_URL: Final[str] = "https://www.tikwm.com/video/media/hdplay/{}.mp4"
-TIKTOK_URL_PATTERN: Final[re.Pattern[str]] = re.compile(r"((?:www|vm|vt)\.tiktok\.com)/[^\s]+")
-AWEME_ID_PATTERN: Final[re.Pattern[str]] = re.compile(r"(?:video|photo|v)/(\d{19})")
+# tiktok.com with or without www, m. (mobile web), vm. and vt. (short links of the app)
+TIKTOK_URL_PATTERN: Final[re.Pattern[str]] = re.compile(
+    r"\b((?:(?:www|m|vm|vt)\.)?tiktok\.com)/[^\s]+",
+)
+# /@user/video/<id>, /@user/photo/<id>, m.tiktok.com/v/<id>.html, /embed/v2/<id>
+# and ?item_id=<id>. Old posts have shorter IDs
+AWEME_ID_PATTERN: Final[re.Pattern[str]] = re.compile(
+    r"(?:/(?:video|photo|v|embed/v2|embed)/|[?&](?:share_)?item_id=)(\d{10,19})(?!\d)",
+)
@@ -0,0 +1,20 @@
+from typing import Any
+
+from aiogram.filters import Filter
+from aiogram.types import Message
+from typing_extensions import override
+
+from bot.services.links import extract_tiktok_urls
+
+
+class TikTokLinkFilter(Filter):
+    """Pass only the messages with TikTok links, giving the handler their `urls`.
+
+    Most messages in groups have none, and they are rejected by a substring check
+    before any regex runs, so they never reach the handler and its middlewares.
+    """
+
+    @override
+    async def __call__(self, message: Message) -> bool | dict[str, Any]:
+        urls = extract_tiktok_urls(message)
+        return {"urls": urls} if urls else False
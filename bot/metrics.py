@@ -0,0 +1,352 @@
+"""Metrics in Prometheus text format, served on `/metrics`.
+
+It's a tiny in-house implementation: the bot is single-threaded (asyncio), so the metrics
+are plain Python numbers without locks, and recording a value is just a few additions.
+Metrics with labels cache a child per label values, so hot paths can bind it once.
+
+Example:
+-------
+    >>> UPLOADS = Counter("uploads_total", "Uploads to Telegram.", ("media",))
+    >>> UPLOADS.labels("video").inc()
+    >>> with STAGE_SECONDS.labels("resolve_tiktok_url").time():
+    ...     await resolve()
+
+"""
+
+import logging
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from typing import Final, Generic, TypeVar
+
+from aiohttp import web
+from typing_extensions import override
+
+logger = logging.getLogger(__name__)
+
+
+PREFIX: Final[str] = "tiktok_bot_"
+CONTENT_TYPE: Final[str] = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a cache hit to a slow upload of a large video
+DEFAULT_BUCKETS: Final[tuple[float, ...]] = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+ChildT = TypeVar("ChildT", "CounterChild", "HistogramChild")
+
+
+# Parse results that are labelled as they are. The parsers pass TikTok's unknown
+# messages on as they are, so those are labelled "other" to keep the series bounded
+KNOWN_RESULTS: Final[frozenset[str]] = frozenset(
+    {
+        "ok",
+        "video_unavailable",
+        "status_deleted",
+        "status_self_see",
+        "status_reviewing",
+        "status_audit_not_pass",
+        "account_private",
+        "item_is_storypost",
+        "geo_restricted",
+        "server_unavailable",
+    },
+)
+
+
+def result_label(message: str | None) -> str:
+    result = message or "ok"
+    return result if result in KNOWN_RESULTS else "other"
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric(ABC, Generic[ChildT]):
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], ChildT] = {}
+        REGISTRY.register(self)
+
+    def labels(self, *values: str) -> ChildT:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                msg = f"{self.name} expects labels {self.labelnames}, got {values}"
+                raise ValueError(msg)
+            child = self._children[values] = self._create_child()
+        return child
+
+    @abstractmethod
+    def _create_child(self) -> ChildT:
+        pass
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for values, child in self._children.items():
+            yield from self._collect_child(values, child)
+
+    @abstractmethod
+    def _collect_child(self, values: tuple[str, ...], child: ChildT) -> Iterable[str]:
+        pass
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Counter(Metric[CounterChild]):
+    type = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        """Increment the counter without labels."""
+        self.labels().inc(amount)
+
+    @override
+    def _create_child(self) -> CounterChild:
+        return CounterChild()
+
+    @override
+    def _collect_child(self, values: tuple[str, ...], child: CounterChild) -> Iterable[str]:
+        yield f"{self.name}{format_labels(self.labelnames, values)} {format_value(child.value)}"
+
+
+class HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self) -> "Timer":
+        """Observe the duration of the `with` block.
+
+        Returns
+        -------
+        The context manager to time the block with.
+
+        """
+        return Timer(self)
+
+
+class Timer:
+    # a plain class is several times cheaper than `@contextmanager`
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: HistogramChild) -> None:
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_: object) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram(Metric[HistogramChild]):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    @override
+    def _create_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    @override
+    def _collect_child(self, values: tuple[str, ...], child: HistogramChild) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), child.counts, strict=True):
+            cumulative += count
+            labels = format_labels(self.labelnames, values, f'le="{format_value(bound)}"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+
+        labels = format_labels(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {format_value(child.sum)}"
+        yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauge:
+    """A value that is read from the running objects only when the metrics are collected."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self._functions: list[tuple[str, Callable[[], float]]] = []
+        REGISTRY.register(self)
+
+    def set_function(self, func: Callable[[], float], label: str = "") -> None:
+        """Read the value from `func`. `label` is a label pair, e.g. `backend="web"`."""
+        self._functions.append((label, func))
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for label, func in self._functions:
+            labels = "{" + label + "}" if label else ""
+            yield f"{self.name}{labels} {format_value(func())}"
+
+
+class CallbackCounter(Gauge):
+    """A counter that is kept by some running object and read when the metrics are collected."""
+
+    type = "counter"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric[CounterChild] | Metric[HistogramChild] | Gauge] = []
+
+    def register(self, metric: "Metric[CounterChild] | Metric[HistogramChild] | Gauge") -> None:
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY: Final = Registry()
+
+
+# Message handling
+STAGE_SECONDS: Final = Histogram(
+    "stage_seconds",
+    "Time spent in each stage of handling a link.",
+    ("stage",),
+)
+PARSE_SECONDS: Final = Histogram(
+    "parse_seconds",
+    "Time spent by each parser backend, including its retries.",
+    ("backend",),
+)
+PARSE_RESULTS: Final = Counter(
+    "parse_results_total",
+    "Responses of each parser backend by their error (`ok` if successful, `other` if unknown).",
+    ("backend", "result"),
+)
+JSON_DECODE_SECONDS: Final = Histogram(
+    "json_decode_seconds",
+    "Time spent decoding and validating TikTok responses.",
+    ("parser", "mode"),
+)
+RETRIES: Final = Counter("retries_total", "Retried requests to TikTok.")
+UPLOAD_SECONDS: Final = Histogram(
+    "upload_seconds",
+    "Time spent sending the media to Telegram, including the download from TikTok CDN.",
+    ("media",),
+)
+TIKWM_FALLBACKS: Final = Counter(
+    "tikwm_fallbacks_total",
+    "Videos sent from tikwm.com instead of TikTok CDN, by the reason.",
+    ("reason",),
+)
+TOO_LARGE: Final = Counter(
+    "too_large_total",
+    "Videos that were too large to upload, by who has noticed it.",
+    ("source",),
+)
+CDN_REFRESHES: Final = Counter(
+    "cdn_refreshes_total",
+    "Hot posts parsed again in background before their media URLs expire, by the result.",
+    ("result",),
+)
+
+# Running objects, their values are set in `bot.app`
+COALESCING_RATIO: Final = Gauge(
+    "coalescing_ratio",
+    "Share of requests that have joined an already running identical one.",
+)
+SEND_QUEUE_SIZE: Final = Gauge(
+    "send_queue_size",
+    "Outgoing Telegram requests waiting for the rate limits.",
+)
+HOT_POSTS: Final = Gauge("hot_posts", "Posts whose request rates are tracked for refreshes.")
+ADMISSION_IN_FLIGHT: Final = Gauge("admission_in_flight", "Links being handled right now.")
+ADMISSION_QUEUE_DEPTH: Final = Gauge("admission_queue_depth", "Links waiting to be handled.")
+ADMISSION_ADMITTED: Final = CallbackCounter("admission_admitted_total", "Links admitted.")
+ADMISSION_DROPPED: Final = CallbackCounter(
+    "admission_dropped_total",
+    "Links dropped with a `busy` reply, by the reason.",
+)
+ADMISSION_WAIT_SECONDS: Final = CallbackCounter(
+    "admission_wait_seconds_total",
+    "Total time the admitted links have waited in the queue.",
+)
+
+
+async def handle_metrics(_: web.Request) -> web.Response:  # noqa: RUF029
+    return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve `/metrics` in background.
+
+    Returns
+    -------
+    The runner of the server, it has to be cleaned up.
+
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Serving metrics on %s:%s/metrics.", host, port)
+    return runner
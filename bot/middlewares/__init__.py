@@ -0,0 +1,6 @@
+from .admission import AdmissionControl
+from .enqueue import EnqueueMiddleware
+from .scheduler import SendScheduler
+from .tracing import TracingMiddleware
+
+__all__ = ("AdmissionControl", "EnqueueMiddleware", "SendScheduler", "TracingMiddleware")
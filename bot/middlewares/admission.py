@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any, Final
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+from typing_extensions import override
+
+from bot.services.links import LINK_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+# How many links are handled (parsed, downloaded and uploaded) at the same time
+MAX_IN_FLIGHT: Final[int] = 50
+# How many messages of one chat are handled at the same time
+MAX_IN_FLIGHT_PER_CHAT: Final[int] = 2
+# The rest wait in the queue, but not longer than that
+MAX_QUEUE_SIZE: Final[int] = 200
+QUEUE_DEADLINE: Final[float] = 20  # seconds
+
+BUSY_TEXT: Final[str] = "Зараз забагато запитів, спробуйте трохи пізніше."
+
+
+class _Ticket:
+    __slots__ = ("chat_id", "cost", "enqueued_at", "future")
+
+    def __init__(self, chat_id: int, cost: int) -> None:
+        self.chat_id = chat_id
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+
+
+class AdmissionControl(BaseMiddleware):
+    """Limits how many links are handled at the same time, and how many messages per chat.
+
+    A message with many links takes as many slots as it has links in flight at once
+    (see `url_handler`), so the global limit is of links, not of messages.
+    Messages over the limit wait in a FIFO queue. When the queue is full, the oldest
+    message is dropped (it would be the first to miss its deadline anyway), and a message
+    that has waited longer than the deadline is dropped too. Dropped messages get a quick
+    "busy" reply instead of a response that comes too late.
+    Messages without TikTok links never get here, `TikTokLinkFilter` has rejected them.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        max_in_flight_per_chat: int = MAX_IN_FLIGHT_PER_CHAT,
+        max_queue_size: int = MAX_QUEUE_SIZE,
+        deadline: float = QUEUE_DEADLINE,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_chat = max_in_flight_per_chat
+        self.max_queue_size = max_queue_size
+        self.deadline = deadline
+
+        self._in_flight = 0  # links
+        self._chat_in_flight: dict[int, int] = {}  # messages
+        self._waiting: deque[_Ticket] = deque()
+        self._waiting_links = 0
+
+        # metrics, all of them in links
+        self.admitted = 0
+        self.shed = 0  # dropped because the queue was full
+        self.expired = 0  # dropped because the deadline has passed
+        self.wait_time_total = 0.0  # seconds
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting_links
+
+    @override
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Message):
+            return await handler(event, data)
+
+        chat_id = event.chat.id
+        # `urls` are found by `TikTokLinkFilter`, `/audio` takes one link
+        urls: list[str] = data.get("urls") or [""]
+        # the links of a message are prepared `LINK_CONCURRENCY` at a time,
+        # while the previous one is being sent
+        cost = min(len(urls), LINK_CONCURRENCY + 1)
+        if not await self.acquire(chat_id, cost):
+            await event.reply(BUSY_TEXT)
+            return None
+
+        try:
+            return await handler(event, data)
+        finally:
+            self.release(chat_id, cost)
+
+    async def acquire(self, chat_id: int, cost: int = 1) -> bool:
+        """Wait for `cost` free slots.
+
+        Returns
+        -------
+        `True` once they're taken, `False` if the message was dropped.
+
+        """
+        cost = min(cost, self.max_in_flight)
+        # the waiting messages can't start now, otherwise they would have been started already
+        if self._can_start(chat_id, cost):
+            self._start(chat_id, cost, 0)
+            return True
+
+        if len(self._waiting) >= self.max_queue_size:
+            oldest = self._waiting.popleft()
+            self._waiting_links -= oldest.cost
+            oldest.future.set_result(False)
+            self.shed += oldest.cost
+            logger.warning(
+                "Too many requests, dropped the oldest one from chat %s.",
+                oldest.chat_id,
+            )
+
+        ticket = _Ticket(chat_id, cost)
+        self._waiting.append(ticket)
+        self._waiting_links += cost
+
+        granted = False
+        try:
+            granted = await asyncio.wait_for(asyncio.shield(ticket.future), self.deadline)
+        except asyncio.TimeoutError:
+            self.expired += cost
+            logger.warning("Request from chat %s has waited too long, dropped.", chat_id)
+        finally:
+            if not granted:
+                self._abandon(ticket)
+        return granted
+
+    def release(self, chat_id: int, cost: int = 1) -> None:
+        self._in_flight -= min(cost, self.max_in_flight)
+        self._chat_in_flight[chat_id] -= 1
+        if not self._chat_in_flight[chat_id]:
+            del self._chat_in_flight[chat_id]
+
+        self._grant_waiting()
+
+    def _can_start(self, chat_id: int, cost: int) -> bool:
+        return (
+            self._in_flight + cost <= self.max_in_flight
+            and self._chat_in_flight.get(chat_id, 0) < self.max_in_flight_per_chat
+        )
+
+    def _start(self, chat_id: int, cost: int, wait_time: float) -> None:
+        self._in_flight += cost
+        self._chat_in_flight[chat_id] = self._chat_in_flight.get(chat_id, 0) + 1
+
+        self.admitted += cost
+        self.wait_time_total += wait_time * cost
+
+    def _grant_waiting(self) -> None:
+        now = time.monotonic()
+        # the oldest messages go first, but a chat at its limit doesn't block the others
+        for ticket in list(self._waiting):
+            if self._in_flight >= self.max_in_flight:
+                break
+            if self._can_start(ticket.chat_id, ticket.cost):
+                self._waiting.remove(ticket)
+                self._waiting_links -= ticket.cost
+                self._start(ticket.chat_id, ticket.cost, now - ticket.enqueued_at)
+                ticket.future.set_result(True)
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        if not ticket.future.done():
+            # timed out or cancelled while waiting
+            ticket.future.cancel()
+            self._waiting.remove(ticket)
+            self._waiting_links -= ticket.cost
+        elif ticket.future.result():
+            # the slot was granted at the same moment, but nobody is going to use it
+            self.release(ticket.chat_id, ticket.cost)
@@ -0,0 +1,39 @@
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+from typing_extensions import override
+
+from bot.update_queue import BaseQueue, get_partition_key
+
+logger = logging.getLogger(__name__)
+
+
+class EnqueueMiddleware(BaseMiddleware):
+    """Outer update middleware that passes updates to the workers instead of handling them.
+
+    All updates of one chat go to the same partition, so its worker keeps their order.
+    """
+
+    def __init__(self, queue: BaseQueue, partitions: int) -> None:
+        self.queue = queue
+        self.partitions = partitions
+
+    @override
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        assert isinstance(event, Update)
+
+        partition = get_partition_key(event) % self.partitions
+        payload = event.model_dump_json(exclude_unset=True, by_alias=True)
+        if not await self.queue.put(partition, event.update_id, payload):
+            logger.info("Update %s was already queued, skipping.", event.update_id)
+
+        return UNHANDLED
@@ -0,0 +1,288 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Final
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, SendChatAction, SendMediaGroup, SendMessage, TelegramMethod
+from aiogram.methods.base import TelegramType
+from typing_extensions import override
+
+from bot.services.media import StreamingInputFile
+
+logger = logging.getLogger(__name__)
+
+
+ChatId = int | str
+
+# Telegram Bot API limits (https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this)
+GLOBAL_RATE: Final[float] = 30  # messages per second
+PRIVATE_CHAT_RATE: Final[float] = 1  # messages per second
+GROUP_CHAT_RATE: Final[float] = 20 / 60  # messages per second
+PRIVATE_CHAT_BURST: Final[float] = 3
+GROUP_CHAT_BURST: Final[float] = 20
+
+# Buckets of idle chats are forgotten when there are more than that
+MAX_CHAT_BUCKETS: Final[int] = 10_000
+
+# Small text replies go before large uploads
+HIGH_PRIORITY: Final[int] = 0
+LOW_PRIORITY: Final[int] = 1
+
+
+def is_group(chat_id: ChatId) -> bool:
+    # group and channel IDs are negative, usernames are of public channels and groups
+    return isinstance(chat_id, str) or chat_id < 0
+
+
+def is_repeatable(method: TelegramMethod[TelegramType]) -> bool:
+    """Check if the request can be made again: a streamed file can be read only once.
+
+    Returns
+    -------
+    `False` if any of its files is a `StreamingInputFile`.
+
+    """
+    for name in type(method).model_fields:
+        value = getattr(method, name)
+        items = value if isinstance(value, list) else (value,)
+        if any(
+            isinstance(item, StreamingInputFile)
+            or isinstance(getattr(item, "media", None), StreamingInputFile)
+            for item in items
+        ):
+            return False
+    return True
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float, cost: float = 1) -> float:
+        """Compute how long to wait for `cost` tokens.
+
+        Returns
+        -------
+        Seconds, 0 if they're available now.
+
+        """
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        self._refill(now)
+        # a request that costs more than capacity just leaves the bucket in debt
+        missing = min(cost, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, now: float, cost: float = 1) -> None:
+        self._refill(now)
+        self.tokens -= cost
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = time.monotonic() + seconds
+        self.tokens = 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+class _Request:
+    __slots__ = ("cost", "future", "global_cost", "priority", "sequence")
+
+    def __init__(self, priority: int, sequence: int, cost: float, global_cost: float) -> None:
+        self.priority = priority
+        self.sequence = sequence
+        self.cost = cost
+        self.global_cost = global_cost
+        self.future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "_Request") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Keeps outgoing messages within Telegram limits.
+
+    Every `send*` request waits for a token from its chat's bucket and from the global one.
+    Chats with waiting requests are served round-robin, so one busy group can't starve
+    the others, and within that text messages go before uploads. If Telegram still
+    responds with "Too Many Requests", the chat is paused for `retry_after` seconds
+    and the request is repeated, unless it streams a file that has already been read.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE) -> None:
+        # processes sending with the same token share the global limit
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: dict[ChatId, TokenBucket] = {}
+
+        self._waiting: dict[ChatId, list[_Request]] = {}
+        self._chats: deque[ChatId] = deque()  # round-robin order of chats with waiting requests
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task[None] | None = None
+
+    @property
+    def queue_size(self) -> int:
+        return sum(len(requests) for requests in self._waiting.values())
+
+    @override
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id: ChatId | None = getattr(method, "chat_id", None)
+        if (
+            chat_id is None
+            or not method.__api_method__.startswith("send")
+            or isinstance(method, SendChatAction)
+        ):
+            return await make_request(bot, method)
+
+        priority = HIGH_PRIORITY if isinstance(method, SendMessage) else LOW_PRIORITY
+        # Every item of a media group is a separate message, for the global limit and
+        # the per-minute limit of groups. The per-second limit of private chats is for
+        # requests though, otherwise a 35-image slideshow would take half a minute
+        global_cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        cost = global_cost if is_group(chat_id) else 1
+
+        while True:
+            await self.acquire(chat_id, priority, cost, global_cost)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exception:
+                logger.warning(
+                    "Flood control in chat %s, waiting %ss.",
+                    chat_id,
+                    exception.retry_after,
+                )
+                self._get_bucket(chat_id).block(exception.retry_after)
+                if not is_repeatable(method):
+                    # the caller opens the file again, see `upload_media`
+                    raise
+
+    async def acquire(
+        self,
+        chat_id: ChatId,
+        priority: int,
+        cost: float = 1,
+        global_cost: float = 1,
+    ) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        request = _Request(priority, next(self._sequence), cost, global_cost)
+        if chat_id not in self._waiting:
+            self._waiting[chat_id] = []
+            self._chats.append(chat_id)
+        heapq.heappush(self._waiting[chat_id], request)
+
+        self._wakeup.set()
+        await request.future
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._worker
+
+    def _get_bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._forget_idle_buckets()
+
+            if is_group(chat_id):
+                bucket = TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+            else:
+                bucket = TokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _forget_idle_buckets(self) -> None:
+        now = time.monotonic()
+        for chat_id, bucket in list(self.chat_buckets.items()):
+            # a full bucket is the same as a new one
+            if chat_id not in self._waiting and bucket.wait_time(now, bucket.capacity) == 0:
+                del self.chat_buckets[chat_id]
+
+    async def _run(self) -> None:
+        while True:
+            delay = self._grant_next()
+
+            self._wakeup.clear()
+            if delay == 0:
+                continue
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+
+    def _grant_next(self) -> float | None:
+        """Let the next request go.
+
+        Returns
+        -------
+        Seconds to wait until the next one can go (0 if right away),
+        `None` if nobody is waiting.
+
+        """
+        now = time.monotonic()
+        self._drop_cancelled()
+        if not self._chats:
+            return None
+
+        global_delay = self.global_bucket.wait_time(now)
+        if global_delay > 0:
+            return global_delay
+
+        chosen: ChatId | None = None
+        chosen_priority = 0
+        min_delay = float("inf")
+        for chat_id in self._chats:
+            request = self._waiting[chat_id][0]
+            delay = self._get_bucket(chat_id).wait_time(now, request.cost)
+            if delay > 0:
+                min_delay = min(min_delay, delay)
+            elif chosen is None or request.priority < chosen_priority:
+                chosen, chosen_priority = chat_id, request.priority
+
+        if chosen is None:
+            return min_delay
+
+        request = heapq.heappop(self._waiting[chosen])
+        self._get_bucket(chosen).take(now, request.cost)
+        self.global_bucket.take(now, request.global_cost)
+        request.future.set_result(None)
+
+        # move the chat to the end of the round
+        self._chats.remove(chosen)
+        if self._waiting[chosen]:
+            self._chats.append(chosen)
+        else:
+            del self._waiting[chosen]
+
+        return 0
+
+    def _drop_cancelled(self) -> None:
+        for chat_id in list(self._chats):
+            requests = self._waiting[chat_id]
+            while requests and requests[0].future.done():
+                heapq.heappop(requests)
+            if not requests:
+                del self._waiting[chat_id]
+                self._chats.remove(chat_id)
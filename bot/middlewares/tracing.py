@@ -0,0 +1,41 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from typing_extensions import override
+
+from bot.profiling import SlowRequestProfiler
+from bot.tracing import span
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer update middleware that starts the trace of every update.
+
+    If `profiler` is set, it also profiles a share of the updates and keeps the slow ones.
+    """
+
+    def __init__(self, profiler: SlowRequestProfiler | None = None) -> None:
+        self.profiler = profiler
+
+    @override
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        assert isinstance(event, Update)
+
+        with span("update", update_id=event.update_id, update_type=event.event_type) as root:
+            chat = getattr(event.event, "chat", None)
+            if chat is not None:
+                root.set_attribute("chat_id", chat.id)
+
+            profile = self.profiler.start() if self.profiler else None
+            try:
+                return await handler(event, data)
+            finally:
+                if profile is not None:
+                    assert self.profiler is not None
+                    self.profiler.stop(profile, f"update-{event.update_id}")
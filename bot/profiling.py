@@ -0,0 +1,53 @@
+import cProfile
+import logging
+import random
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class SlowRequestProfiler:
+    """Profiles a random share of the requests with `cProfile` and keeps profiles of slow ones.
+
+    Only one request is profiled at a time. The profile covers everything the process
+    does meanwhile, including the other requests, which is usually what makes it slow.
+    Profiles are saved as `<directory>/<name>.prof`, open them with `snakeviz` or `pstats`.
+    """
+
+    def __init__(self, sample_rate: float, threshold: float, directory: str) -> None:
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.directory = Path(directory)
+        self._active: cProfile.Profile | None = None
+        self._started_at = 0.0
+
+    def start(self) -> cProfile.Profile | None:
+        """Start profiling if this request is sampled.
+
+        Returns
+        -------
+        The running profile to pass to `stop`, `None` if the request isn't sampled
+        or another one is being profiled.
+
+        """
+        if self._active is not None or random.random() >= self.sample_rate:  # noqa: S311
+            return None
+
+        self._active = cProfile.Profile()
+        self._started_at = time.monotonic()
+        self._active.enable()
+        return self._active
+
+    def stop(self, profile: cProfile.Profile, name: str) -> None:
+        profile.disable()
+        self._active = None
+
+        duration = time.monotonic() - self._started_at
+        if duration < self.threshold:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{name}.prof"
+        profile.dump_stats(path)
+        logger.warning("Slow request (%.1fs), its profile is saved to %s.", duration, path)
@@ -1,5 +1,6 @@
 from .command import command_router
 from .error import error_router
+from .inline import inline_router
 from .message import message_router
 
-__all__ = ("command_router", "error_router", "message_router")
+__all__ = ("command_router", "error_router", "inline_router", "message_router")
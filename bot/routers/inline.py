@@ -0,0 +1,80 @@
+import logging
+from typing import Final
+
+from aiogram import F, Router
+from aiogram.types import (
+    InlineQuery,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultCachedVideo,
+    InlineQueryResultsButton,
+    InlineQueryResultUnion,
+)
+
+from bot.cache.media import CachedMedia, MediaCache
+from bot.routers.message import resolve_tiktok_url
+from bot.services.links import TIKTOK_DOMAIN, extract_aweme_id, extract_tiktok_url
+from bot.services.resolver import ShortLinkResolver
+from bot.services.storage import StorageUploader
+
+logger = logging.getLogger(__name__)
+
+# Telegram waits for the answer about 10 seconds, a part of it is spent before and after
+UPLOAD_WAIT: Final[float] = 6  # seconds
+# How long Telegram itself may show the same results for the same query
+CACHE_TIME: Final[int] = 24 * 60 * 60  # seconds
+# Telegram limit of results per answer
+MAX_RESULTS: Final[int] = 50
+
+inline_router = Router()
+
+
+@inline_router.inline_query(F.query.contains(TIKTOK_DOMAIN))
+async def inline_handler(
+    inline_query: InlineQuery,
+    media_cache: MediaCache,
+    short_link_resolver: ShortLinkResolver,
+    storage_uploader: StorageUploader | None,
+) -> None:
+    url = extract_tiktok_url(inline_query.query)
+    full_url = await resolve_tiktok_url(short_link_resolver, url) if url else None
+    aweme_id = extract_aweme_id(full_url) if full_url else None
+    if not aweme_id:
+        await inline_query.answer([], cache_time=CACHE_TIME)
+        return
+
+    # popular posts are already in memory, the rest are uploaded to the storage chat
+    media = await media_cache.get(aweme_id)
+    if media is None and storage_uploader is not None:
+        media = await storage_uploader.upload(aweme_id, UPLOAD_WAIT)
+
+    if media is None:
+        # too slow (or failed), the user will try again and the post is likely ready by then
+        await inline_query.answer(
+            [],
+            cache_time=0,
+            is_personal=True,
+            button=InlineQueryResultsButton(
+                text="Завантажую... Спробуйте ще раз за мить",
+                start_parameter="inline",
+            ),
+        )
+        return
+
+    await inline_query.answer(build_results(aweme_id, media), cache_time=CACHE_TIME)
+
+
+def build_results(aweme_id: int, media: CachedMedia) -> list[InlineQueryResultUnion]:
+    if media.photos:
+        return [
+            InlineQueryResultCachedPhoto(id=f"{aweme_id}-{index}", photo_file_id=file_id)
+            for index, file_id in enumerate(media.photos[:MAX_RESULTS])
+        ]
+    if media.video:
+        return [
+            InlineQueryResultCachedVideo(
+                id=str(aweme_id),
+                video_file_id=media.video,
+                title="TikTok",
+            ),
+        ]
+    return []
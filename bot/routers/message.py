@@ -1,37 +1,191 @@
 # ruff: noqa: E501
 
+import asyncio
 import logging
+from typing import NamedTuple
+from urllib.parse import urlsplit
 
-from aiogram import Bot, F, Router, html
+from aiogram import Bot, Router, html
 from aiogram.exceptions import TelegramBadRequest, TelegramEntityTooLarge
+from aiogram.filters import Command, CommandObject
 from aiogram.types import (
     InputMediaPhoto,
     Message,
-    URLInputFile,
 )
 from aiogram.utils.chat_action import ChatActionSender
 from aiogram.utils.media_group import MediaGroupBuilder
-from aiohttp import ClientSession
-
-from bot.config import AWEME_ID_PATTERN, OWNER_ID, TIKTOK_URL_PATTERN, TIKWM_HD_URL, TIKWM_PLAY_URL
-from bot.services import ApiResponse, Data, tiktok_web
-from bot.utils import HeaderMap, split_list_into_chunks
+from aiohttp import ClientError, ClientSession
+
+from bot.cache.media import CachedMedia, MediaCache
+from bot.config import OWNER_ID, TIKWM_HD_URL, TIKWM_PLAY_URL
+from bot.filters import TikTokLinkFilter
+from bot.metrics import STAGE_SECONDS, TIKWM_FALLBACKS, TOO_LARGE, UPLOAD_SECONDS
+from bot.services import ApiResponse, BaseParser, Data
+from bot.services.links import (
+    LINK_CONCURRENCY,
+    WEB_DOMAINS,
+    extract_aweme_id,
+    extract_tiktok_url,
+    extract_tiktok_urls,
+    is_short_link,
+)
+from bot.services.media import (
+    IMAGE_DOWNLOAD_CONCURRENCY,
+    MediaTooLargeError,
+    prefetch_images,
+    upload_media,
+)
+from bot.services.resolver import ShortLinkResolver
+from bot.services.variants import get_video_urls
+from bot.tracing import traced
+from bot.utils import HeaderMap, SingleFlight, split_list_into_chunks
 
 logger = logging.getLogger(__name__)
 
+RESOLVE_SECONDS = STAGE_SECONDS.labels("resolve_tiktok_url")
+EXTRACT_SECONDS = STAGE_SECONDS.labels("extract_aweme_id")
+VIDEO_UPLOAD_SECONDS = UPLOAD_SECONDS.labels("video")
+PHOTO_UPLOAD_SECONDS = UPLOAD_SECONDS.labels("photo")
+AUDIO_UPLOAD_SECONDS = UPLOAD_SECONDS.labels("audio")
+CACHED_UPLOAD_SECONDS = UPLOAD_SECONDS.labels("cached")
 
 message_router = Router()
 
 
-@message_router.message(F.text)
-async def url_handler(message: Message, bot: Bot) -> None:
-    assert message.text is not None
+class PreparedPost(NamedTuple):
+    """A link of the message, resolved and parsed before its turn to be sent."""
+
+    url: str | None  # None if the short link leads nowhere
+    aweme_id: int | None
+    response: ApiResponse | None  # None if the post is already in the media cache
+
+
+@message_router.message(Command("audio"))
+async def audio_handler(  # noqa: PLR0913, PLR0917
+    message: Message,
+    command: CommandObject,
+    bot: Bot,
+    parser: BaseParser,
+    http_session: ClientSession,
+    media_cache: MediaCache,
+    short_link_resolver: ShortLinkResolver,
+    audio_flight: SingleFlight[int, str | None],
+) -> None:
+    """Send only the sound of the post, the link is after the command or in the replied message."""
+    url = extract_tiktok_url(command.args or "")
+    if url is None and message.reply_to_message is not None:
+        urls = extract_tiktok_urls(message.reply_to_message)
+        url = urls[0] if urls else None
+    if url is None:
+        await message.reply("Надішліть команду разом з посиланням на ТікТок: /audio посилання")
+        return
+
+    full_url = await resolve_tiktok_url(short_link_resolver, url)
+    aweme_id = extract_aweme_id(full_url) if full_url else None
+    if not full_url or not aweme_id:
+        await message.reply(
+            "За вашим посиланням нічого не знайдено. "
+            "Перевірте його правильність та спробуйте ще раз.",
+        )
+        return
+
+    response = await parser.parse(aweme_id)
+    if not response.success or response.data is None:
+        await handle_tiktok_error(bot, message, full_url, response.message)
+        return
+
+    if not await send_audio(bot, message, media_cache, http_session, audio_flight, response.data):
+        await message.reply("Я не можу завантажити музику з цього допису.")
+
+
+@message_router.message(TikTokLinkFilter())
+async def url_handler(  # noqa: PLR0913, PLR0917
+    message: Message,
+    urls: list[str],
+    bot: Bot,
+    parser: BaseParser,
+    http_session: ClientSession,
+    media_cache: MediaCache,
+    short_link_resolver: ShortLinkResolver,
+    upload_flight: SingleFlight[int, CachedMedia | None],
+    audio_flight: SingleFlight[int, str | None],
+) -> None:
+    """Send the posts of every TikTok link in the message, `urls` are found by the filter."""
+    # links are resolved and parsed concurrently, but answered one by one in their order,
+    # so the next posts are being prepared while the current one is being sent
+    semaphore = asyncio.Semaphore(LINK_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(
+            prepare_post(semaphore, short_link_resolver, parser, media_cache, url),
+        )
+        for url in urls
+    ]
+    sent: set[int] = set()
+    try:
+        for url, task in zip(urls, tasks, strict=True):
+            try:
+                post = await task
+                if post.aweme_id in sent:
+                    continue  # the same post by another link
+                await handle_post(
+                    bot,
+                    message,
+                    parser,
+                    http_session,
+                    media_cache,
+                    upload_flight,
+                    audio_flight,
+                    post,
+                )
+            except Exception:
+                if len(tasks) == 1:
+                    raise
+                # one broken link shouldn't cost the rest of them
+                logger.exception("Failed to handle the link.\nURL: [%s]", url)
+                await message.reply(f"Щось пішло не так з цим посиланням: {html.quote(url)}")
+                continue
+            if post.aweme_id:
+                sent.add(post.aweme_id)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def prepare_post(
+    semaphore: asyncio.Semaphore,
+    resolver: ShortLinkResolver,
+    parser: BaseParser,
+    media_cache: MediaCache,
+    url: str,
+) -> PreparedPost:
+    async with semaphore:
+        with RESOLVE_SECONDS.time():
+            full_url = await resolve_tiktok_url(resolver, url)
+        if not full_url:
+            return PreparedPost(None, None, None)
+
+        with EXTRACT_SECONDS.time():
+            aweme_id = extract_aweme_id(full_url)
+        if not aweme_id or await media_cache.get(aweme_id) is not None:
+            return PreparedPost(full_url, aweme_id, None)
+
+        return PreparedPost(full_url, aweme_id, await parser.parse(aweme_id))
 
-    url = await resolve_tiktok_url(message.text)
-    if not url:
-        return None  # if url not found in user message, just ignore it
 
-    aweme_id = extract_aweme_id(url)
+async def handle_post(  # noqa: PLR0913, PLR0917
+    bot: Bot,
+    message: Message,
+    parser: BaseParser,
+    http_session: ClientSession,
+    media_cache: MediaCache,
+    upload_flight: SingleFlight[int, CachedMedia | None],
+    audio_flight: SingleFlight[int, str | None],
+    post: PreparedPost,
+) -> None:
+    url, aweme_id = post.url, post.aweme_id
+    if not url:
+        return None
     if not aweme_id:
         logger.warning("Failed to get Aweme ID.\nURL: [%s]", url)
         await message.reply(
@@ -40,9 +194,22 @@ async def url_handler(message: Message, bot: Bot) -> None:
         )
         return None
 
-    response: ApiResponse = await tiktok_web.TikTokWebParser().parse(aweme_id)
+    if await try_send_cached_media(
+        bot,
+        message,
+        parser,
+        http_session,
+        media_cache,
+        audio_flight,
+        aweme_id,
+    ):
+        return None
+
+    # not prepared if it was cached, but the cached file_id has turned out to be invalid
+    response: ApiResponse = post.response or await parser.parse(aweme_id)
     if not response.success:
         if response.message == "geo_restricted":
+            TIKWM_FALLBACKS.labels("geo_restricted").inc()
             response.success = True
             response.data = Data(
                 video_url=TIKWM_PLAY_URL.format(aweme_id),
@@ -56,107 +223,373 @@ async def url_handler(message: Message, bot: Bot) -> None:
 
     if response.data.is_age_restricted:
         # return await message.reply("Це відео обмежено за віком.")
+        TIKWM_FALLBACKS.labels("age_restricted").inc()
         response.data.video_url = TIKWM_PLAY_URL.format(aweme_id)
+        response.data.video_variants = None
+
+    media = await send_post(
+        bot,
+        message,
+        media_cache,
+        http_session,
+        upload_flight,
+        audio_flight,
+        response.data,
+        aweme_id,
+    )
+    if media is None:
+        # nothing was uploaded, so the media URLs from this response shouldn't be reused
+        await parser.invalidate(aweme_id)
 
-    if response.data.images:
-        await handle_image_post(
-            bot,
-            message,
-            response.data.images,
-            response.data.headers,
-        )
+    return None
 
-    elif response.data.video_url:
-        await handle_video_post(
-            bot,
-            message,
-            response.data.headers,
-            response.data.video_url,
-            aweme_id,
-        )
 
-    return None
+@traced
+async def resolve_tiktok_url(resolver: ShortLinkResolver, url: str) -> str | None:
+    """Get the full link (with the Aweme ID) for any TikTok link.
 
+    Returns
+    -------
+    The full link, `None` if it's not a post.
 
-def extract_aweme_id(url: str) -> int | None:
-    if match := AWEME_ID_PATTERN.search(url):
-        return int(match.group(1))
+    """
+    if is_short_link(url):
+        # Mobile App and tiktok.com/t/
+        return await resolver.resolve(url)
+    if urlsplit(url).netloc in WEB_DOMAINS:
+        # TikTok Web, mobile web and embeds
+        return url
     return None
 
 
-async def resolve_tiktok_url(text: str) -> str | None:
-    match = TIKTOK_URL_PATTERN.search(text)
-    if not match:
-        return None
+@traced
+async def try_send_cached_media(  # noqa: PLR0913, PLR0917
+    bot: Bot,
+    message: Message,
+    parser: BaseParser,
+    http_session: ClientSession,
+    media_cache: MediaCache,
+    audio_flight: SingleFlight[int, str | None],
+    aweme_id: int,
+) -> bool:
+    cached = await media_cache.get(aweme_id)
+    if cached is None:
+        return False
+
+    try:
+        with CACHED_UPLOAD_SECONDS.time():
+            audio_sent = await send_cached_media(bot, message, cached)
+    except TelegramBadRequest as exception:
+        # file_id can become invalid, so just send this post as the new one
+        logger.warning("Cached file_id is invalid: %s\nAweme ID: [%s]", exception, aweme_id)
+        await media_cache.delete(aweme_id)
+        return False
+
+    if not audio_sent:
+        # the photos are already sent, so only the sound is uploaded again
+        await media_cache.set(aweme_id, cached.model_copy(update={"audio": None}))
+        response = await parser.parse(aweme_id)
+        audio = (
+            await send_audio(bot, message, media_cache, http_session, audio_flight, response.data)
+            if response.success and response.data is not None
+            else None
+        )
+        if audio is None:
+            await message.reply("Я не можу завантажити музику з цього допису.")
+        else:
+            await media_cache.set(aweme_id, cached.model_copy(update={"audio": audio}))
+
+    return True
+
+
+@traced
+async def send_cached_media(bot: Bot, message: Message, media: CachedMedia) -> bool:
+    """Send already uploaded media by its file_id, without calling TikTok.
+
+    Returns
+    -------
+    `False` if the sound of the photo post hasn't been sent, because its file_id has
+    turned out to be invalid, and it has to be uploaded again. The photos are sent anyway.
 
-    url = "https://" + match.group()
-    domain = match.group(1)
-    match domain:
-        # TikTok Web
-        case "www.tiktok.com":
-            return url
-
-        # Mobile App
-        case "vm.tiktok.com" | "vt.tiktok.com":
-            async with (
-                ClientSession() as session,
-                session.options(url, allow_redirects=False) as request,
+    """
+    if media.photos:
+        for chunk in split_list_into_chunks(media.photos, 10):
+            async with ChatActionSender.upload_photo(
+                message.chat.id,
+                bot,
+                message.message_thread_id,
             ):
-                return request.headers["Location"]
-        case _:
-            return None
+                media_group = MediaGroupBuilder(
+                    [InputMediaPhoto(media=file_id) for file_id in chunk],
+                )
+                await message.reply_media_group(media_group.build())
+
+        if media.audio:
+            try:
+                await message.reply_audio(media.audio)
+            except TelegramBadRequest as exception:
+                logger.warning("Cached audio file_id is invalid: %s", exception)
+                return False
+
+    elif media.video:
+        await message.reply_video(media.video)
 
+    return True
 
-async def handle_image_post(
+
+@traced
+async def send_post(  # noqa: PLR0913, PLR0917
     bot: Bot,
     message: Message,
+    media_cache: MediaCache,
+    http_session: ClientSession,
+    upload_flight: SingleFlight[int, CachedMedia | None],
+    audio_flight: SingleFlight[int, str | None],
+    data: Data,
+    aweme_id: int,
+) -> CachedMedia | None:
+    """Upload the post, or wait for the same post to be uploaded to another chat and reuse it.
+
+    Returns
+    -------
+    The cached media of the post, `None` if nothing could be uploaded.
+
+    """
+    is_uploader = False
+
+    async def upload() -> CachedMedia | None:
+        nonlocal is_uploader
+        is_uploader = True
+
+        if data.images:
+            await handle_image_post(
+                bot,
+                message,
+                media_cache,
+                http_session,
+                data.images,
+                data.headers,
+                aweme_id,
+            )
+            # photos are nothing without their sound
+            audio = await send_audio(bot, message, media_cache, http_session, audio_flight, data)
+            media = await media_cache.get(aweme_id)
+            if audio and media is not None:
+                await media_cache.set(aweme_id, media.model_copy(update={"audio": audio}))
+        elif data.video_url:
+            await handle_video_post(
+                bot,
+                message,
+                media_cache,
+                http_session,
+                data.headers,
+                get_video_urls(data),
+                aweme_id,
+            )
+
+        return await media_cache.get(aweme_id)
+
+    media = await upload_flight.do(aweme_id, upload)
+    if is_uploader:
+        return media
+
+    if media is None:
+        # the upload in another chat failed (too large etc.), so handle it here as well
+        return await upload()
+
+    with CACHED_UPLOAD_SECONDS.time():
+        audio_sent = await send_cached_media(bot, message, media)
+    if not audio_sent:
+        await send_audio(bot, message, media_cache, http_session, audio_flight, data)
+    return media
+
+
+@traced
+async def handle_image_post(  # noqa: PLR0913, PLR0917
+    bot: Bot,
+    message: Message,
+    media_cache: MediaCache,
+    http_session: ClientSession,
     images: list[str],
     headers: HeaderMap | None,
+    aweme_id: int,
 ) -> None:
     if headers is not None:
         # don't ask why
         headers.pop("Cookie", None)
 
+    # images are downloaded by us (much faster than Telegram does it, one by one),
+    # and the next chunk is downloaded while the current one is being sent
+    semaphore = asyncio.Semaphore(IMAGE_DOWNLOAD_CONCURRENCY)
     chunks = split_list_into_chunks(images, 10)
-    for chunk in chunks:
-        async with ChatActionSender.upload_photo(message.chat.id, bot, message.message_thread_id):
-            media_group = MediaGroupBuilder(
-                [
-                    InputMediaPhoto(media=URLInputFile(image, headers.data if headers else None))
-                    for image in chunk
-                ],
-            )
-            await message.reply_media_group(media_group.build())
+    downloads = prefetch_images(http_session, chunks[0], headers, semaphore)
+
+    file_ids: list[str] = []
+    try:
+        for index in range(len(chunks)):
+            files = await asyncio.gather(*downloads)
+            if index + 1 < len(chunks):
+                downloads = prefetch_images(http_session, chunks[index + 1], headers, semaphore)
+
+            async with ChatActionSender.upload_photo(
+                message.chat.id,
+                bot,
+                message.message_thread_id,
+            ):
+                media_group = MediaGroupBuilder([InputMediaPhoto(media=file) for file in files])
+                with PHOTO_UPLOAD_SECONDS.time():
+                    sent = await message.reply_media_group(media_group.build())
+                file_ids.extend(item.photo[-1].file_id for item in sent if item.photo)
+    finally:
+        for download in downloads:
+            download.cancel()
 
+    if file_ids:
+        await media_cache.set(aweme_id, CachedMedia(photos=file_ids))
 
-async def handle_video_post(
+
+@traced
+async def handle_video_post(  # noqa: PLR0913, PLR0917
     bot: Bot,
     message: Message,
+    media_cache: MediaCache,
+    http_session: ClientSession,
     headers: HeaderMap | None,
-    video_url: str,
+    video_urls: list[str],
     aweme_id: int,
 ) -> None:
+    """Send the first variant of the video that isn't too large, from the best one."""
+    if not video_urls:
+        # every variant is known to be too large, nothing to download
+        TOO_LARGE.labels("variants").inc()
+
+    for index, video_url in enumerate(video_urls):
+        try:
+            async with ChatActionSender.upload_video(
+                message.chat.id,
+                bot,
+                message.message_thread_id,
+            ):
+                with VIDEO_UPLOAD_SECONDS.time():
+                    # the video is streamed from TikTok CDN straight to Telegram
+                    sent = await upload_media(http_session, video_url, headers, message.reply_video)
+        except (MediaTooLargeError, TelegramEntityTooLarge) as exception:  # noqa: PERF203
+            TOO_LARGE.labels(
+                "cdn" if isinstance(exception, MediaTooLargeError) else "telegram",
+            ).inc()
+            if index + 1 < len(video_urls):
+                logger.info("Video is too large, trying a smaller one.\nURL: [%s]", video_url)
+        except ClientError as exception:
+            # TikTok CDN didn't give us the video (expired URL etc.)
+            logger.warning("Failed to download the video: %r\nURL: [%s]", exception, video_url)
+            await message.reply(
+                "Це відео завелике (або щось пішло не так) тому Телеграм не може його завантажити.\n"
+                f"Ось пряме посилання на це відео: {html.link('CLICK ME', TIKWM_PLAY_URL.format(aweme_id))}\n"
+                f"Або ось пряме посилання на HD версію: {html.link('CLICK ME', TIKWM_HD_URL.format(aweme_id))}",
+            )
+            return
+        else:
+            if sent.video:
+                await media_cache.set(aweme_id, CachedMedia(video=sent.video.file_id))
+            return
+
+    await message.reply(
+        "Це відео завелике тому Телеграм не може його завантажити.\n"
+        f"Ось пряме посилання на це відео: {html.link('CLICK ME', TIKWM_PLAY_URL.format(aweme_id))}\n"
+        f"Або ось пряме посилання на HD версію: {html.link('CLICK ME', TIKWM_HD_URL.format(aweme_id))}",
+    )
+
+
+@traced
+async def send_audio(  # noqa: PLR0913, PLR0917
+    bot: Bot,
+    message: Message,
+    media_cache: MediaCache,
+    http_session: ClientSession,
+    audio_flight: SingleFlight[int, str | None],
+    data: Data,
+) -> str | None:
+    """Send the sound of the post.
+
+    Thousands of posts share one trending sound, so it's uploaded once: its file_id is
+    cached by music ID, and concurrent uploads of the same sound are coalesced.
+
+    Returns
+    -------
+    The file_id of the sound, `None` if it can't be sent.
+
+    """
+    if not data.music_url:
+        return None
+
+    music_id = data.music_id
+    if music_id:
+        file_id = await media_cache.get_audio(music_id)
+        if file_id:
+            try:
+                with CACHED_UPLOAD_SECONDS.time():
+                    await message.reply_audio(file_id)
+            except TelegramBadRequest as exception:
+                logger.warning(
+                    "Cached audio file_id is invalid: %s\nMusic ID: [%s]",
+                    exception,
+                    music_id,
+                )
+                await media_cache.delete_audio(music_id)
+            else:
+                return file_id
+
+    is_uploader = False
+
+    async def upload() -> str | None:
+        nonlocal is_uploader
+        is_uploader = True
+        return await upload_audio(bot, message, media_cache, http_session, data)
+
+    if not music_id:
+        return await upload()
+
+    file_id = await audio_flight.do(music_id, upload)
+    if is_uploader or file_id is None:
+        return file_id
+
+    with CACHED_UPLOAD_SECONDS.time():
+        await message.reply_audio(file_id)
+    return file_id
+
+
+async def upload_audio(
+    bot: Bot,
+    message: Message,
+    media_cache: MediaCache,
+    http_session: ClientSession,
+    data: Data,
+) -> str | None:
+    assert data.music_url is not None
+
     try:
-        async with ChatActionSender.upload_video(message.chat.id, bot, message.message_thread_id):
-            await message.reply_video(URLInputFile(video_url, headers.data if headers else None))
-    except TelegramEntityTooLarge:
-        await message.reply(
-            "Це відео завелике тому Телеграм не може його завантажити.\n"
-            f"Ось пряме посилання на це відео: {html.link('CLICK ME', TIKWM_PLAY_URL.format(aweme_id))}\n"
-            f"Або ось пряме посилання на HD версію: {html.link('CLICK ME', TIKWM_HD_URL.format(aweme_id))}",
-        )
-    except TelegramBadRequest as exception:
-        match exception.message:
-            # video file is bigger than 20 MB
-            # or something else, i don't know
-            case "Bad Request: failed to get HTTP URL content":
-                await message.reply(
-                    "Це відео завелике (або щось пішло не так) тому Телеграм не може його завантажити.\n"
-                    f"Ось пряме посилання на це відео: {html.link('CLICK ME', TIKWM_PLAY_URL.format(aweme_id))}\n"
-                    f"Або ось пряме посилання на HD версію: {html.link('CLICK ME', TIKWM_HD_URL.format(aweme_id))}",
+        async with ChatActionSender.upload_voice(
+            message.chat.id,
+            bot,
+            message.message_thread_id,
+        ):
+            with AUDIO_UPLOAD_SECONDS.time():
+                # streamed from TikTok CDN straight to Telegram, like videos
+                sent = await upload_media(
+                    http_session,
+                    data.music_url,
+                    data.headers,
+                    lambda audio: message.reply_audio(audio, title=data.music_title),
                 )
-            case _:
-                raise
+    except (MediaTooLargeError, TelegramEntityTooLarge, ClientError) as exception:
+        logger.warning("Failed to send the audio: %r\nURL: [%s]", exception, data.music_url)
+        return None
+
+    if sent.audio is None:
+        return None
+    if data.music_id:
+        await media_cache.set_audio(data.music_id, sent.audio.file_id)
+    return sent.audio.file_id
 
 
 async def handle_tiktok_error(
@@ -5,9 +5,25 @@ from pydantic import BaseModel
 from bot.utils import HeaderMap
 
 
+class VideoVariant(BaseModel):
+    """One rung of the bitrate ladder of a video. Sizes aren't always known."""
+
+    url: str
+    codec: str  # "h264", "h265", "bytevc2" (can't be played by Telegram clients) or "unknown"
+    size: int | None = None  # bytes
+    bitrate: int | None = None  # bits per second
+    width: int | None = None
+    height: int | None = None
+
+
 class Data(BaseModel):
     video_url: str | None
+    # every variant of the video, the best one for uploading is `video_url`
+    video_variants: list[VideoVariant] | None = None
     music_url: str | None
+    # the same sound is used by many posts, so its audio is cached by this ID
+    music_id: int | None = None
+    music_title: str | None = None
     images: list[str] | None
     is_age_restricted: bool = False
     headers: HeaderMap | None = None
@@ -23,3 +39,6 @@ class BaseParser(ABC):
     @abstractmethod
     async def parse(self, aweme_id: int) -> ApiResponse:
         pass
+
+    async def invalidate(self, aweme_id: int) -> None:  # noqa: B027
+        """Forget everything remembered about the post, e.g. when its media URL has failed."""
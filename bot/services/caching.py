@@ -0,0 +1,107 @@
+import time
+from typing import Final
+
+from typing_extensions import override
+
+from bot.cache.memory import MemoryCache
+from bot.services import ApiResponse, BaseParser, Data
+from bot.tracing import span
+from bot.utils import extract_url_expiry
+
+CACHE_MAX_SIZE: Final[int] = 10_000
+
+# Successful responses live until the first of their CDN URLs expires, but no longer than that
+SUCCESS_TTL: Final[int] = 30 * 60  # seconds
+# Don't return URLs that are about to expire
+EXPIRY_MARGIN: Final[int] = 60  # seconds
+
+# Errors from the `ERRORS` maps of the parsers.
+# Not listed ones (e.g. "server_unavailable") are not cached
+ERROR_TTLS: Final[dict[str, int]] = {
+    "video_unavailable": 60 * 60,
+    "status_deleted": 60 * 60,
+    "item_is_storypost": 60 * 60,
+    "geo_restricted": 30 * 60,
+    "account_private": 10 * 60,
+    "status_self_see": 10 * 60,
+    "status_reviewing": 5 * 60,
+    "status_audit_not_pass": 5 * 60,
+}
+
+
+class CachingParser(BaseParser):
+    """Wraps any parser and caches its responses, including errors (with shorter TTLs)."""
+
+    def __init__(self, parser: BaseParser) -> None:
+        self.parser = parser
+        self.cache: MemoryCache[ApiResponse] = MemoryCache(CACHE_MAX_SIZE)
+
+    @override
+    async def parse(self, aweme_id: int) -> ApiResponse:
+        key = str(aweme_id)
+        with span("parse", aweme_id=aweme_id) as current:
+            response = self.cache.get_nowait(key)
+            current.set_attribute("cache_hit", response is not None)
+            if response is None:
+                response = await self.parser.parse(aweme_id)
+                ttl = get_ttl(response)
+                if ttl > 0:
+                    self.cache.set_nowait(key, response, ttl)
+            current.set_attribute("result", response.message or "ok")
+
+        # every caller gets its own copy, because handlers modify the response
+        return response.model_copy(deep=True)
+
+    async def refresh(self, aweme_id: int) -> ApiResponse:
+        """Fetch the post again, bypassing the cache, and cache the new response.
+
+        Returns
+        -------
+        The new response, even if it's an error that isn't cached.
+
+        """
+        response = await self.parser.parse(aweme_id)
+        ttl = get_ttl(response)
+        if ttl > 0:
+            self.cache.set_nowait(str(aweme_id), response, ttl)
+        return response
+
+    def expires_in(self, aweme_id: int) -> float | None:
+        """Tell how long the cached response of the post stays fresh.
+
+        Returns
+        -------
+        Seconds until it goes stale, `None` if it isn't cached.
+
+        """
+        return self.cache.expires_in(str(aweme_id))
+
+    @override
+    async def invalidate(self, aweme_id: int) -> None:
+        await self.cache.delete(str(aweme_id))
+        await self.parser.invalidate(aweme_id)
+
+
+def get_ttl(response: ApiResponse) -> float:
+    if not response.success:
+        return ERROR_TTLS.get(response.message or "", 0)
+
+    if response.data is None:
+        return 0
+
+    expiries = [
+        expiry for url in get_media_urls(response.data) if (expiry := extract_url_expiry(url))
+    ]
+    if not expiries:
+        return SUCCESS_TTL
+
+    return min(SUCCESS_TTL, min(expiries) - time.time() - EXPIRY_MARGIN)
+
+
+def get_media_urls(data: Data) -> list[str]:
+    urls = [url for url in (data.video_url, data.music_url) if url]
+    if data.video_variants:
+        urls.extend(variant.url for variant in data.video_variants)
+    if data.images:
+        urls.extend(data.images)
+    return urls
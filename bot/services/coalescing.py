@@ -0,0 +1,23 @@
+from typing_extensions import override
+
+from bot.services import ApiResponse, BaseParser
+from bot.utils import SingleFlight
+
+
+class CoalescingParser(BaseParser):
+    """Wraps any parser, so concurrent requests for one aweme_id share a single upstream fetch.
+
+    The callers get the same response object, `CachingParser` copies it for each of them.
+    """
+
+    def __init__(self, parser: BaseParser) -> None:
+        self.parser = parser
+        self.flight: SingleFlight[int, ApiResponse] = SingleFlight()
+
+    @override
+    async def parse(self, aweme_id: int) -> ApiResponse:
+        return await self.flight.do(aweme_id, lambda: self.parser.parse(aweme_id))
+
+    @override
+    async def invalidate(self, aweme_id: int) -> None:
+        await self.parser.invalidate(aweme_id)
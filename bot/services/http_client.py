@@ -0,0 +1,55 @@
+from collections.abc import Sequence
+from typing import Final
+
+from aiohttp import (
+    ClientMiddlewareType,
+    ClientSession,
+    ClientTimeout,
+    DummyCookieJar,
+    TCPConnector,
+    TraceConfig,
+)
+
+# Connection pool settings
+POOL_LIMIT: Final[int] = 100
+POOL_LIMIT_PER_HOST: Final[int] = 20
+DNS_CACHE_TTL: Final[int] = 300  # seconds
+KEEPALIVE_TIMEOUT: Final[float] = 60  # seconds
+
+TIMEOUT: Final[ClientTimeout] = ClientTimeout(total=60, connect=10)
+
+
+def create_http_session(
+    middlewares: Sequence[ClientMiddlewareType] = (),
+    trace_configs: Sequence[TraceConfig] = (),
+) -> ClientSession:
+    """Create the app-wide pooled HTTP session (one per process, closed on shutdown).
+
+    `middlewares` are aiohttp client middlewares, e.g. benchmarks redirect all requests
+    to a local stub server with one. `trace_configs` are hooks of aiohttp tracing,
+    benchmarks count the opened connections with them.
+
+    Returns
+    -------
+    The session, the caller has to close it.
+
+    """
+    # Every request to TikTok reuses already opened (and already TLS-handshaked) connections
+    connector = TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        enable_cleanup_closed=True,
+    )
+
+    return ClientSession(
+        connector=connector,
+        timeout=TIMEOUT,
+        # Cookies are per-request (see `TikTokWebParser`), so they must not leak
+        # between requests of different users through the shared session
+        cookie_jar=DummyCookieJar(),
+        middlewares=middlewares,
+        trace_configs=list(trace_configs),
+    )
@@ -0,0 +1,125 @@
+from typing import Final
+from urllib.parse import urlsplit
+
+from aiogram.enums import MessageEntityType
+from aiogram.types import Message
+from aiogram.utils.text_decorations import add_surrogates, remove_surrogates
+
+from bot.config import AWEME_ID_PATTERN, TIKTOK_URL_PATTERN
+
+# Links of one message that are handled, the rest are ignored
+MAX_LINKS_PER_MESSAGE: Final[int] = 20
+# How many links of one message are resolved and parsed at the same time
+LINK_CONCURRENCY: Final[int] = 4
+
+# Every TikTok link contains it, messages without it are rejected before any regex runs.
+# Almost all messages in groups have no TikTok links, so that's the common path
+TIKTOK_DOMAIN: Final[str] = "tiktok.com"
+
+# Full links, the Aweme ID is in them
+WEB_DOMAINS: Final[frozenset[str]] = frozenset({"www.tiktok.com", "tiktok.com", "m.tiktok.com"})
+# Links of the app, redirecting to the full ones
+SHORT_LINK_DOMAINS: Final[frozenset[str]] = frozenset({"vm.tiktok.com", "vt.tiktok.com"})
+# Short links on the web domains: tiktok.com/t/<code>/
+SHORT_LINK_PATH_PREFIX: Final[str] = "/t/"
+
+# Punctuation that is glued to links in chat messages, like "(https://vm.tiktok.com/ZM.../)."
+TRAILING_PUNCTUATION: Final[str] = ".,;:!?)]}>\"'»"
+
+
+def extract_tiktok_urls(message: Message) -> list[str]:
+    """Find TikTok links in the message: in its text or caption and behind `text_link` entities.
+
+    Returns
+    -------
+    The links, normalised and deduplicated (by Aweme ID where it's already known),
+    in the order they appear in the message.
+
+    """
+    text = message.text or message.caption or ""
+    entities = message.entities or message.caption_entities or []
+
+    # (position in the text, URL), the hidden URLs of text links are where their text is
+    found: list[tuple[int, str]] = []
+    if TIKTOK_DOMAIN in text:
+        found.extend(
+            (match.start(), "https://" + match.group())
+            for match in TIKTOK_URL_PATTERN.finditer(text)
+        )
+    if entities:
+        surrogates = add_surrogates(text)
+        for entity in entities:
+            if (
+                entity.type != MessageEntityType.TEXT_LINK
+                or not entity.url
+                or TIKTOK_DOMAIN not in entity.url
+            ):
+                continue
+            if match := TIKTOK_URL_PATTERN.search(entity.url):
+                position = len(remove_surrogates(surrogates[: entity.offset * 2]))
+                found.append((position, "https://" + match.group()))
+    found.sort()
+
+    urls: list[str] = []
+    seen: set[str] = set()
+    for _, url in found:
+        normalized = normalize_url(url)
+        key = dedupe_key(normalized)
+        if key not in seen:
+            seen.add(key)
+            urls.append(normalized)
+            if len(urls) == MAX_LINKS_PER_MESSAGE:
+                break
+    return urls
+
+
+def extract_tiktok_url(text: str) -> str | None:
+    """Find the first TikTok link in the text, e.g. of an inline query.
+
+    Returns
+    -------
+    The normalised link, `None` if there's none.
+
+    """
+    if TIKTOK_DOMAIN in text and (match := TIKTOK_URL_PATTERN.search(text)):
+        return normalize_url("https://" + match.group())
+    return None
+
+
+def is_short_link(url: str) -> bool:
+    """Check if the link has to be resolved (followed) to get the Aweme ID.
+
+    Returns
+    -------
+    `True` for links of the mobile app and `tiktok.com/t/` ones.
+
+    """
+    parts = urlsplit(url)
+    return parts.netloc in SHORT_LINK_DOMAINS or (
+        parts.netloc in WEB_DOMAINS and parts.path.startswith(SHORT_LINK_PATH_PREFIX)
+    )
+
+
+def extract_aweme_id(url: str) -> int | None:
+    """Get the Aweme ID from a full link: from its path, or from the `item_id` query.
+
+    Returns
+    -------
+    The Aweme ID, `None` if the link has none.
+
+    """
+    if match := AWEME_ID_PATTERN.search(url):
+        return int(match.group(1))
+    return None
+
+
+def normalize_url(url: str) -> str:
+    return url.rstrip(TRAILING_PUNCTUATION)
+
+
+def dedupe_key(url: str) -> str:
+    if match := AWEME_ID_PATTERN.search(url):
+        return match.group(1)
+    # short links differ only by the path, the query is just tracking
+    parts = urlsplit(url)
+    return parts.netloc + parts.path.rstrip("/")
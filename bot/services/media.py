@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Final, TypeVar
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import BufferedInputFile, InputFile, URLInputFile
+from aiohttp import ClientError, ClientPayloadError, ClientResponse, ClientSession
+from typing_extensions import override
+
+from bot.utils import HeaderMap
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Telegram Bot API limit for files uploaded with multipart/form-data
+MAX_UPLOAD_SIZE: Final[int] = 50 * 1024 * 1024
+# Telegram Bot API limit for photos
+MAX_PHOTO_SIZE: Final[int] = 10 * 1024 * 1024
+CHUNK_SIZE: Final[int] = 64 * 1024
+
+# Uploads repeated after Telegram's flood control, each one downloads the media again
+MAX_FLOOD_RETRIES: Final[int] = 2
+
+# How many images of one post are downloaded at the same time
+IMAGE_DOWNLOAD_CONCURRENCY: Final[int] = 10
+
+
+class MediaTooLargeError(Exception):
+    def __init__(self, size: int) -> None:
+        super().__init__(f"Media is too large: {size} bytes")
+        self.size = size
+
+
+class StreamingInputFile(InputFile):
+    """Pipes an already opened HTTP response into the upload to Telegram chunk by chunk.
+
+    Nothing is buffered, so memory usage doesn't depend on the size of the file.
+    """
+
+    def __init__(
+        self,
+        response: ClientResponse,
+        max_size: int = MAX_UPLOAD_SIZE,
+        filename: str | None = None,
+    ) -> None:
+        super().__init__(filename=filename, chunk_size=CHUNK_SIZE)
+        self.response = response
+        self.max_size = max_size
+        self.size = 0
+        # the CDN has failed in the middle of the upload
+        self.read_error: ClientError | None = None
+
+    @property
+    def is_too_large(self) -> bool:
+        return self.size > self.max_size
+
+    @override
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        async for chunk in self.iter_chunks():
+            yield chunk
+
+    async def iter_chunks(self) -> AsyncGenerator[bytes, None]:
+        try:
+            async for chunk in self.response.content.iter_chunked(self.chunk_size):
+                # in case the server hasn't sent (or has lied about) Content-Length
+                self.size += len(chunk)
+                if self.is_too_large:
+                    raise MediaTooLargeError(self.size)
+                yield chunk
+        except ClientError as exception:
+            self.read_error = exception
+            raise
+
+
+@asynccontextmanager
+async def open_media(
+    session: ClientSession,
+    url: str,
+    headers: HeaderMap | None = None,
+    max_size: int = MAX_UPLOAD_SIZE,
+) -> AsyncGenerator[StreamingInputFile, None]:
+    """Start downloading the media and check its size before anything is uploaded.
+
+    Errors of the upload itself are raised as they are, except the ones caused by
+    the media, see below. An error response of the CDN is raised by aiohttp as
+    `ClientResponseError`.
+
+    Yields
+    ------
+    The file to upload, it's read from the response as it's being uploaded.
+
+    Raises
+    ------
+    MediaTooLargeError
+        If Content-Length or the bytes read so far are over `max_size`.
+    aiohttp.ClientPayloadError
+        If the download has failed during the upload.
+
+    """
+    async with session.get(
+        url,
+        headers=headers.data if headers else None,
+        raise_for_status=True,
+    ) as response:
+        if response.content_length is not None and response.content_length > max_size:
+            raise MediaTooLargeError(response.content_length)
+
+        file = StreamingInputFile(response, max_size, filename=response.url.name or None)
+        try:
+            yield file
+        except Exception as exception:
+            # the upload was aborted by `read`, but the HTTP client has wrapped its exception
+            if file.is_too_large:
+                raise MediaTooLargeError(file.size) from exception
+            if file.read_error is not None and file.read_error is not exception:
+                msg = f"Failed to download the media: {file.read_error}"
+                raise ClientPayloadError(msg) from exception
+            raise
+
+
+async def upload_media(
+    session: ClientSession,
+    url: str,
+    headers: HeaderMap | None,
+    send: Callable[[StreamingInputFile], Awaitable[T]],
+) -> T:
+    """Stream the media into `send`, downloading it again if Telegram's flood control hits.
+
+    A streamed file can be read only once, so `SendScheduler` doesn't repeat such
+    requests itself, the media has to be opened again.
+
+    Returns
+    -------
+    What `send` has returned.
+
+    Raises
+    ------
+    TelegramRetryAfter
+        If the flood control still hits after `MAX_FLOOD_RETRIES`.
+
+    """
+    attempt = 0
+    while True:
+        try:
+            async with open_media(session, url, headers) as file:
+                return await send(file)
+        except TelegramRetryAfter as exception:  # noqa: PERF203
+            attempt += 1
+            if attempt > MAX_FLOOD_RETRIES:
+                raise
+            await asyncio.sleep(exception.retry_after)
+
+
+async def download(
+    session: ClientSession,
+    url: str,
+    headers: HeaderMap | None = None,
+    max_size: int = MAX_PHOTO_SIZE,
+) -> bytes:
+    async with open_media(session, url, headers, max_size) as file:
+        buffer = bytearray()
+        async for chunk in file.iter_chunks():
+            buffer += chunk
+        return bytes(buffer)
+
+
+def prefetch_images(
+    session: ClientSession,
+    urls: list[str],
+    headers: HeaderMap | None,
+    semaphore: asyncio.Semaphore,
+) -> list[asyncio.Task[InputFile]]:
+    """Start downloading the images concurrently (limited by `semaphore`), keeping their order.
+
+    If an image can't be downloaded, Telegram gets its URL and tries to download it itself.
+
+    Returns
+    -------
+    A task per image, in the order of `urls`.
+
+    """
+
+    async def fetch(url: str) -> InputFile:
+        async with semaphore:
+            try:
+                return BufferedInputFile(await download(session, url, headers), "image.jpeg")
+            except (ClientError, MediaTooLargeError) as exception:
+                logger.warning("Failed to download the image: %r\nURL: [%s]", exception, url)
+                return URLInputFile(url, headers.data if headers else None)
+
+    return [asyncio.create_task(fetch(url)) for url in urls]
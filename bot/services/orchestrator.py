@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Final
+
+from aiohttp import ClientSession
+from typing_extensions import override
+
+from bot.config import HEDGE_DELAY, PARSERS
+from bot.metrics import PARSE_RESULTS, PARSE_SECONDS, result_label
+from bot.services import ApiResponse, BaseParser
+from bot.services.retry import RETRYABLE_ERRORS, RetryingParser
+from bot.services.tiktok_web import TikTokWebParser
+from bot.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+# The backend is considered unhealthy
+FAILURE_ERRORS: Final[frozenset[str]] = frozenset({"server_unavailable"})
+# Another backend may have a different answer, so ask it
+FAILOVER_ERRORS: Final[frozenset[str]] = FAILURE_ERRORS | {"geo_restricted"}
+
+# Until there are enough latency samples to estimate p95
+DEFAULT_HEDGE_DELAY: Final[float] = 3  # seconds
+MIN_HEDGE_DELAY: Final[float] = 0.2  # seconds
+LATENCY_WINDOW: Final[int] = 200
+MIN_LATENCY_SAMPLES: Final[int] = 20
+
+
+class CircuitBreaker:
+    """Stops sending requests to a backend after `threshold` consecutive failures.
+
+    After `reset_timeout` seconds one trial request is let through (half-open state),
+    its result decides whether the breaker closes or stays open.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # half-open: let one request through, the next ones wait for its result
+            self.opened_at = time.monotonic()
+            return True
+
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class Backend:
+    def __init__(self, name: str, parser: BaseParser) -> None:
+        self.name = name
+        self.parser = parser
+        self.breaker = CircuitBreaker()
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.parse_seconds = PARSE_SECONDS.labels(name)
+
+    def hedge_delay(self) -> float:
+        """Decide how long to wait for this backend before starting the next one.
+
+        Returns
+        -------
+        `HEDGE_DELAY` if it's configured, otherwise p95 of the recent latencies
+        (`DEFAULT_HEDGE_DELAY` until there are enough of them).
+
+        """
+        if HEDGE_DELAY is not None:
+            return HEDGE_DELAY
+
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+
+        latencies = sorted(self.latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        return max(MIN_HEDGE_DELAY, p95)
+
+    async def parse(self, aweme_id: int) -> ApiResponse:
+        start = time.monotonic()
+        try:
+            with span("parse_backend", backend=self.name) as current:
+                response = await self.parser.parse(aweme_id)
+                current.set_attribute("result", response.message or "ok")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exception:
+            self.breaker.record_failure()
+            PARSE_RESULTS.labels(self.name, type(exception).__name__).inc()
+            raise
+
+        elapsed = time.monotonic() - start
+        self.parse_seconds.observe(elapsed)
+        PARSE_RESULTS.labels(self.name, result_label(response.message)).inc()
+
+        if response.message in FAILURE_ERRORS:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+            self.latencies.append(elapsed)
+
+        return response
+
+
+class ParserOrchestrator(BaseParser):
+    """Asks the backends in order of priority, fails over on errors and hedges slow requests.
+
+    If a backend hasn't answered within its p95 latency, the next one is started
+    as well, and the first definitive answer wins. Backends with an open circuit
+    breaker are skipped. Only `RETRYABLE_ERRORS` are failed over, any other exception
+    is raised as is, and so is the last one if every backend has raised.
+    """
+
+    def __init__(self, backends: list[Backend]) -> None:
+        self.backends = backends
+
+    @override
+    async def parse(self, aweme_id: int) -> ApiResponse:
+        candidates = [backend for backend in self.backends if backend.breaker.allow()]
+        if not candidates:
+            logger.warning("All parser backends are unavailable.")
+            return ApiResponse(success=False, message="server_unavailable")
+
+        running: dict[asyncio.Task[ApiResponse], Backend] = {}
+        last_response: ApiResponse | None = None
+        last_exception: BaseException | None = None
+        next_index = 0
+        hedge = False
+        try:
+            while running or next_index < len(candidates):
+                if not running or (hedge and next_index < len(candidates)):
+                    backend = candidates[next_index]
+                    next_index += 1
+                    running[asyncio.create_task(backend.parse(aweme_id))] = backend
+
+                timeout = backend.hedge_delay() if next_index < len(candidates) else None
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                hedge = not done
+                if hedge:
+                    logger.info("[%s] is slow, hedging with the next backend.", backend.name)
+
+                for task in done:
+                    name = running.pop(task).name
+                    if (exception := failover_exception(name, task)) is not None:
+                        last_exception = exception
+                        continue
+
+                    response = task.result()
+                    if response.message not in FAILOVER_ERRORS:
+                        return response
+
+                    logger.info("[%s] responded with `%s`, failing over.", name, response.message)
+                    last_response = more_specific(last_response, response)
+        finally:
+            for task in running:
+                task.cancel()
+
+        if last_response is None and last_exception is not None:
+            raise last_exception
+        return last_response or ApiResponse(success=False, message="server_unavailable")
+
+    @override
+    async def invalidate(self, aweme_id: int) -> None:
+        for backend in self.backends:
+            await backend.parser.invalidate(aweme_id)
+
+
+def more_specific(last: ApiResponse | None, response: ApiResponse) -> ApiResponse:
+    """Choose between two failed-over responses, whichever has come last.
+
+    Returns
+    -------
+    The new response, unless it's a failure and the last one is an answer:
+    "geo_restricted" has a fallback in `handle_post`, "server_unavailable" doesn't.
+
+    """
+    if last is None or response.message not in FAILURE_ERRORS:
+        return response
+    return last
+
+
+def failover_exception(name: str, task: "asyncio.Task[ApiResponse]") -> BaseException | None:
+    """Check whether the backend's task has failed in a way another backend may do better.
+
+    Any other exception is raised.
+
+    Returns
+    -------
+    The exception of the task, `None` if it has succeeded.
+
+    """
+    exception = task.exception()
+    if exception is None:
+        return None
+    if not isinstance(exception, RETRYABLE_ERRORS):
+        # a bug or a changed schema, it must reach the error handler
+        raise exception
+    logger.warning("[%s] failed: %r, failing over.", name, exception)
+    return exception
+
+
+def create_backends(session: ClientSession) -> list[Backend]:
+    """Create the backends listed in `PARSERS` config.
+
+    Returns
+    -------
+    The backends, in the same order.
+
+    Raises
+    ------
+    ValueError
+        If `PARSERS` has an unknown parser.
+
+    """
+    backends: list[Backend] = []
+    for name in PARSERS:
+        parser: BaseParser
+        match name:
+            case "web":
+                parser = TikTokWebParser(session)
+            case "api":
+                # requires INSTALL_ID and DEVICE_ID, so import it only when it's needed
+                from bot.services.tiktok_api import TikTokAPIParser  # noqa: PLC0415
+
+                parser = TikTokAPIParser(session)
+            case _:
+                msg = f"Unknown parser in PARSERS: {name!r}"
+                raise ValueError(msg)
+
+        backends.append(Backend(name, RetryingParser(parser)))
+
+    return backends
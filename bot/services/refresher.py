@@ -0,0 +1,176 @@
+"""Background refresh of the parsed posts that are requested often.
+
+The media URLs of a parsed post are signed and expire, so its cached response
+(see `CachingParser`) lives only until the first of them does. A popular post would
+then be parsed again on the request path every time its URLs expire. `RefreshingParser`
+counts how often each post is asked for, and its `run` loop re-parses the popular ones
+in background just before their cached responses go stale, the most requested first.
+
+Only parses are counted. Posts that are already uploaded are sent by their `file_id`
+from `MediaCache` and never reach the parser, so refreshing them would be wasted work.
+The ones that do are parsed on every request: posts too large to be uploaded, requests
+for the sound only and posts whose `file_id` has turned out to be invalid.
+A post whose refresh hasn't produced a cacheable response (e.g. "server_unavailable")
+isn't refreshed again every run of the loop, but with an exponential backoff.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import time
+from typing import Final
+
+from typing_extensions import override
+
+from bot.metrics import CDN_REFRESHES, result_label
+from bot.services import ApiResponse, BaseParser
+from bot.services.caching import CachingParser, get_ttl
+
+logger = logging.getLogger(__name__)
+
+# How often the loop looks for posts to refresh
+REFRESH_INTERVAL: Final[float] = 15  # seconds
+# Posts whose cached responses go stale sooner than that are refreshed,
+# it has to be longer than the interval plus the time a parse takes
+REFRESH_AHEAD: Final[float] = 2 * 60  # seconds
+# Posts refreshed by one run of the loop, the most requested ones
+REFRESH_BATCH: Final[int] = 100
+# Refreshes running at the same time, so they don't compete with users' requests
+REFRESH_CONCURRENCY: Final[int] = 4
+# A post whose refresh has failed waits that long before the next one, doubled every time
+FAILED_REFRESH_BACKOFF: Final[float] = 60  # seconds
+MAX_FAILED_REFRESH_BACKOFF: Final[float] = 10 * 60  # seconds
+
+# Request counts fade by half every that often, so the rate is a recent one
+RATE_HALF_LIFE: Final[float] = 10 * 60  # seconds
+# A post is hot (and refreshed) while its faded request count is at least that
+MIN_HOT_RATE: Final[float] = 2
+# Posts that are barely requested anymore are forgotten
+MIN_TRACKED_RATE: Final[float] = 0.1
+MAX_TRACKED: Final[int] = 10_000
+
+
+class RefreshingParser(BaseParser):
+    """Wraps `CachingParser`, keeping the cached responses of hot posts fresh in background."""
+
+    def __init__(self, parser: CachingParser) -> None:
+        self.parser = parser
+        # aweme_id -> (request count faded to `updated_at`, updated_at)
+        self._rates: dict[int, tuple[float, float]] = {}
+        # aweme_id -> (refreshes failed in a row, when to try again)
+        self._failures: dict[int, tuple[int, float]] = {}
+
+    @override
+    async def parse(self, aweme_id: int) -> ApiResponse:
+        now = time.monotonic()
+        self._rates[aweme_id] = (self.rate(aweme_id, now) + 1, now)
+        return await self.parser.parse(aweme_id)
+
+    @override
+    async def invalidate(self, aweme_id: int) -> None:
+        # a hot post is parsed again by the next run of the loop, before anyone asks for it
+        await self.parser.invalidate(aweme_id)
+
+    @property
+    def tracked(self) -> int:
+        return len(self._rates)
+
+    def rate(self, aweme_id: int, now: float) -> float:
+        """Count the requests for the post, the older ones weighing exponentially less.
+
+        Returns
+        -------
+        The decayed count as of `now`, 0 if the post isn't tracked.
+
+        """
+        item = self._rates.get(aweme_id)
+        if item is None:
+            return 0
+        count, updated_at = item
+        return count * math.exp2((updated_at - now) / RATE_HALF_LIFE)
+
+    def due(self, now: float) -> list[int]:
+        """Find hot posts that aren't cached or are about to go stale.
+
+        Posts whose last refresh has failed are skipped until their backoff ends.
+
+        Returns
+        -------
+        Up to `REFRESH_BATCH` Aweme IDs, the most requested first.
+
+        """
+        # (rate, aweme_id), a max-heap of the posts to refresh
+        queue: list[tuple[float, int]] = []
+        forgotten: list[int] = []
+        for aweme_id in self._rates:
+            rate = self.rate(aweme_id, now)
+            if rate < MIN_TRACKED_RATE:
+                forgotten.append(aweme_id)
+            elif rate >= MIN_HOT_RATE and not self._backing_off(aweme_id, now):
+                expires_in = self.parser.expires_in(aweme_id)
+                if expires_in is None or expires_in <= REFRESH_AHEAD:
+                    queue.append((rate, aweme_id))
+
+        for aweme_id in forgotten:
+            del self._rates[aweme_id]
+            self._failures.pop(aweme_id, None)
+        if len(self._rates) > MAX_TRACKED:
+            keep = heapq.nlargest(MAX_TRACKED, self._rates, key=lambda key: self.rate(key, now))
+            self._rates = {aweme_id: self._rates[aweme_id] for aweme_id in keep}
+            self._failures = {
+                aweme_id: item
+                for aweme_id, item in self._failures.items()
+                if aweme_id in self._rates
+            }
+
+        return [aweme_id for _, aweme_id in heapq.nlargest(REFRESH_BATCH, queue)]
+
+    async def refresh_due(self) -> int:
+        """Refresh the posts that are due.
+
+        Returns
+        -------
+        How many posts have been refreshed, failed attempts included.
+
+        """
+        due = self.due(time.monotonic())
+        if not due:
+            return 0
+
+        semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+        async def refresh(aweme_id: int) -> None:
+            async with semaphore:
+                try:
+                    response = await self.parser.refresh(aweme_id)
+                except Exception as exception:
+                    CDN_REFRESHES.labels(type(exception).__name__).inc()
+                    logger.exception("Failed to refresh the post.\nAweme ID: [%s]", aweme_id)
+                    self._failed(aweme_id)
+                else:
+                    CDN_REFRESHES.labels(result_label(response.message)).inc()
+                    if get_ttl(response) > 0:
+                        self._failures.pop(aweme_id, None)
+                    else:
+                        # not cached, so it would be due again on the next run
+                        self._failed(aweme_id)
+
+        await asyncio.gather(*(refresh(aweme_id) for aweme_id in due))
+        logger.debug("Refreshed %s hot posts.", len(due))
+        return len(due)
+
+    def _backing_off(self, aweme_id: int, now: float) -> bool:
+        item = self._failures.get(aweme_id)
+        return item is not None and now < item[1]
+
+    def _failed(self, aweme_id: int) -> None:
+        failures = self._failures.get(aweme_id, (0, 0))[0] + 1
+        backoff = min(FAILED_REFRESH_BACKOFF * 2 ** (failures - 1), MAX_FAILED_REFRESH_BACKOFF)
+        self._failures[aweme_id] = (failures, time.monotonic() + backoff)
+
+    async def run(self) -> None:
+        """Refresh hot posts until cancelled."""
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            await self.refresh_due()
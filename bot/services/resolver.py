@@ -0,0 +1,59 @@
+import logging
+from typing import Final
+from urllib.parse import urljoin, urlsplit
+
+from aiohttp import ClientSession
+
+from bot.cache.memory import MemoryCache
+from bot.services.links import is_short_link
+from bot.utils import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+MAX_REDIRECTS: Final[int] = 5
+CACHE_TTL: Final[int] = 24 * 60 * 60  # seconds, short code never changes its target
+CACHE_MAX_SIZE: Final[int] = 50_000
+
+
+class ShortLinkResolver:
+    """Resolves short links (vm/vt.tiktok.com and tiktok.com/t/) to the full TikTok URL.
+
+    Results are cached by short code, and concurrent lookups of the same code
+    share one in-flight request.
+    """
+
+    def __init__(self, session: ClientSession) -> None:
+        self.session = session
+        self.cache: MemoryCache[str] = MemoryCache(CACHE_MAX_SIZE, CACHE_TTL)
+        self.flight: SingleFlight[str, str | None] = SingleFlight()
+
+    async def resolve(self, url: str) -> str | None:
+        parts = urlsplit(url)
+        short_code = parts.netloc + parts.path.rstrip("/")
+
+        if cached := self.cache.get_nowait(short_code):
+            return cached
+
+        return await self.flight.do(short_code, lambda: self._resolve(short_code, url))
+
+    async def _resolve(self, short_code: str, url: str) -> str | None:
+        for _ in range(MAX_REDIRECTS):
+            async with self.session.options(url, allow_redirects=False) as response:
+                location = response.headers.get("Location")
+
+            if not location:
+                logger.warning(
+                    "Short link has no redirect (HTTP %s).\nURL: [%s]",
+                    response.status,
+                    url,
+                )
+                return None
+
+            url = urljoin(url, location)
+            if not is_short_link(url):
+                self.cache.set_nowait(short_code, url)
+                return url
+
+        logger.warning("Too many redirects for short link.\nURL: [%s]", url)
+        return None
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import random
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Final, TypeVar
+
+from aiohttp import ClientError
+from typing_extensions import override
+
+from bot.metrics import RETRIES
+from bot.services import ApiResponse, BaseParser
+from bot.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar("T")
+
+
+class RetryableError(Exception):
+    """The request has failed, but it may succeed if it is repeated."""
+
+
+RETRYABLE_ERRORS: Final = (RetryableError, ClientError, asyncio.TimeoutError)
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    # exponential backoff with full jitter: random(0, min(max_delay, base_delay * 2 ** retry))
+    base_delay: float = 0.5  # seconds
+    max_delay: float = 5  # seconds
+    attempt_timeout: float = 15  # seconds
+    deadline: float = 30  # seconds, for all attempts together
+
+    def backoff(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))  # noqa: S311
+
+
+class RetryBudget:
+    """Limits retries to a fixed share of all requests.
+
+    Every request deposits `ratio` tokens, every retry withdraws one token.
+    When there are no tokens left, requests fail without retrying, so during
+    an upstream brownout we don't multiply the load on it.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10) -> None:
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+async def retry(
+    func: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    budget: RetryBudget | None = None,
+) -> T:
+    """Call `func` until it succeeds, the attempts, the deadline or the budget run out.
+
+    Only `RETRYABLE_ERRORS` are retried, the last one is raised if every attempt has failed.
+
+    Returns
+    -------
+    The result of the first successful attempt.
+
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.deadline
+    if budget is not None:
+        budget.deposit()
+
+    attempt = 1
+    while True:
+        timeout = min(policy.attempt_timeout, deadline - loop.time())
+        try:
+            with span("attempt", attempt=attempt):
+                return await asyncio.wait_for(func(), timeout)
+        except RETRYABLE_ERRORS as exception:
+            delay = policy.backoff(attempt - 1)
+            if (
+                attempt >= policy.max_attempts
+                or loop.time() + delay >= deadline
+                or (budget is not None and not budget.withdraw())
+            ):
+                raise
+
+            logger.warning(
+                "Attempt %s/%s failed: %r. Retrying in %.2fs.",
+                attempt,
+                policy.max_attempts,
+                exception,
+                delay,
+            )
+            RETRIES.inc()
+
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+class RetryingParser(BaseParser):
+    """Wraps any parser and retries its `RETRYABLE_ERRORS` according to the policy."""
+
+    def __init__(
+        self,
+        parser: BaseParser,
+        policy: RetryPolicy | None = None,
+        budget: RetryBudget | None = None,
+    ) -> None:
+        self.parser = parser
+        self.policy = policy or RetryPolicy()
+        self.budget = budget or RetryBudget()
+
+    @override
+    async def parse(self, aweme_id: int) -> ApiResponse:
+        try:
+            return await retry(lambda: self.parser.parse(aweme_id), self.policy, self.budget)
+        except RETRYABLE_ERRORS as exception:
+            logger.warning("Giving up on Aweme ID [%s]: %r", aweme_id, exception)
+            return ApiResponse(success=False, message="server_unavailable")
+
+    @override
+    async def invalidate(self, aweme_id: int) -> None:
+        await self.parser.invalidate(aweme_id)
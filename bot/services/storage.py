@@ -0,0 +1,219 @@
+import asyncio
+import logging
+from typing import Final
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramEntityTooLarge
+from aiogram.types import InputMediaPhoto
+from aiohttp import ClientError, ClientSession
+
+from bot.cache.media import CachedMedia, MediaCache
+from bot.config import TIKWM_PLAY_URL
+from bot.services import BaseParser, Data
+from bot.services.media import (
+    IMAGE_DOWNLOAD_CONCURRENCY,
+    MediaTooLargeError,
+    prefetch_images,
+    upload_media,
+)
+from bot.services.variants import get_video_urls
+from bot.utils import SingleFlight, split_list_into_chunks
+
+logger = logging.getLogger(__name__)
+
+
+# Telegram limit for a media group
+MEDIA_GROUP_SIZE: Final[int] = 10
+
+
+class StorageUploader:
+    """Uploads posts to a private storage chat in background, to get their file_ids.
+
+    Inline query results can only be sent by file_id, so a post nobody has sent before
+    has to be uploaded somewhere first. Uploads share `upload_flight` (and `audio_flight`
+    for sounds) with the message handler, so a post is uploaded once, whoever asks for it first.
+    """
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        bot: Bot,
+        chat_id: int | str,
+        parser: BaseParser,
+        http_session: ClientSession,
+        media_cache: MediaCache,
+        upload_flight: SingleFlight[int, CachedMedia | None],
+        audio_flight: SingleFlight[int, str | None],
+    ) -> None:
+        self.bot = bot
+        self.chat_id = chat_id
+        self.parser = parser
+        self.http_session = http_session
+        self.media_cache = media_cache
+        self.upload_flight = upload_flight
+        self.audio_flight = audio_flight
+        self._tasks: dict[int, asyncio.Task[CachedMedia | None]] = {}
+
+    async def upload(self, aweme_id: int, timeout: float) -> CachedMedia | None:
+        """Upload the post and wait for it up to `timeout` seconds.
+
+        If it takes longer, the upload goes on in background, so the post is in
+        the media cache by the time the user asks again.
+
+        Returns
+        -------
+        The cached media of the post, `None` if it isn't uploaded in time or can't be.
+
+        """
+        task = self._tasks.get(aweme_id)
+        if task is None:
+            task = asyncio.create_task(
+                self.upload_flight.do(aweme_id, lambda: self._upload(aweme_id)),
+            )
+            self._tasks[aweme_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(aweme_id, None))
+            task.add_done_callback(self._log_exception)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _upload(self, aweme_id: int) -> CachedMedia | None:
+        response = await self.parser.parse(aweme_id)
+        if response.message == "geo_restricted":
+            data = Data(video_url=TIKWM_PLAY_URL.format(aweme_id), music_url=None, images=None)
+        elif response.success and response.data is not None:
+            data = response.data
+        else:
+            logger.info("Post can't be uploaded: %s\nAweme ID: [%s]", response.message, aweme_id)
+            return None
+
+        if data.is_age_restricted:
+            data.video_url = TIKWM_PLAY_URL.format(aweme_id)
+            data.video_variants = None
+
+        try:
+            media = await self._upload_media(data)
+        except (MediaTooLargeError, ClientError, TelegramAPIError) as exception:
+            logger.warning(
+                "Failed to upload the post to the storage chat: %r\nAweme ID: [%s]",
+                exception,
+                aweme_id,
+            )
+            await self.parser.invalidate(aweme_id)
+            return None
+
+        if media is None or (not media.video and not media.photos):
+            return None
+        await self.media_cache.set(aweme_id, media)
+        return media
+
+    async def _upload_media(self, data: Data) -> CachedMedia | None:
+        if data.images:
+            photos = await self._upload_images(data)
+            # photos are nothing without their sound, same as in the message handler
+            return CachedMedia(photos=photos, audio=await self._upload_audio(data))
+        if data.video_url:
+            return CachedMedia(video=await self._upload_video(data))
+        return None
+
+    async def _upload_video(self, data: Data) -> str | None:
+        video_urls = get_video_urls(data)
+        for index, video_url in enumerate(video_urls):
+            try:
+                sent = await upload_media(
+                    self.http_session,
+                    video_url,
+                    data.headers,
+                    lambda video: self.bot.send_video(
+                        self.chat_id,
+                        video,
+                        disable_notification=True,
+                    ),
+                )
+            except (MediaTooLargeError, TelegramEntityTooLarge):  # noqa: PERF203
+                # a smaller variant may fit
+                if index + 1 == len(video_urls):
+                    raise
+            else:
+                return sent.video.file_id if sent.video else None
+        return None
+
+    async def _upload_images(self, data: Data) -> list[str]:
+        assert data.images is not None
+
+        headers = data.headers
+        if headers is not None:
+            # same as in the message handler
+            headers.pop("Cookie", None)
+
+        semaphore = asyncio.Semaphore(IMAGE_DOWNLOAD_CONCURRENCY)
+        file_ids: list[str] = []
+        for chunk in split_list_into_chunks(data.images, MEDIA_GROUP_SIZE):
+            files = await asyncio.gather(
+                *prefetch_images(self.http_session, chunk, headers, semaphore),
+            )
+            sent = await self.bot.send_media_group(
+                self.chat_id,
+                [InputMediaPhoto(media=file) for file in files],
+                disable_notification=True,
+            )
+            file_ids.extend(item.photo[-1].file_id for item in sent if item.photo)
+        return file_ids
+
+    async def _upload_audio(self, data: Data) -> str | None:
+        """Upload the sound of the post, unless it's already cached by its music ID.
+
+        Returns
+        -------
+        The file_id of the sound, `None` if the post has none or it can't be uploaded.
+
+        """
+        if not data.music_url:
+            return None
+
+        music_id = data.music_id
+        if not music_id:
+            return await self._send_audio(data)
+
+        file_id = await self.media_cache.get_audio(music_id)
+        if file_id:
+            return file_id
+        return await self.audio_flight.do(music_id, lambda: self._send_audio(data))
+
+    async def _send_audio(self, data: Data) -> str | None:
+        assert data.music_url is not None
+
+        try:
+            sent = await upload_media(
+                self.http_session,
+                data.music_url,
+                data.headers,
+                lambda audio: self.bot.send_audio(
+                    self.chat_id,
+                    audio,
+                    title=data.music_title,
+                    disable_notification=True,
+                ),
+            )
+        except (MediaTooLargeError, TelegramEntityTooLarge, ClientError) as exception:
+            # the photos are still worth caching without it
+            logger.warning("Failed to upload the audio: %r\nURL: [%s]", exception, data.music_url)
+            return None
+
+        if sent.audio is None:
+            return None
+        if data.music_id:
+            await self.media_cache.set_audio(data.music_id, sent.audio.file_id)
+        return sent.audio.file_id
+
+    @staticmethod
+    def _log_exception(task: "asyncio.Task[CachedMedia | None]") -> None:
+        if not task.cancelled() and (exception := task.exception()) is not None:
+            logger.error("Upload to the storage chat has failed.", exc_info=exception)
@@ -1,12 +1,17 @@
 import logging
+from typing import Any
 
 from aiohttp import ClientSession
+from pydantic import ValidationError
 from typing_extensions import override
 
 from bot.config import DEVICE_ID, INSTALL_ID
-from bot.services import ApiResponse, BaseParser, Data
-from bot.services.tiktok_api.models import AwemeDetail, Root
-from bot.utils import HeaderMap
+from bot.metrics import JSON_DECODE_SECONDS
+from bot.services import ApiResponse, BaseParser, Data, VideoVariant
+from bot.services.retry import RetryableError
+from bot.services.tiktok_api.models import AwemeDetail, RawRoot, Root
+from bot.services.variants import BYTEVC2, H264, H265, UNKNOWN, select_video_url
+from bot.utils import Batcher, HeaderMap
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +44,15 @@ HEADERS = HeaderMap(
     },
 )
 
+# Concurrent requests are collected for up to `BATCH_WINDOW` seconds or `BATCH_MAX_SIZE` IDs
+BATCH_WINDOW = 0.05
+BATCH_MAX_SIZE = 20
+
+DECODE_SECONDS = JSON_DECODE_SECONDS.labels("api", "strict")
+
+# `is_bytevc1` of the bitrate ladder
+CODECS: dict[int | None, str] = {0: H264, 1: H265, 2: BYTEVC2}
+
 ERRORS: dict[str, str] = {
     "Video has been removed": "video_unavailable",
     "Server is currently unavailable. Please try again later.": "server_unavailable",
@@ -46,42 +60,117 @@ ERRORS: dict[str, str] = {
 
 
 class TikTokAPIParser(BaseParser):
+    """Parser for the internal API.
+
+    The endpoint takes many IDs at once, so concurrent requests are collected
+    into batches (see `BATCH_WINDOW` and `BATCH_MAX_SIZE`) and sent as one request.
+    """
+
+    def __init__(self, session: ClientSession) -> None:
+        self.session = session
+        self.batcher: Batcher[int, ApiResponse] = Batcher(
+            self.parse_many,
+            BATCH_WINDOW,
+            BATCH_MAX_SIZE,
+        )
+
     @override
     async def parse(self, aweme_id: int) -> ApiResponse:
-        async with (
-            ClientSession() as session,
-            session.post(
-                URL,
-                data={"aweme_ids": f"[{aweme_id}]"},
-                params=PARAMS,
-                headers=HEADERS,
-            ) as response,
-        ):
+        return await self.batcher.submit(aweme_id)
+
+    async def parse_many(self, aweme_ids: list[int]) -> dict[int, ApiResponse]:
+        async with self.session.post(
+            URL,
+            data={"aweme_ids": f"[{','.join(map(str, aweme_ids))}]"},
+            params=PARAMS,
+            headers=HEADERS,
+        ) as response:
             # it happens from time to time
             if response.status == 504:  # noqa: PLR2004
-                logger.warning("[TikTok API] API responded with HTTP status 504, trying again.")
-                return await self.parse(aweme_id)
+                msg = "[TikTok API] API responded with HTTP status 504"
+                raise RetryableError(msg)
 
             text = await response.text()
             if not text:
-                # Note: if INSTALL_ID and/or DEVICE_ID are incorrect, here will be infinity loop
-                # TODO: add something like limits on recursion
-                logger.warning("[TikTok API] Response body is empty, trying again.")
-                return await self.parse(aweme_id)
-
-            model = Root.model_validate_json(text)
-            if model.status_code != 0:
-                message: str = model.status_msg
-                return ApiResponse(success=False, message=ERRORS.get(message, message))
-
-            aweme_detail = model.aweme_details[0]
-            data = Data(
-                video_url=extract_video_url(aweme_detail),
-                music_url=extract_music_url(aweme_detail),
-                images=extract_images(aweme_detail),
-            )
-
-            return ApiResponse(success=True, data=data)
+                # Note: it also happens if INSTALL_ID and/or DEVICE_ID are incorrect,
+                # the number of attempts is limited by `RetryingParser`
+                msg = "[TikTok API] Response body is empty"
+                raise RetryableError(msg)
+
+        with DECODE_SECONDS.time():
+            status_code, status_msg, aweme_details, broken = decode(text)
+        if status_code != 0:
+            error = ApiResponse(success=False, message=ERRORS.get(status_msg, status_msg))
+            return dict.fromkeys(aweme_ids, error)
+
+        # the broken posts are left out, so `Batcher` raises to their callers only
+        return {
+            aweme_id: build_response(aweme_details.get(aweme_id))
+            for aweme_id in aweme_ids
+            if str(aweme_id) not in broken
+        }
+
+
+def decode(text: str | bytes) -> tuple[int, str, dict[int, AwemeDetail], set[str]]:
+    """Validate the whole response in one pass, or every aweme detail alone if that fails.
+
+    Returns
+    -------
+    The status code and message, the valid aweme details by their IDs
+    and the IDs of the broken ones.
+
+    """
+    try:
+        model = Root.model_validate_json(text)
+    except ValidationError:
+        # one post in a format we don't expect shouldn't fail the whole batch
+        raw = RawRoot.model_validate_json(text)
+        return raw.status_code, raw.status_msg, *validate_aweme_details(raw.aweme_details)
+
+    aweme_details = {item.aweme_id: item for item in model.aweme_details}
+    return model.status_code, model.status_msg, aweme_details, set()
+
+
+def validate_aweme_details(
+    items: list[dict[str, Any]],
+) -> tuple[dict[int, AwemeDetail], set[str]]:
+    """Validate the aweme details one by one.
+
+    Returns
+    -------
+    The valid aweme details by their IDs and the IDs of the rest.
+
+    """
+    aweme_details: dict[int, AwemeDetail] = {}
+    broken: set[str] = set()
+    for item in items:
+        try:
+            aweme_detail = AwemeDetail.model_validate(item)
+        except ValidationError:  # noqa: PERF203
+            aweme_id = str(item.get("aweme_id"))
+            logger.exception("[TikTok API] Unexpected aweme detail.\nAweme ID: [%s]", aweme_id)
+            broken.add(aweme_id)
+        else:
+            aweme_details[aweme_detail.aweme_id] = aweme_detail
+    return aweme_details, broken
+
+
+def build_response(aweme_detail: AwemeDetail | None) -> ApiResponse:
+    # the API just doesn't return removed videos
+    if aweme_detail is None:
+        return ApiResponse(success=False, message="video_unavailable")
+
+    video_variants = extract_video_variants(aweme_detail)
+    data = Data(
+        video_url=select_video_url(video_variants) or extract_video_url(aweme_detail),
+        video_variants=video_variants,
+        music_url=extract_music_url(aweme_detail),
+        music_id=aweme_detail.music.id if aweme_detail.music else None,
+        music_title=aweme_detail.music.title if aweme_detail.music else None,
+        images=extract_images(aweme_detail),
+    )
+
+    return ApiResponse(success=True, data=data)
 
 
 def extract_video_url(data: AwemeDetail) -> str | None:
@@ -106,6 +195,21 @@ def extract_video_url(data: AwemeDetail) -> str | None:
     return video_url
 
 
+def extract_video_variants(data: AwemeDetail) -> list[VideoVariant]:
+    return [
+        VideoVariant(
+            url=item.play_addr.url_list[0],
+            codec=CODECS.get(item.is_bytevc1, UNKNOWN),
+            size=item.play_addr.data_size,
+            bitrate=item.bit_rate,
+            width=item.play_addr.width,
+            height=item.play_addr.height,
+        )
+        for item in data.video.bit_rate
+        if item.play_addr.url_list
+    ]
+
+
 def extract_music_url(data: AwemeDetail) -> str | None:
     if data.music is None:
         return None
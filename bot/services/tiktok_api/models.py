@@ -1,13 +1,20 @@
+from typing import Any
+
 from pydantic import BaseModel
 
 
 class PlayAddr(BaseModel):
     url_list: list[str]
+    data_size: int | None = None  # bytes
+    width: int | None = None
+    height: int | None = None
 
 
 class BitRate(BaseModel):
     play_addr: PlayAddr
-    is_bytevc1: int | None = None
+    is_bytevc1: int | None = None  # 0 is h264, 1 is h265, 2 is proprietary bvc2
+    bit_rate: int | None = None
+    gear_name: str | None = None
 
 
 class Video(BaseModel):
@@ -21,6 +28,8 @@ class PlayUrl(BaseModel):
 
 class Music(BaseModel):
     play_url: PlayUrl
+    id: int | None = None
+    title: str | None = None
 
 
 class DisplayImage(BaseModel):
@@ -36,6 +45,7 @@ class ImagePostInfo(BaseModel):
 
 
 class AwemeDetail(BaseModel):
+    aweme_id: int
     video: Video
     music: Music | None = None
     image_post_info: ImagePostInfo | None = None
@@ -45,3 +55,11 @@ class Root(BaseModel):
     status_code: int
     status_msg: str
     aweme_details: list[AwemeDetail]
+
+
+class RawRoot(BaseModel):
+    """`Root` with the aweme details left as they are, to validate them one by one."""
+
+    status_code: int
+    status_msg: str
+    aweme_details: list[dict[str, Any]]
@@ -1,15 +1,23 @@
 import logging
+from typing import Final
 
-from aiohttp import ClientSession
+from aiohttp import ClientSession, StreamReader
 from typing_extensions import override
 
-from bot.services import ApiResponse, BaseParser, Data
+from bot.config import JSON_MODE
+from bot.metrics import JSON_DECODE_SECONDS
+from bot.services import ApiResponse, BaseParser, Data, VideoVariant
+from bot.services.retry import RetryableError
+from bot.services.variants import normalize_codec, select_video_url
 from bot.utils import HeaderMap
 
-from .models import ItemStruct, Root
+from . import lean
+from .models import ItemStruct, Root, WebappVideoDetail
 
 logger = logging.getLogger(__name__)
 
+LEAN_DECODE_SECONDS = JSON_DECODE_SECONDS.labels("web", "fast")
+STRICT_DECODE_SECONDS = JSON_DECODE_SECONDS.labels("web", "strict")
 
 URL = "https://www.tiktok.com/@i/video/"
 
@@ -19,6 +27,13 @@ HEADERS = HeaderMap(
     },
 )
 
+SCRIPT_START = b'<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">'
+SCRIPT_END = b"</script>"
+
+# The rest of the page after the script is read (and dropped), so the connection is reused.
+# If it's unexpectedly large, it's cheaper to close the connection than to read it all
+MAX_DRAIN_SIZE: Final[int] = 256 * 1024  # bytes
+
 
 ERRORS: dict[str, str] = {
     "item doesn't exist": "video_unavailable",
@@ -29,24 +44,21 @@ ERRORS: dict[str, str] = {
 
 
 class TikTokWebParser(BaseParser):
+    def __init__(self, session: ClientSession) -> None:
+        self.session = session
+
     @override
     async def parse(self, aweme_id: int) -> ApiResponse:
-        async with (
-            ClientSession() as session,
-            session.get(URL + str(aweme_id), headers=HEADERS) as response,
-        ):
-            body = await response.text()
-            try:
-                json_str = body.split(
-                    '<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">',
-                )[1].split("</script>")[0]
-            except IndexError:
-                # i think it should work
-                logger.warning("[TikTok Web] Needed HTML tag not found, trying again.")
-                return await self.parse(aweme_id)
-
-            model = Root.model_validate_json(json_str)
-            video_detail = model.default_scope.webapp_video_detail
+        async with self.session.get(URL + str(aweme_id), headers=HEADERS) as response:
+            json_bytes = await extract_rehydration_json(response.content)
+            # the connection goes back to the pool only if the whole body is read
+            await drain(response.content)
+            if json_bytes is None:
+                # i think it should work (`RetryingParser` will try again)
+                msg = "[TikTok Web] Needed HTML tag not found"
+                raise RetryableError(msg)
+
+            video_detail = decode_video_detail(json_bytes)
             if video_detail.statusCode != 0 or video_detail.itemInfo is None:
                 message = video_detail.statusMsg
                 return ApiResponse(success=False, message=ERRORS.get(message, message))
@@ -54,9 +66,13 @@ class TikTokWebParser(BaseParser):
             item_struct = video_detail.itemInfo.itemStruct
             cookies = "; ".join(f"{key}={value.value}" for key, value in response.cookies.items())
 
+            video_variants = extract_video_variants(item_struct)
             data = Data(
-                video_url=extract_video_url(item_struct),
+                video_url=select_video_url(video_variants) or extract_video_url(item_struct),
+                video_variants=video_variants,
                 music_url=extract_music_url(item_struct),
+                music_id=extract_music_id(item_struct),
+                music_title=item_struct.music.title if item_struct.music else None,
                 images=extract_images(item_struct),
                 is_age_restricted=item_struct.isContentClassified,
                 headers=HEADERS | {"Cookie": cookies, "Referer": "https://www.tiktok.com/"},
@@ -65,7 +81,77 @@ class TikTokWebParser(BaseParser):
             return ApiResponse(success=True, data=data)
 
 
-def extract_video_url(data: ItemStruct) -> str | None:
+def decode_video_detail(
+    json_bytes: bytes | bytearray,
+) -> WebappVideoDetail | lean.WebappVideoDetail:
+    if JSON_MODE == "fast":
+        try:
+            with LEAN_DECODE_SECONDS.time():
+                return lean.decode_video_detail(json_bytes)
+        except (ValueError, KeyError, TypeError, IndexError) as exception:
+            logger.warning("[TikTok Web] Lean decoding failed: %r, using pydantic.", exception)
+
+    with STRICT_DECODE_SECONDS.time():
+        return Root.model_validate_json(json_bytes).default_scope.webapp_video_detail
+
+
+async def extract_rehydration_json(content: StreamReader) -> bytearray | None:
+    """Read the HTML page until the end of the rehydration script.
+
+    Only the bytes after the script's opening tag are kept in memory, the rest of
+    the page (after the closing tag) is left unread, see `drain`.
+
+    Returns
+    -------
+    The contents of the script, `None` if the page doesn't have it.
+
+    """
+    buffer = bytearray()
+    found_start = False
+    search_from = 0
+
+    async for chunk in content.iter_any():
+        buffer += chunk
+
+        if not found_start:
+            index = buffer.find(SCRIPT_START)
+            if index == -1:
+                # keep only the tail, it may contain the beginning of the tag
+                del buffer[: -len(SCRIPT_START) + 1]
+                continue
+
+            del buffer[: index + len(SCRIPT_START)]
+            found_start = True
+
+        index = buffer.find(SCRIPT_END, search_from)
+        if index != -1:
+            # truncated in place, a copy would double the peak memory
+            del buffer[index:]
+            return buffer
+
+        # the closing tag may be split between the chunks
+        search_from = max(0, len(buffer) - len(SCRIPT_END) + 1)
+
+    return None
+
+
+async def drain(content: StreamReader, limit: int = MAX_DRAIN_SIZE) -> bool:
+    """Read the rest of the body without keeping it, so the connection can be reused.
+
+    Returns
+    -------
+    `False` if there's more than `limit` bytes left, then the connection is closed.
+
+    """
+    drained = 0
+    async for chunk in content.iter_any():
+        drained += len(chunk)
+        if drained > limit:
+            return False
+    return True
+
+
+def extract_video_url(data: ItemStruct | lean.ItemStruct) -> str | None:
     if data.video.bitrateInfo is None:
         return None
 
@@ -74,14 +160,36 @@ def extract_video_url(data: ItemStruct) -> str | None:
     return data.video.bitrateInfo[0].PlayAddr.UrlList[0]
 
 
-def extract_music_url(data: ItemStruct) -> str | None:
+def extract_video_variants(data: ItemStruct | lean.ItemStruct) -> list[VideoVariant]:
+    return [
+        VideoVariant(
+            url=item.PlayAddr.UrlList[0],
+            codec=normalize_codec(item.CodecType),
+            size=item.PlayAddr.DataSize,
+            bitrate=item.Bitrate,
+            width=item.PlayAddr.Width,
+            height=item.PlayAddr.Height,
+        )
+        for item in data.video.bitrateInfo or ()
+        if item.PlayAddr.UrlList
+    ]
+
+
+def extract_music_url(data: ItemStruct | lean.ItemStruct) -> str | None:
     if data.music is None:
         return None
 
     return data.music.playUrl
 
 
-def extract_images(data: ItemStruct) -> list[str] | None:
+def extract_music_id(data: ItemStruct | lean.ItemStruct) -> int | None:
+    if data.music is None or not data.music.id or not data.music.id.isdigit():
+        return None
+
+    return int(data.music.id)
+
+
+def extract_images(data: ItemStruct | lean.ItemStruct) -> list[str] | None:
     if data.imagePost is None:
         return None
 
@@ -0,0 +1,164 @@
+# ruff: noqa: N815
+
+"""Lean decoding of the rehydration JSON.
+
+The page's `__DEFAULT_SCOPE__` has dozens of scopes, but only `webapp.video-detail`
+is needed. So instead of validating the whole payload with pydantic, only this
+scope is decoded (with `json.JSONDecoder.raw_decode`, which stops right after it)
+into compact frozen structures with the same fields as in `models.py`.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any
+
+Raw = dict[str, Any]
+
+VIDEO_DETAIL_KEY = b'"webapp.video-detail":'
+
+decoder = json.JSONDecoder()
+
+
+@dataclass(frozen=True, slots=True)
+class PlayAddr:
+    UrlList: list[str]
+    DataSize: int | None
+    Width: int | None
+    Height: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class BitrateInfo:
+    PlayAddr: PlayAddr
+    Bitrate: int | None
+    CodecType: str | None
+    GearName: str | None
+
+    @classmethod
+    def from_raw(cls, raw: Raw) -> "BitrateInfo":
+        play_addr = raw["PlayAddr"]
+        return cls(
+            PlayAddr(
+                play_addr["UrlList"],
+                play_addr.get("DataSize"),
+                play_addr.get("Width"),
+                play_addr.get("Height"),
+            ),
+            raw.get("Bitrate"),
+            raw.get("CodecType"),
+            raw.get("GearName"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Video:
+    bitrateInfo: list[BitrateInfo] | None
+
+    @classmethod
+    def from_raw(cls, raw: Raw) -> "Video":
+        bitrate_info = raw.get("bitrateInfo")
+        return cls(
+            [BitrateInfo.from_raw(item) for item in bitrate_info]
+            if bitrate_info is not None
+            else None,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Music:
+    playUrl: str
+    id: str | None
+    title: str | None
+
+    @classmethod
+    def from_raw(cls, raw: Raw) -> "Music":
+        return cls(raw["playUrl"], raw.get("id"), raw.get("title"))
+
+
+@dataclass(frozen=True, slots=True)
+class ImageURL:
+    urlList: list[str]
+
+
+@dataclass(frozen=True, slots=True)
+class Image:
+    imageURL: ImageURL
+
+
+@dataclass(frozen=True, slots=True)
+class ImagePost:
+    images: list[Image]
+
+    @classmethod
+    def from_raw(cls, raw: Raw) -> "ImagePost":
+        return cls([Image(ImageURL(item["imageURL"]["urlList"])) for item in raw["images"]])
+
+
+@dataclass(frozen=True, slots=True)
+class ItemStruct:
+    video: Video
+    music: Music | None
+    imagePost: ImagePost | None
+    isContentClassified: bool
+
+    @classmethod
+    def from_raw(cls, raw: Raw) -> "ItemStruct":
+        music = raw.get("music")
+        image_post = raw.get("imagePost")
+        return cls(
+            video=Video.from_raw(raw["video"]),
+            music=Music.from_raw(music) if music is not None else None,
+            imagePost=ImagePost.from_raw(image_post) if image_post is not None else None,
+            isContentClassified=bool(raw.get("isContentClassified", False)),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ItemInfo:
+    itemStruct: ItemStruct
+
+
+@dataclass(frozen=True, slots=True)
+class WebappVideoDetail:
+    itemInfo: ItemInfo | None
+    statusCode: int
+    statusMsg: str
+
+    @classmethod
+    def from_raw(cls, raw: Raw) -> "WebappVideoDetail":
+        item_info = raw.get("itemInfo")
+        return cls(
+            itemInfo=ItemInfo(ItemStruct.from_raw(item_info["itemStruct"]))
+            if item_info is not None
+            else None,
+            statusCode=int(raw["statusCode"]),
+            statusMsg=str(raw["statusMsg"]),
+        )
+
+
+def decode_video_detail(json_bytes: bytes | bytearray) -> WebappVideoDetail:
+    """Decode only `webapp.video-detail` scope of the rehydration JSON.
+
+    Returns
+    -------
+    The scope, in the lean structures.
+
+    Raises
+    ------
+    ValueError
+        If the scope isn't found or isn't valid JSON. `KeyError` and `TypeError`
+        are raised too, if it doesn't look as expected.
+
+    """
+    # the key is searched in the bytes, so only the text from the scope on is decoded
+    index = json_bytes.find(VIDEO_DETAIL_KEY)
+    if index == -1:
+        msg = "`webapp.video-detail` scope not found"
+        raise ValueError(msg)
+
+    index += len(VIDEO_DETAIL_KEY)
+    while json_bytes[index : index + 1].isspace():
+        index += 1
+
+    raw, _ = decoder.raw_decode(str(memoryview(json_bytes)[index:], "utf-8"))
+    return WebappVideoDetail.from_raw(raw)
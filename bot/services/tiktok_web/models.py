@@ -5,10 +5,16 @@ from pydantic import BaseModel, Field
 
 class PlayAddr(BaseModel):
     UrlList: list[str]
+    DataSize: int | None = None  # bytes
+    Width: int | None = None
+    Height: int | None = None
 
 
 class BitrateInfo(BaseModel):
     PlayAddr: PlayAddr
+    Bitrate: int | None = None
+    CodecType: str | None = None  # "h264", "h265_hvc1", "bytevc1" etc.
+    GearName: str | None = None
 
 
 class Video(BaseModel):
@@ -18,6 +24,8 @@ class Video(BaseModel):
 
 class Music(BaseModel):
     playUrl: str
+    id: str | None = None
+    title: str | None = None
 
 
 class ImageURL(BaseModel):
@@ -0,0 +1,101 @@
+"""Choosing which variant of a video (bitrate, codec and resolution) to upload.
+
+TikTok encodes every video several times, and both parsers get the whole bitrate ladder.
+Variants that are known to be over the upload limit are skipped without downloading
+them, and the rest are tried from the best one down, so a video that is too large
+in HD is still sent in a lower quality instead of a link.
+"""
+
+from collections.abc import Iterable
+from typing import Final
+
+from bot.config import VIDEO_CODEC
+from bot.services import Data, VideoVariant
+from bot.services.media import MAX_UPLOAD_SIZE
+
+H264: Final[str] = "h264"
+H265: Final[str] = "h265"
+BYTEVC2: Final[str] = "bytevc2"
+UNKNOWN: Final[str] = "unknown"
+
+# Proprietary codecs that Telegram clients can't play
+UNPLAYABLE_CODECS: Final[frozenset[str]] = frozenset({BYTEVC2})
+
+
+def normalize_codec(codec_type: str | None) -> str:
+    """Map TikTok's codec names ("h265_hvc1", "bytevc1" etc.) to the ones used here.
+
+    Returns
+    -------
+    One of the codec constants, `UNKNOWN` if the name is missing or unfamiliar.
+
+    """
+    if not codec_type:
+        return UNKNOWN
+    codec_type = codec_type.lower()
+    if codec_type.startswith(("h264", "avc")):
+        return H264
+    if codec_type.startswith(("h265", "hevc", "bytevc1")):
+        return H265
+    if codec_type.startswith(BYTEVC2):
+        return BYTEVC2
+    return UNKNOWN
+
+
+def rank_variants(
+    variants: Iterable[VideoVariant],
+    max_size: int = MAX_UPLOAD_SIZE,
+    preferred_codec: str = VIDEO_CODEC,
+) -> list[VideoVariant]:
+    """Rank the variants worth trying. Too large and unplayable ones are dropped.
+
+    The preferred codec goes first, since not every client can play the other one.
+    Within a codec, variants that are known to fit go before the ones of unknown size,
+    then the higher resolution and bitrate.
+
+    Returns
+    -------
+    The variants from the best one, each URL once.
+
+    """
+    candidates = [
+        variant
+        for variant in variants
+        if variant.codec not in UNPLAYABLE_CODECS
+        and (variant.size is None or variant.size <= max_size)
+    ]
+    candidates.sort(
+        key=lambda variant: (
+            variant.codec != preferred_codec,
+            variant.size is None,
+            -(variant.height or 0),
+            -(variant.bitrate or 0),
+        ),
+    )
+    # the same file can be listed under several gears
+    urls: set[str] = set()
+    return [variant for variant in candidates if not (variant.url in urls or urls.add(variant.url))]
+
+
+def select_video_url(variants: list[VideoVariant]) -> str | None:
+    ranked = rank_variants(variants)
+    return ranked[0].url if ranked else None
+
+
+def get_video_urls(data: Data) -> list[str]:
+    """Pick the URLs of the video to try one by one.
+
+    Returns
+    -------
+    The URLs from the best one, empty if every variant is known to be too large.
+
+    """
+    if data.video_variants:
+        urls = [variant.url for variant in rank_variants(data.video_variants)]
+        playable = [
+            variant for variant in data.video_variants if variant.codec not in UNPLAYABLE_CODECS
+        ]
+        # nothing to try if all of them are known to be too large
+        if urls or (playable and all(variant.size is not None for variant in playable)):
+            return urls
+    return [data.video_url] if data.video_url else []
@@ -0,0 +1,262 @@
+"""Tracing of updates with spans exported in OpenTelemetry format (OTLP JSON).
+
+Every update gets a trace, the current span is kept in a context variable, so it flows
+through `await`s and into the tasks created inside it. Spans of a trace are written
+together, as one JSON line when its root span ends, to stdout or a file (`TRACE_EXPORT`),
+which can be read by the OpenTelemetry Collector (`otlpjsonfile` receiver) and the like.
+
+If `TRACE_EXPORT` isn't set, `span` returns a shared no-op object and `traced` returns
+the function as is, so tracing costs nothing.
+"""
+
+import functools
+import json
+import logging
+import os
+import secrets
+import sys
+import time
+from collections.abc import Callable, Coroutine
+from contextvars import ContextVar
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Final, ParamSpec, TextIO, TypeVar
+
+from typing_extensions import Self
+
+from bot.config import TRACE_EXPORT
+
+logger = logging.getLogger(__name__)
+
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+AttributeValue = str | int | float | bool
+
+SERVICE_NAME: Final[str] = "tiktok-telegram-bot"
+
+# https://opentelemetry.io/docs/specs/otel/trace/api/#set-status
+STATUS_UNSET: Final[int] = 0
+STATUS_ERROR: Final[int] = 2
+SPAN_KIND_INTERNAL: Final[int] = 1
+
+
+class Span:
+    __slots__ = (
+        "attributes",
+        "end_time",
+        "events",
+        "name",
+        "parent",
+        "root",
+        "span_id",
+        "spans",
+        "start_time",
+        "status",
+        "status_message",
+        "trace_id",
+    )
+
+    def __init__(self, name: str, parent: "Span | None") -> None:
+        self.name = name
+        self.parent = parent
+        self.root: Span = parent.root if parent else self
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        # finished spans of the trace, only of the root span
+        self.spans: list[Span] = []
+
+        self.attributes: dict[str, AttributeValue] = {}
+        self.events: list[dict[str, Any]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_time = time.time_ns()
+        self.end_time = 0
+
+    @property
+    def duration(self) -> float:
+        """Seconds, of a finished span."""
+        return (self.end_time - self.start_time) / 1e9
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = repr(exception)
+        self.events.append(
+            {
+                "name": "exception",
+                "timeUnixNano": str(time.time_ns()),
+                "attributes": encode_attributes(
+                    {
+                        "exception.type": type(exception).__name__,
+                        "exception.message": str(exception),
+                    },
+                ),
+            },
+        )
+
+    def to_otlp(self) -> dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent else "",
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": encode_attributes(self.attributes),
+            "events": self.events,
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class _SpanContext:
+    __slots__ = ("span", "token")
+
+    def __init__(self, name: str, attributes: dict[str, AttributeValue]) -> None:
+        self.span = Span(name, current_span.get())
+        self.span.attributes.update(attributes)
+
+    def __enter__(self) -> Span:
+        self.token = current_span.set(self.span)
+        return self.span
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exception: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        current_span.reset(self.token)
+
+        span = self.span
+        span.end_time = time.time_ns()
+        if isinstance(exception, Exception):
+            span.record_exception(exception)
+        elif exception is not None:
+            span.set_attribute("cancelled", value=True)
+
+        assert exporter is not None
+
+        root = span.root
+        root.spans.append(span)
+        if span is root or root.end_time:
+            # the trace has ended (or this span has outlived it)
+            exporter.export(root.spans)
+            root.spans.clear()
+
+
+class _NoOpSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        pass
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        pass
+
+
+NOOP_SPAN: Final = _NoOpSpan()
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def encode_attributes(attributes: dict[str, AttributeValue]) -> list[dict[str, Any]]:
+    encoded: list[dict[str, Any]] = []
+    for key, value in attributes.items():
+        # bool is int as well, so it goes first
+        if isinstance(value, bool):
+            encoded.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            encoded.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            encoded.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            encoded.append({"key": key, "value": {"stringValue": value}})
+    return encoded
+
+
+class SpanExporter:
+    """Writes the spans as OTLP JSON lines (one `ExportTraceServiceRequest` per line)."""
+
+    def __init__(self, destination: str) -> None:
+        self.file: TextIO
+        if destination == "stdout":
+            self.file = sys.stdout
+        else:
+            self.file = Path(destination).open("a", encoding="utf-8")  # noqa: SIM115
+        self.resource = {
+            "attributes": encode_attributes(
+                {"service.name": SERVICE_NAME, "process.pid": os.getpid()},
+            ),
+        }
+
+    def export(self, spans: list[Span]) -> None:
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": self.resource,
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in spans],
+                        },
+                    ],
+                },
+            ],
+        }
+        try:
+            # one write per line, so the lines of several processes don't mix
+            self.file.write(json.dumps(request, separators=(",", ":")) + "\n")
+            self.file.flush()
+        except OSError:
+            logger.exception("Failed to export %s spans.", len(spans))
+
+
+exporter: Final = SpanExporter(TRACE_EXPORT) if TRACE_EXPORT else None
+
+
+def span(name: str, **attributes: AttributeValue) -> "_SpanContext | _NoOpSpan":
+    """Start a child of the current span (or a new trace).
+
+    Returns
+    -------
+    The span to use as a context manager, a no-op one if tracing is off.
+
+    """
+    if exporter is None:
+        return NOOP_SPAN
+    return _SpanContext(name, attributes)
+
+
+def get_current_span() -> "Span | _NoOpSpan":
+    return current_span.get() or NOOP_SPAN
+
+
+def traced(
+    func: Callable[P, Coroutine[Any, Any, R]],
+) -> Callable[P, Coroutine[Any, Any, R]]:
+    """Wrap every call of the coroutine function in a span named after it.
+
+    Don't use it on aiogram handlers, it hides their signature from aiogram.
+
+    Returns
+    -------
+    The wrapper, or `func` itself if tracing is off.
+
+    """
+    if exporter is None:
+        return func
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        with _SpanContext(func.__name__, {}):
+            return await func(*args, **kwargs)
+
+    return wrapper
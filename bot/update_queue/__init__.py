@@ -0,0 +1,89 @@
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+
+from aiogram.types import Update
+
+from bot.config import QUEUE_BACKEND, REDIS_URL
+
+
+class QueueItem(NamedTuple):
+    update_id: int
+    payload: str  # JSON of the update
+
+
+class BaseQueue(ABC):
+    """Queue of updates between the process that receives them and the workers.
+
+    Updates are split into partitions, each partition is consumed by one worker.
+    An item taken with `get` stays in the queue until it's acknowledged with `ack`,
+    so if the worker dies, `recover` puts its unacknowledged items back (at-least-once).
+    """
+
+    @abstractmethod
+    async def put(self, partition: int, update_id: int, payload: str) -> bool:
+        """Add the update to the end of the partition. Return `False` if it was already added."""
+
+    @abstractmethod
+    async def get(self, partition: int, timeout: float) -> QueueItem | None:
+        """Take the next update of the partition, or return `None` after `timeout` seconds."""
+
+    @abstractmethod
+    async def ack(self, partition: int, item: QueueItem) -> None:
+        """Mark the update as handled."""
+
+    @abstractmethod
+    async def recover(self, partition: int) -> int:
+        """Return unacknowledged updates to the front of the partition. Return their count.
+
+        Must be called before (re)starting the worker of the partition.
+        """
+
+    def for_worker(self, partition: int) -> "BaseQueue":  # noqa: ARG002
+        """Get the object to pass to the worker process of the partition.
+
+        Returns
+        -------
+        The queue itself, unless it can't be sent to another process as it is.
+
+        """
+        return self
+
+    async def close(self) -> None:  # noqa: B027
+        pass
+
+
+def get_partition_key(update: Update) -> int:
+    """Get the key of the chat (or user) the update belongs to, its updates must keep order.
+
+    Returns
+    -------
+    The chat id, the user id if there's no chat, 0 if neither is known.
+
+    """
+    event = update.event
+
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+
+    return 0
+
+
+def create_queue(partitions: int) -> BaseQueue:
+    match QUEUE_BACKEND:
+        case "memory":
+            from bot.update_queue.memory import ProcessQueue  # noqa: PLC0415
+
+            return ProcessQueue(partitions)
+        case "redis":
+            # redis is an optional dependency, so import it only when it's needed
+            from bot.update_queue.redis import RedisQueue  # noqa: PLC0415
+
+            return RedisQueue.from_url(REDIS_URL)
+        case _:
+            msg = f"Unknown QUEUE_BACKEND: {QUEUE_BACKEND!r}"
+            raise ValueError(msg)
@@ -0,0 +1,107 @@
+import asyncio
+import copy
+import logging
+import multiprocessing
+import queue
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any, Final
+
+from typing_extensions import override
+
+from bot.cache.memory import MemoryCache
+from bot.update_queue import BaseQueue, QueueItem
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue
+
+logger = logging.getLogger(__name__)
+
+# Telegram doesn't resend updates older than that, so it's enough to remember their IDs
+SEEN_TTL: Final[float] = 24 * 60 * 60  # seconds
+SEEN_MAX_SIZE: Final[int] = 100_000
+
+context = multiprocessing.get_context("spawn")
+
+
+class ProcessQueue(BaseQueue):
+    """Queue between the processes of one machine, built on `multiprocessing` queues.
+
+    The receiving process keeps every item until the worker acknowledges it.
+    Workers get their part of this object with `for_worker` when they are started.
+    """
+
+    def __init__(self, partitions: int) -> None:
+        self._queues: dict[int, Queue[QueueItem]] = {
+            partition: context.Queue() for partition in range(partitions)
+        }
+        self._acks: Queue[tuple[int, int]] = context.Queue()
+
+        # only in the receiving process
+        self._unacked: list[dict[int, str]] = [{} for _ in range(partitions)]
+        self._seen: MemoryCache[bool] = MemoryCache(SEEN_MAX_SIZE, SEEN_TTL)
+        self._ack_collector: asyncio.Task[None] | None = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the workers only need the queues
+        return {"_queues": self._queues, "_acks": self._acks, "_ack_collector": None}
+
+    @override
+    def for_worker(self, partition: int) -> "ProcessQueue":
+        # a partition's queue is replaced on `recover`, so the other workers must not
+        # reference it, otherwise they would fail to start if it's gone
+        worker_queue = copy.copy(self)
+        worker_queue._queues = {partition: self._queues[partition]}  # noqa: SLF001
+        return worker_queue
+
+    @override
+    async def put(self, partition: int, update_id: int, payload: str) -> bool:
+        if self._ack_collector is None or self._ack_collector.done():
+            self._ack_collector = asyncio.create_task(self._collect_acks())
+
+        key = str(update_id)
+        if self._seen.get_nowait(key):
+            return False
+        self._seen.set_nowait(key, value=True)
+
+        self._unacked[partition][update_id] = payload
+        self._queues[partition].put(QueueItem(update_id, payload))
+        return True
+
+    @override
+    async def get(self, partition: int, timeout: float) -> QueueItem | None:
+        with suppress(queue.Empty):
+            return await asyncio.to_thread(self._queues[partition].get, timeout=timeout)
+        return None
+
+    @override
+    async def ack(self, partition: int, item: QueueItem) -> None:
+        self._acks.put((partition, item.update_id))
+
+    @override
+    async def recover(self, partition: int) -> int:
+        # a `multiprocessing` queue can't be reordered, so the partition gets a new one
+        # with all unacknowledged items, in the order they were put
+        self._queues[partition].close()
+        self._queues[partition] = context.Queue()
+
+        unacked = self._unacked[partition]
+        for update_id, payload in unacked.items():
+            self._queues[partition].put(QueueItem(update_id, payload))
+        return len(unacked)
+
+    @override
+    async def close(self) -> None:
+        if self._ack_collector is not None:
+            self._ack_collector.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._ack_collector
+
+        for partition_queue in self._queues.values():
+            partition_queue.close()
+        self._acks.close()
+
+    async def _collect_acks(self) -> None:
+        while True:
+            with suppress(queue.Empty):
+                partition, update_id = await asyncio.to_thread(self._acks.get, timeout=1)
+                self._unacked[partition].pop(update_id, None)
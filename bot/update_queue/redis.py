@@ -0,0 +1,100 @@
+from typing import Any, Final
+
+from redis.asyncio import Redis
+from typing_extensions import override
+
+from bot.update_queue import BaseQueue, QueueItem
+
+# Telegram doesn't resend updates older than that, so it's enough to remember their IDs
+SEEN_TTL: Final[int] = 24 * 60 * 60  # seconds
+
+
+class RedisQueue(BaseQueue):
+    """Queue shared by any number of machines, stored in Redis (or anything compatible).
+
+    Every partition is a list, `get` atomically moves the item to the "processing" list
+    of the partition, where it stays until `ack`.
+    """
+
+    def __init__(self, client: Redis, prefix: str = "updates", url: str | None = None) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.url = url
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "updates") -> "RedisQueue":
+        return cls(Redis.from_url(url, decode_responses=True), prefix, url)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the client can't be sent to a worker process, so the worker creates its own
+        if self.url is None:
+            msg = "Only a queue created with `from_url` can be sent to another process"
+            raise TypeError(msg)
+        return {"url": self.url, "prefix": self.prefix}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(
+            Redis.from_url(state["url"], decode_responses=True),
+            state["prefix"],
+            state["url"],
+        )
+
+    @override
+    async def put(self, partition: int, update_id: int, payload: str) -> bool:
+        seen_key = f"{self.prefix}:seen:{update_id}"
+        if not await self.client.set(seen_key, 1, nx=True, ex=SEEN_TTL):
+            return False
+
+        try:
+            await self.client.lpush(self._queue_key(partition), f"{update_id}:{payload}")
+        except BaseException:
+            # so the update can be put again
+            await self.client.delete(seen_key)
+            raise
+        return True
+
+    @override
+    async def get(self, partition: int, timeout: float) -> QueueItem | None:
+        value = await self.client.blmove(
+            self._queue_key(partition),
+            self._processing_key(partition),
+            timeout,
+            "RIGHT",
+            "LEFT",
+        )
+        if value is None:
+            return None
+
+        update_id, payload = value.split(":", 1)
+        return QueueItem(int(update_id), payload)
+
+    @override
+    async def ack(self, partition: int, item: QueueItem) -> None:
+        await self.client.lrem(
+            self._processing_key(partition),
+            1,
+            f"{item.update_id}:{item.payload}",
+        )
+
+    @override
+    async def recover(self, partition: int) -> int:
+        count = 0
+        # the newest processing item goes first, so the oldest one ends up at the front
+        while await self.client.lmove(
+            self._processing_key(partition),
+            self._queue_key(partition),
+            "LEFT",
+            "RIGHT",
+        ):
+            count += 1
+        return count
+
+    @override
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def _queue_key(self, partition: int) -> str:
+        return f"{self.prefix}:queue:{partition}"
+
+    def _processing_key(self, partition: int) -> str:
+        return f"{self.prefix}:processing:{partition}"
@@ -1,6 +1,9 @@
+import asyncio
 import logging
 from collections import UserDict
-from typing import Any, TypeVar
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, Generic, TypeVar
+from urllib.parse import parse_qs, urlsplit
 
 import pydantic
 from pydantic_core import CoreSchema, core_schema
@@ -10,12 +13,171 @@ logger = logging.getLogger(__name__)
 
 
 T = TypeVar("T")
+K = TypeVar("K", bound=Hashable)
 
 
 def split_list_into_chunks(arr: list[T], chunk_size: int) -> list[list[T]]:
     return [arr[i : i + chunk_size] for i in range(0, len(arr), chunk_size)]
 
 
+def extract_url_expiry(url: str) -> float | None:
+    """Get the expiry of the signed TikTok CDN URL.
+
+    Returns
+    -------
+    The unix timestamp, `None` if the URL isn't signed.
+
+    """
+    query = parse_qs(urlsplit(url).query)
+    for param in ("x-expires", "expire"):
+        if values := query.get(param):
+            try:
+                return float(values[0])
+            except ValueError:
+                continue
+    return None
+
+
+class SingleFlight(Generic[K, T]):
+    """Coalesce concurrent calls with the same key into a single execution.
+
+    The first caller for a key starts the call, every caller that comes while
+    it's still running awaits the same result (or the same exception).
+    A cancelled caller doesn't cancel the call for the others, the call itself
+    is cancelled only when every caller has gone.
+
+    Example:
+    -------
+        >>> flight: SingleFlight[int, str] = SingleFlight()
+        >>> await asyncio.gather(flight.do(1, fetch), flight.do(1, fetch))  # fetch() runs once
+        >>> flight.coalescing_ratio
+        0.5
+
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[K, _Call[T]] = {}
+
+        # metrics
+        self.requests = 0
+        self.executions = 0
+
+    @property
+    def coalescing_ratio(self) -> float:
+        """Share of requests that were served by a call started by someone else."""
+        if not self.requests:
+            return 0.0
+        return 1 - self.executions / self.requests
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: K, func: Callable[[], Awaitable[T]]) -> T:
+        self.requests += 1
+
+        call = self._calls.get(key)
+        if call is None:
+            self.executions += 1
+            call = self._calls[key] = _Call(asyncio.ensure_future(func()))
+            call.future.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            logger.debug("Coalesced call for key [%s].", key)
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.future)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.future.done():
+                # everyone who needed the result has gone, and the next caller
+                # must start a new call instead of joining the cancelled one
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.future.cancel()
+
+    def _forget(self, key: K, call: "_Call[T]") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+        # mark the exception as retrieved, waiters (if any) get it through `shield`
+        if not call.future.cancelled():
+            call.future.exception()
+
+
+class _Call(Generic[T]):
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: asyncio.Future[T]) -> None:
+        self.future = future
+        self.waiters = 0
+
+
+class Batcher(Generic[K, T]):
+    """Collect keys from concurrent callers into batches and resolve them with one call.
+
+    A batch is sent when `max_size` keys are collected, or `window` seconds after
+    its first key, whatever comes first. `func` gets unique keys of the batch and
+    returns a result for each of them, its exception is raised to every caller
+    of the batch. Callers of the keys it has no result for get `LookupError`.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[list[K]], Awaitable[dict[K, T]]],
+        window: float,
+        max_size: int,
+    ) -> None:
+        self.func = func
+        self.window = window
+        self.max_size = max_size
+
+        self._pending: list[tuple[K, asyncio.Future[T]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def submit(self, key: K) -> T:
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self._pending.append((key, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[K, asyncio.Future[T]]]) -> None:
+        keys = list(dict.fromkeys(key for key, _ in batch))
+        try:
+            results = await self.func(keys)
+        except Exception as exception:  # noqa: BLE001
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+
+        for key, future in batch:
+            if future.done():
+                continue
+            if key in results:
+                future.set_result(results[key])
+            else:
+                msg = f"No result for {key!r} in the batch"
+                future.set_exception(LookupError(msg))
+
+
 class HeaderMap(UserDict[str, str]):
     """Case-insensitive mapping for HTTP header fields.
 
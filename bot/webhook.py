@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import secrets
+import signal
+from contextlib import suppress
+from typing import Final
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from typing_extensions import override
+
+from bot.config import WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+
+logger = logging.getLogger(__name__)
+
+
+# How long to wait for updates that are still being handled on shutdown
+DRAIN_TIMEOUT: Final[float] = 30  # seconds
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """Answers Telegram immediately, handles updates in background and waits for them on close."""
+
+    @override
+    async def close(self) -> None:
+        # this set is managed by aiogram, every update handled in background is there
+        tasks = self._background_feed_update_tasks
+        if tasks:
+            logger.info("Waiting for %s updates to be handled...", len(tasks))
+            _, pending = await asyncio.wait(tasks, timeout=DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+
+        await super().close()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Serve updates from Telegram until SIGINT or SIGTERM."""
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    app = web.Application()
+    DrainingRequestHandler(dp, bot, secret_token=secret_token).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info("Listening for webhook updates on %s:%s.", WEBHOOK_HOST, WEBHOOK_PORT)
+
+    # Same as with polling, updates sent while the bot was down are dropped
+    await bot.set_webhook(
+        WEBHOOK_URL + WEBHOOK_PATH,
+        secret_token=secret_token,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True,
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(signum, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Shutting down...")
+        # stops accepting new updates and drains the running ones
+        await runner.cleanup()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import signal
+from contextlib import suppress
+from typing import TYPE_CHECKING, Final
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from bot.app import create_app, setup_logging
+from bot.config import METRICS_HOST, METRICS_PORT, WORKERS
+from bot.metrics import start_metrics_server
+from bot.middlewares.scheduler import GLOBAL_RATE
+from bot.update_queue import BaseQueue, QueueItem, get_partition_key
+from bot.update_queue.memory import context
+
+if TYPE_CHECKING:
+    from multiprocessing.process import BaseProcess
+
+logger = logging.getLogger(__name__)
+
+# How many updates one worker handles at the same time
+WORKER_CONCURRENCY: Final[int] = 100
+# How often the workers check whether they should stop, and the pool checks the workers
+POLL_INTERVAL: Final[float] = 1  # seconds
+# How long to wait for updates that are still being handled on shutdown
+DRAIN_TIMEOUT: Final[float] = 30  # seconds
+
+
+class Worker:
+    """Handles the updates of one partition.
+
+    Updates of different chats are handled concurrently, updates of the same chat
+    one after another. Each update is acknowledged only after it was handled.
+    """
+
+    def __init__(self, partition: int, queue: BaseQueue, bot: Bot, dp: Dispatcher) -> None:
+        self.partition = partition
+        self.queue = queue
+        self.bot = bot
+        self.dp = dp
+
+        self._semaphore = asyncio.Semaphore(WORKER_CONCURRENCY)
+        # locks are fair, so updates of a chat acquire its lock in the order they were received
+        self._chat_locks: dict[int, asyncio.Lock] = {}
+        self._chat_updates: dict[int, int] = {}  # updates of the chat that use its lock
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def run(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            await self._semaphore.acquire()
+            item = await self.queue.get(self.partition, POLL_INTERVAL)
+            if item is None:
+                self._semaphore.release()
+                continue
+
+            task = asyncio.create_task(self._handle(item))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        if self._tasks:
+            logger.info("Waiting for %s updates to be handled...", len(self._tasks))
+            # unfinished updates aren't acknowledged, so they will be handled after restart
+            _, pending = await asyncio.wait(self._tasks, timeout=DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+
+    async def _handle(self, item: QueueItem) -> None:
+        try:
+            await self._feed(Update.model_validate_json(item.payload, context={"bot": self.bot}))
+        except Exception:
+            # the same as in polling: the update is considered handled anyway,
+            # otherwise a broken update would be handled over and over again
+            logger.exception("Failed to handle update %s.", item.update_id)
+        finally:
+            self._semaphore.release()
+
+        await self.queue.ack(self.partition, item)
+
+    async def _feed(self, update: Update) -> None:
+        key = get_partition_key(update)
+        lock = self._chat_locks.setdefault(key, asyncio.Lock())
+        self._chat_updates[key] = self._chat_updates.get(key, 0) + 1
+        try:
+            async with lock:
+                await self.dp.feed_update(self.bot, update)
+        finally:
+            self._chat_updates[key] -= 1
+            if not self._chat_updates[key]:
+                del self._chat_updates[key]
+                del self._chat_locks[key]
+
+
+async def run_worker(partition: int, queue: BaseQueue) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(signum, stop.set)
+
+    # all workers send with the same token, so each one gets its share of the global limit
+    async with create_app(global_send_rate=GLOBAL_RATE / WORKERS) as (bot, dp):
+        metrics_runner = None
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + 1 + partition)
+
+        # the workers parse the posts, so they refresh them as well (see `main`)
+        refresh_task = asyncio.create_task(dp["parser"].run())
+
+        logger.info("Worker %s has started.", partition)
+        try:
+            await Worker(partition, queue, bot, dp).run(stop)
+        finally:
+            refresh_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await refresh_task
+            await queue.close()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+
+
+def worker_main(partition: int, queue: BaseQueue) -> None:
+    """Entry point of a worker process."""
+    setup_logging()
+    asyncio.run(run_worker(partition, queue))
+
+
+class WorkerPool:
+    """Runs a worker process for every partition and restarts the ones that have died."""
+
+    def __init__(self, queue: BaseQueue, size: int) -> None:
+        self.queue = queue
+        self.size = size
+        self.processes: list[BaseProcess | None] = [None] * size
+
+    async def run(self) -> None:
+        try:
+            while True:
+                for partition, process in enumerate(self.processes):
+                    if process is None or not process.is_alive():
+                        if process is not None:
+                            logger.warning(
+                                "Worker %s has died with exit code %s, restarting.",
+                                partition,
+                                process.exitcode,
+                            )
+                        await self._start(partition)
+
+                await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            await self._stop()
+
+    async def _start(self, partition: int) -> None:
+        recovered = await self.queue.recover(partition)
+        if recovered:
+            logger.info("Returned %s unhandled updates to partition %s.", recovered, partition)
+
+        process = context.Process(
+            target=worker_main,
+            args=(partition, self.queue.for_worker(partition)),
+            name=f"worker-{partition}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[partition] = process
+
+    async def _stop(self) -> None:
+        processes = [process for process in self.processes if process is not None]
+        for process in processes:
+            process.terminate()
+
+        # workers drain their updates before exiting
+        for process in processes:
+            await asyncio.to_thread(process.join, DRAIN_TIMEOUT + POLL_INTERVAL)
+            if process.is_alive():
+                process.kill()
@@ -1,46 +1,56 @@
 import asyncio
-import logging
 from contextlib import suppress
 
-from aiogram import Bot, Dispatcher, loggers
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
-from rich.logging import RichHandler
-
-from bot.config import BOT_TOKEN
-from bot.routers import command_router, error_router, message_router
+from bot.app import create_app, setup_logging
+from bot.config import METRICS_HOST, METRICS_PORT, MODE, WORKERS
+from bot.metrics import start_metrics_server
+from bot.middlewares import EnqueueMiddleware
+from bot.update_queue import create_queue
+from bot.webhook import run_webhook
+from bot.worker import WorkerPool
 
 
 async def main() -> None:
-    bot = Bot(BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-
-    dp = Dispatcher()
-    dp.include_routers(command_router, error_router)
-
-    # this router should be the last one
-    dp.include_router(message_router)
-
-    # Sometimes, "I test in production" and users send messages when the bot is down.
-    # Here I need to drop all updates, so the bot doesn't have to respond to messages
-    # that were sent while the bot wasn't running.
-    await bot.delete_webhook(drop_pending_updates=True)
-
-    await dp.start_polling(bot)  # pyright: ignore [reportUnknownMemberType]
+    async with create_app() as (bot, dp):
+        metrics_runner = (
+            await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+        )
+
+        queue = create_queue(WORKERS) if WORKERS > 0 else None
+        # keeps the cached responses of hot posts fresh, see `bot.services.refresher`
+        refresh_task = asyncio.create_task(dp["parser"].run())
+        pool_task: asyncio.Task[None] | None = None
+        if queue is not None:
+            # this process only receives updates, the workers handle them
+            dp.update.outer_middleware(EnqueueMiddleware(queue, WORKERS))
+            pool_task = asyncio.create_task(WorkerPool(queue, WORKERS).run())
+
+        try:
+            if MODE == "webhook":
+                await run_webhook(dp, bot)
+            else:
+                # Sometimes, "I test in production" and users send messages when the bot is down.
+                # Here I need to drop all updates, so the bot doesn't have to respond to messages
+                # that were sent while the bot wasn't running.
+                await bot.delete_webhook(drop_pending_updates=True)
+
+                await dp.start_polling(bot)  # pyright: ignore [reportUnknownMemberType]
+        finally:
+            refresh_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await refresh_task
+            if pool_task is not None:
+                pool_task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await pool_task
+            if queue is not None:
+                await queue.close()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(message)s",
-        datefmt="[%d/%m/%y %H:%M:%S]",
-        handlers=[
-            # This bot is far from the most stable, so I need cool tracebacks
-            RichHandler(rich_tracebacks=True),
-        ],
-    )
-
-    # disable annoying aiogram update info messages
-    loggers.event.setLevel(logging.WARNING)
+    setup_logging()
 
     with suppress(KeyboardInterrupt):
         asyncio.run(main())
@@ -0,0 +1,7 @@
+import os
+
+# `bot.config` requires the token on import
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+# and `bot.services.tiktok_api` these
+os.environ.setdefault("INSTALL_ID", "7379691220123456789")
+os.environ.setdefault("DEVICE_ID", "7379690540123456789")
@@ -0,0 +1,36 @@
+import asyncio
+
+from bot.middlewares.admission import AdmissionControl
+
+MAX_IN_FLIGHT = 10
+LINKS = 4
+
+
+async def admit_messages(admission: AdmissionControl) -> tuple[list[bool], int]:
+    """Admit three messages of `LINKS` links from different chats.
+
+    Returns
+    -------
+    Which of them started at once, and the slots they took.
+
+    """
+    tasks = [asyncio.create_task(admission.acquire(chat_id, LINKS)) for chat_id in range(1, 4)]
+    await asyncio.sleep(0)
+    started = [task.done() for task in tasks]
+    in_flight = admission.in_flight
+
+    admission.release(1, LINKS)
+    await asyncio.gather(*tasks)
+    return started, in_flight
+
+
+def test_messages_are_charged_per_link() -> None:
+    admission = AdmissionControl(max_in_flight=MAX_IN_FLIGHT, deadline=1)
+
+    started, in_flight = asyncio.run(admit_messages(admission))
+
+    # the third message doesn't fit, until the first one is done
+    assert started == [True, True, False]
+    assert in_flight == 2 * LINKS
+    assert admission.admitted == 3 * LINKS
+    assert admission.in_flight == 2 * LINKS
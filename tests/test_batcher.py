@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from bot.utils import Batcher
+
+KEYS = [2, 3]
+
+
+async def evens_only(keys: list[int]) -> dict[int, int]:
+    """Double the keys, but only the even ones.
+
+    Returns
+    -------
+    The results of the even keys, the odd ones are missing.
+
+    """
+    await asyncio.sleep(0)
+    return {key: key * 2 for key in keys if key % 2 == 0}
+
+
+async def submit_all() -> list[int | BaseException]:
+    batcher: Batcher[int, int] = Batcher(evens_only, window=0.01, max_size=len(KEYS))
+    return await asyncio.wait_for(
+        asyncio.gather(*(batcher.submit(key) for key in KEYS), return_exceptions=True),
+        timeout=1,
+    )
+
+
+def test_keys_without_results_fail() -> None:
+    results = asyncio.run(submit_all())
+
+    expected = asyncio.run(evens_only(KEYS))
+    assert results[0] == expected[KEYS[0]]
+    # the caller doesn't wait forever, it gets the error
+    with pytest.raises(LookupError, match=str(KEYS[1])):
+        raise results[1]
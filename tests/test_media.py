@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import ClientError, web
+
+from benchmarks.load import BOT_TOKEN, free_port
+from benchmarks.stub_server import StubConfig, StubServer
+from bot.services.http_client import create_http_session
+from bot.services.media import CHUNK_SIZE, upload_media
+
+
+async def broken_video(request: web.Request) -> web.StreamResponse:
+    """Promise more than is sent, and drop the connection in the middle.
+
+    Returns
+    -------
+    The response, already broken.
+
+    """
+    response = web.StreamResponse()
+    response.content_length = CHUNK_SIZE * 10
+    await response.prepare(request)
+    await response.write(b"\0" * CHUNK_SIZE)
+    assert request.transport is not None
+    request.transport.close()
+    return response
+
+
+async def upload_broken_video() -> None:
+    stub = StubServer(StubConfig(telegram_latency=0))
+    app = stub.create_app()
+    app.router.add_get("/broken.mp4", broken_video)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    http_session = create_http_session()
+    bot = Bot(BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    try:
+        await upload_media(
+            http_session,
+            f"{url}/broken.mp4",
+            None,
+            lambda file: bot.send_video(1, file),
+        )
+    finally:
+        await bot.session.close()
+        await http_session.close()
+        await runner.cleanup()
+
+
+def test_cdn_failure_during_upload_is_a_client_error() -> None:
+    # not aiogram's `TelegramNetworkError`, so the handlers try the next variant
+    with pytest.raises(ClientError, match="download"):
+        asyncio.run(upload_broken_video())
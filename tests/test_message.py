@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Chat, Message
+from aiohttp import web
+from typing_extensions import override
+
+from benchmarks.load import BOT_TOKEN, free_port
+from benchmarks.stub_server import StubConfig, StubServer, redirect_to
+from bot.cache.media import CachedMedia, MediaCache
+from bot.cache.memory import MemoryCache
+from bot.routers.message import try_send_cached_media
+from bot.services.http_client import create_http_session
+from bot.services.tiktok_web import TikTokWebParser
+from bot.utils import SingleFlight
+
+AWEME_ID = 7_300_000_000_000_000_001
+STALE_AUDIO = "audio-stale"
+
+
+class StaleAudioStub(StubServer):
+    """Bot API stub that doesn't know the stale audio file_id anymore."""
+
+    @override
+    async def telegram(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if form.get("audio") == STALE_AUDIO:
+            self.requests["telegram_stale_audio"] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 400, "description": "Bad Request: wrong file_id"},
+                status=400,
+            )
+        return await super().telegram(request)
+
+
+async def send_cached(stub: StubServer, media_cache: MediaCache) -> bool:
+    runner = web.AppRunner(stub.create_app())
+    await runner.setup()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    http_session = create_http_session(middlewares=(redirect_to(url),))
+    bot = Bot(BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    message = Message(
+        message_id=1,
+        date=int(time.time()),
+        chat=Chat(id=1, type="private"),
+        text=f"https://www.tiktok.com/@someone/photo/{AWEME_ID}",
+    ).as_(bot)
+    try:
+        return await try_send_cached_media(
+            bot,
+            message,
+            TikTokWebParser(http_session),
+            http_session,
+            media_cache,
+            SingleFlight(),
+            AWEME_ID,
+        )
+    finally:
+        await bot.session.close()
+        await http_session.close()
+        await runner.cleanup()
+
+
+def test_stale_cached_audio_is_uploaded_alone() -> None:
+    stub = StaleAudioStub(
+        StubConfig(
+            tiktok_latency=0,
+            cdn_latency=0,
+            telegram_latency=0,
+            unavailable_rate=0,
+            photo_rate=1,
+        ),
+    )
+    media_cache = MediaCache(MemoryCache(100))
+    photos = ["photo-1", "photo-2"]
+    asyncio.run(media_cache.set(AWEME_ID, CachedMedia(photos=photos, audio=STALE_AUDIO)))
+
+    assert asyncio.run(send_cached(stub, media_cache))
+
+    # the photos are sent once, the sound is uploaded again and cached instead of the stale one
+    assert stub.requests["telegram_sendMediaGroup"] == 1
+    assert stub.requests["telegram_stale_audio"] == 1
+    assert stub.requests["telegram_sendAudio"] == 1
+    cached = asyncio.run(media_cache.get(AWEME_ID))
+    assert cached is not None
+    assert cached.photos == photos
+    assert cached.audio not in {None, STALE_AUDIO}
@@ -0,0 +1,7 @@
+from bot.metrics import result_label
+
+
+def test_unknown_results_share_one_label() -> None:
+    assert result_label(None) == "ok"
+    assert result_label("geo_restricted") == "geo_restricted"
+    assert result_label("Something TikTok has never said before") == "other"
@@ -0,0 +1,38 @@
+import asyncio
+
+from typing_extensions import override
+
+from bot.services import ApiResponse, BaseParser
+from bot.services.orchestrator import (
+    MIN_HEDGE_DELAY,
+    MIN_LATENCY_SAMPLES,
+    Backend,
+    ParserOrchestrator,
+)
+
+AWEME_ID = 7_300_000_000_000_000_000
+
+
+class Answering(BaseParser):
+    """Answers with the error after the delay."""
+
+    def __init__(self, message: str, delay: float) -> None:
+        self.message = message
+        self.delay = delay
+
+    @override
+    async def parse(self, aweme_id: int) -> ApiResponse:
+        await asyncio.sleep(self.delay)
+        return ApiResponse(success=False, message=self.message)
+
+
+def test_geo_restricted_is_kept_over_a_later_failure() -> None:
+    # slower than its hedge delay, so the failing backend is started too, and answers last
+    geo = Backend("web", Answering("geo_restricted", MIN_HEDGE_DELAY * 1.5))
+    geo.latencies.extend([0] * MIN_LATENCY_SAMPLES)
+    failing = Backend("api", Answering("server_unavailable", MIN_HEDGE_DELAY))
+    orchestrator = ParserOrchestrator([geo, failing])
+
+    response = asyncio.run(orchestrator.parse(AWEME_ID))
+
+    assert response.message == "geo_restricted"
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+fakeredis = pytest.importorskip("fakeredis")
+
+from bot.update_queue import QueueItem  # noqa: E402
+from bot.update_queue.redis import RedisQueue  # noqa: E402
+
+
+def create_queue() -> RedisQueue:
+    return RedisQueue(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+def test_put_get_ack_in_order() -> None:
+    async def main() -> None:
+        queue = create_queue()
+        for update_id in (1, 2, 3):
+            assert await queue.put(0, update_id, f'{{"update_id": {update_id}}}')
+
+        items = [await queue.get(0, 0.1) for _ in range(3)]
+        assert [item.update_id for item in items if item] == [1, 2, 3]
+        assert await queue.get(0, 0.1) is None
+
+        for item in items:
+            assert item is not None
+            await queue.ack(0, item)
+        assert await queue.recover(0) == 0
+
+    asyncio.run(main())
+
+
+def test_put_deduplicates_updates() -> None:
+    async def main() -> None:
+        queue = create_queue()
+        assert await queue.put(0, 1, "{}")
+        assert not await queue.put(0, 1, "{}")
+        # even to another partition
+        assert not await queue.put(1, 1, "{}")
+
+        assert await queue.get(0, 0.1) == QueueItem(1, "{}")
+        assert await queue.get(0, 0.1) is None
+        assert await queue.get(1, 0.1) is None
+
+    asyncio.run(main())
+
+
+def test_recover_returns_unacknowledged_to_front_in_order() -> None:
+    async def main() -> None:
+        queue = create_queue()
+        for update_id in (1, 2, 3, 4):
+            await queue.put(0, update_id, "{}")
+
+        first = await queue.get(0, 0.1)
+        second = await queue.get(0, 0.1)
+        assert first is not None
+        assert second is not None
+        await queue.ack(0, first)
+
+        # the worker has died with the second update unacknowledged
+        assert await queue.recover(0) == 1
+        items = [await queue.get(0, 0.1) for _ in range(3)]
+        assert [item.update_id for item in items if item] == [2, 3, 4]
+
+    asyncio.run(main())
+
+
+def test_partitions_are_separate() -> None:
+    async def main() -> None:
+        queue = create_queue()
+        await queue.put(0, 1, "{}")
+        await queue.put(1, 2, "{}")
+
+        assert await queue.get(1, 0.1) == QueueItem(2, "{}")
+        assert await queue.get(0, 0.1) == QueueItem(1, "{}")
+
+    asyncio.run(main())
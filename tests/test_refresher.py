@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+from typing_extensions import override
+
+from bot.services import ApiResponse, BaseParser
+from bot.services.caching import CachingParser
+from bot.services.refresher import FAILED_REFRESH_BACKOFF, MIN_HOT_RATE, RefreshingParser
+
+AWEME_ID = 7_300_000_000_000_000_000
+
+
+class Unavailable(BaseParser):
+    """Always answers "server_unavailable", which isn't cached."""
+
+    @override
+    async def parse(self, aweme_id: int) -> ApiResponse:
+        return ApiResponse(success=False, message="server_unavailable")
+
+
+async def make_hot(parser: RefreshingParser) -> None:
+    for _ in range(int(MIN_HOT_RATE) + 1):
+        await parser.parse(AWEME_ID)
+
+
+def test_failed_refreshes_back_off() -> None:
+    parser = RefreshingParser(CachingParser(Unavailable()))
+    asyncio.run(make_hot(parser))
+
+    assert asyncio.run(parser.refresh_due()) == 1
+    # the response wasn't cached, but the post isn't refreshed again right away
+    assert asyncio.run(parser.refresh_due()) == 0
+    later = time.monotonic() + FAILED_REFRESH_BACKOFF
+    assert parser.due(later) == [AWEME_ID]
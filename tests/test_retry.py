@@ -0,0 +1,152 @@
+import asyncio
+import math
+import time
+
+import pytest
+from aiohttp import web
+
+from benchmarks.load import free_port
+from benchmarks.stub_server import StubConfig, StubServer, redirect_to
+from bot.services.http_client import create_http_session
+from bot.services.retry import RetryableError, RetryBudget, RetryingParser, RetryPolicy, retry
+from bot.services.tiktok_web import TikTokWebParser
+
+# no waiting between attempts
+FAST_POLICY = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+class Failing:
+    """Fails the first `failures` calls with `exception`, then returns "ok"."""
+
+    def __init__(self, failures: int, exception: Exception | None = None) -> None:
+        self.failures = failures
+        self.exception = exception or RetryableError("failed")
+        self.calls = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exception
+        return "ok"
+
+
+class FlakyStub(StubServer):
+    """Stub server whose first `failures` web pages have no data (like a captcha page)."""
+
+    def __init__(self, config: StubConfig, failures: int) -> None:
+        super().__init__(config)
+        self.failures = failures
+
+    def fails(self) -> bool:
+        if self.failures > 0:
+            self.failures -= 1
+            return True
+        return super().fails()
+
+
+def test_retries_until_success() -> None:
+    func = Failing(FAST_POLICY.max_attempts - 1)
+    assert asyncio.run(retry(func, FAST_POLICY)) == "ok"
+    assert func.calls == FAST_POLICY.max_attempts
+
+
+def test_gives_up_after_max_attempts() -> None:
+    func = Failing(5)
+    with pytest.raises(RetryableError):
+        asyncio.run(retry(func, FAST_POLICY))
+    assert func.calls == FAST_POLICY.max_attempts
+
+
+def test_other_errors_are_not_retried() -> None:
+    func = Failing(1, ValueError("bug"))
+    with pytest.raises(ValueError, match="bug"):
+        asyncio.run(retry(func, FAST_POLICY))
+    assert func.calls == 1
+
+
+def test_deadline() -> None:
+    calls = 0
+
+    async def hangs() -> None:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(10)
+
+    policy = RetryPolicy(
+        max_attempts=10,
+        base_delay=0,
+        max_delay=0,
+        attempt_timeout=0.1,
+        deadline=0.25,
+    )
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(retry(hangs, policy))
+    # every attempt times out, the third one is cut short by the deadline
+    assert time.monotonic() - start < policy.deadline * 2
+    assert calls == math.ceil(policy.deadline / policy.attempt_timeout)
+
+
+def test_budget_is_exhausted() -> None:
+    budget = RetryBudget(ratio=0, max_tokens=1)
+    first = Failing(1)
+    assert asyncio.run(retry(first, FAST_POLICY, budget)) == "ok"
+    assert first.calls == first.failures + 1
+
+    # the only token is spent, so the next request fails without retrying
+    second = Failing(1)
+    with pytest.raises(RetryableError):
+        asyncio.run(retry(second, FAST_POLICY, budget))
+    assert second.calls == 1
+
+
+def test_budget_is_refilled_by_requests() -> None:
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+    assert budget.tokens == 0
+
+
+async def parse_with_stub(stub: StubServer, aweme_id: int) -> tuple[str | None, int]:
+    """Parse the post with `TikTokWebParser` against the stub.
+
+    Returns
+    -------
+    The error of the response and how many requests the stub has got.
+
+    """
+    runner = web.AppRunner(stub.create_app())
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    session = create_http_session(middlewares=(redirect_to(f"http://127.0.0.1:{port}"),))
+    try:
+        parser = RetryingParser(TikTokWebParser(session), FAST_POLICY)
+        response = await parser.parse(aweme_id)
+    finally:
+        await session.close()
+        await runner.cleanup()
+    return response.message, stub.requests["tiktok_web"]
+
+
+def stub_config(error_rate: float = 0) -> StubConfig:
+    return StubConfig(tiktok_latency=0, error_rate=error_rate, unavailable_rate=0)
+
+
+def test_parser_recovers_from_faults() -> None:
+    stub = FlakyStub(stub_config(), failures=FAST_POLICY.max_attempts - 1)
+    message, attempts = asyncio.run(parse_with_stub(stub, 7_300_000_000_000_000_000))
+    assert message is None
+    assert attempts == FAST_POLICY.max_attempts
+
+
+def test_parser_falls_back_to_server_unavailable() -> None:
+    stub = StubServer(stub_config(error_rate=1))
+    message, attempts = asyncio.run(parse_with_stub(stub, 7_300_000_000_000_000_000))
+    assert message == "server_unavailable"
+    assert attempts == FAST_POLICY.max_attempts
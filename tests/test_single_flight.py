@@ -0,0 +1,33 @@
+import asyncio
+
+from bot.utils import SingleFlight
+
+KEY = 1
+RESULT = "fresh"
+
+
+async def join_after_cancel() -> str:
+    flight: SingleFlight[int, str] = SingleFlight()
+    started = asyncio.Event()
+
+    async def slow() -> str:
+        started.set()
+        await asyncio.sleep(1)
+        return "stale"
+
+    async def fresh() -> str:
+        await asyncio.sleep(0)
+        return RESULT
+
+    first = asyncio.create_task(flight.do(KEY, slow))
+    await started.wait()
+    first.cancel()
+    # the last waiter has gone, but the cancelled call isn't done yet
+    await asyncio.sleep(0)
+    assert first.cancelled()
+
+    return await flight.do(KEY, fresh)
+
+
+def test_join_after_last_waiter_is_cancelled() -> None:
+    assert asyncio.run(join_after_cancel()) == RESULT
@@ -0,0 +1,53 @@
+import asyncio
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from bot.cache.sqlite import MIN_SQLITE_VERSION, SQLiteCache
+
+MAX_SIZE = 5
+WRITES = 250
+
+
+async def fill(cache: SQLiteCache) -> list[str | None]:
+    for index in range(WRITES):
+        await cache.set(f"key-{index}", str(index))
+        # a key that's used all the time stays in the cache
+        await cache.get("key-0")
+    return [await cache.get(f"key-{index}") for index in range(WRITES)]
+
+
+def count_rows(path: Path) -> int:
+    with sqlite3.connect(path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def test_max_size_is_a_bound(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    cache = SQLiteCache(str(path), MAX_SIZE)
+
+    values = asyncio.run(fill(cache))
+    asyncio.run(cache.close())
+
+    assert count_rows(path) == MAX_SIZE
+    found = [value for value in values if value is not None]
+    assert found == ["0", *map(str, range(WRITES - MAX_SIZE + 1, WRITES))]
+
+
+def test_lowered_max_size_is_applied_on_start(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    cache = SQLiteCache(str(path), MAX_SIZE * 2)
+    asyncio.run(fill(cache))
+    asyncio.run(cache.close())
+
+    asyncio.run(SQLiteCache(str(path), MAX_SIZE).close())
+
+    assert count_rows(path) == MAX_SIZE
+
+
+def test_old_sqlite_is_rejected(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, MIN_SQLITE_VERSION[1] - 1, 0))
+
+    with pytest.raises(RuntimeError, match="SQLite"):
+        SQLiteCache(str(tmp_path / "cache.sqlite3"), MAX_SIZE)
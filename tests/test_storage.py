@@ -0,0 +1,84 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+from benchmarks.load import BOT_TOKEN, free_port
+from benchmarks.stub_server import StubConfig, StubServer, redirect_to
+from bot.cache.media import CachedMedia, MediaCache
+from bot.cache.memory import MemoryCache
+from bot.services.http_client import create_http_session
+from bot.services.storage import StorageUploader
+from bot.services.tiktok_web import TikTokWebParser
+from bot.utils import SingleFlight
+
+STORAGE_CHAT_ID = -1001
+# the fixture's photo posts all have the same sound
+MUSIC_ID = 7_301_234_567_890_123_456
+
+
+async def upload_photo_posts(
+    stub: StubServer,
+    aweme_ids: list[int],
+) -> tuple[list[CachedMedia | None], MediaCache]:
+    """Upload the posts to the storage chat one by one, like inline queries do.
+
+    Returns
+    -------
+    The cached media of every post, and the cache to check the sound in.
+
+    """
+    runner = web.AppRunner(stub.create_app())
+    await runner.setup()
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    http_session = create_http_session(middlewares=(redirect_to(url),))
+    bot = Bot(BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    media_cache = MediaCache(MemoryCache(100))
+    uploader = StorageUploader(
+        bot,
+        STORAGE_CHAT_ID,
+        TikTokWebParser(http_session),
+        http_session,
+        media_cache,
+        SingleFlight(),
+        SingleFlight(),
+    )
+    try:
+        uploaded = [await uploader.upload(aweme_id, timeout=10) for aweme_id in aweme_ids]
+    finally:
+        await uploader.close()
+        await bot.session.close()
+        await http_session.close()
+        await runner.cleanup()
+    return uploaded, media_cache
+
+
+def test_photo_posts_are_cached_with_their_sound() -> None:
+    stub = StubServer(
+        StubConfig(
+            tiktok_latency=0,
+            cdn_latency=0,
+            telegram_latency=0,
+            unavailable_rate=0,
+            photo_rate=1,
+        ),
+    )
+    aweme_ids = [7_300_000_000_000_000_001, 7_300_000_000_000_000_002]
+
+    uploaded, media_cache = asyncio.run(upload_photo_posts(stub, aweme_ids))
+
+    first, second = uploaded
+    assert first is not None
+    assert first.photos
+    assert first.audio is not None
+    # the sound is uploaded once and reused by the next post
+    assert second is not None
+    assert second.audio == first.audio
+    assert stub.requests["telegram_sendAudio"] == 1
+    assert asyncio.run(media_cache.get_audio(MUSIC_ID)) == first.audio
+    assert asyncio.run(media_cache.get(aweme_ids[1])) == second
@@ -0,0 +1,32 @@
+import json
+
+from benchmarks.stub_server import FIXTURES, fill_item
+from bot.services.tiktok_api import decode
+
+VALID_ID = 7_300_000_000_000_000_001
+BROKEN_ID = 7_300_000_000_000_000_002
+
+
+def render(*items: dict[str, object]) -> str:
+    return json.dumps({"status_code": 0, "status_msg": "", "aweme_details": items})
+
+
+def test_batch_is_validated_in_one_pass() -> None:
+    template = (FIXTURES / "api_video.json").read_text()
+
+    _, _, aweme_details, broken_ids = decode(render(fill_item(template, VALID_ID, 0)))
+
+    assert list(aweme_details) == [VALID_ID]
+    assert not broken_ids
+
+
+def test_broken_aweme_detail_fails_alone() -> None:
+    template = (FIXTURES / "api_video.json").read_text()
+    valid = fill_item(template, VALID_ID, 0)
+    broken = fill_item(template, BROKEN_ID, 0)
+    del broken["video"]
+
+    _, _, aweme_details, broken_ids = decode(render(valid, broken))
+
+    assert list(aweme_details) == [VALID_ID]
+    assert broken_ids == {str(BROKEN_ID)}
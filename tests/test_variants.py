@@ -0,0 +1,29 @@
+from bot.services import VideoVariant
+from bot.services.variants import H264, H265, rank_variants
+
+MAX_SIZE = 50 * 1024 * 1024
+
+
+def variant(codec: str, size: int | None, height: int) -> VideoVariant:
+    return VideoVariant(
+        url=f"https://cdn.example/{codec}-{height}-{size}",
+        codec=codec,
+        size=size,
+        height=height,
+    )
+
+
+def test_preferred_codec_goes_first_whether_its_size_is_known() -> None:
+    h265_known = variant(H265, MAX_SIZE // 2, 1080)
+    h264_unknown = variant(H264, None, 720)
+    h264_known = variant(H264, MAX_SIZE // 4, 540)
+    h264_too_large = variant(H264, MAX_SIZE * 2, 1080)
+
+    ranked = rank_variants(
+        [h265_known, h264_unknown, h264_too_large, h264_known],
+        max_size=MAX_SIZE,
+        preferred_codec=H264,
+    )
+
+    # within the codec, the ones known to fit go first
+    assert ranked == [h264_known, h264_unknown, h265_known]